@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from api.endpoints.incident import router as incident_router
 from api.endpoints.staff import router as get_staff_router
+from api.endpoints.system import router as system_router
 
 api_router = APIRouter()
 
@@ -16,3 +17,9 @@ api_router.include_router(
     prefix="/get-staff",  
     tags=["get-staff"]
 )
+
+api_router.include_router(
+    system_router,
+    prefix="/system",
+    tags=["system"]
+)
@@ -1,26 +1,194 @@
-from fastapi import APIRouter
-from models.requests import (IncidentRequest)
-from models.requests import (RegenerateRequest)
-from models.response import ClassificationWithStaffResponse,RegenerateResponse
-from services.classification import AIClassificationService
-from services.regenerate import AIRegenerator
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Optional
+from models.requests import (IncidentRequest, BatchIncidentRequest)
+from models.requests import (RegenerateRequest, IncidentJobRequest, RegenerateJobRequest)
+from models.response import ClassificationWithStaffResponse,RegenerateResponse,BatchClassificationResponse,DraftResponse,JobResponse
+from services.container import container
+from services.workload import workload_tracker
+from services.incident_store import get_incident_store
+from services.local_classifier import predict_severity
+from utils.background import job_queue, CallbackURLError, PRIORITIES, REGENERATION_PRIORITY
 from utils.logging import logger
+from utils.streaming import BodyStreamingResponse, SSE_HEADERS
 from datetime import datetime
 
 router=APIRouter()
 
-classification_service = AIClassificationService()
-regenerator=AIRegenerator()
-
 @router.post("/classify-summarize", response_model=ClassificationWithStaffResponse)
 async def classify_incident_only(
     incident: IncidentRequest,
 ):
-    return await classification_service.classify_incident(incident)
+    await container.ready()
+    return await container.classification_service.classify_incident(incident)
+
+
+@router.post("/classify-summarize/stream")
+async def classify_incident_stream(
+    incident: IncidentRequest,
+):
+    """Server-Sent Events: routing as soon as it is parseable, then summary and email deltas."""
+    await container.ready()
+    return StreamingResponse(
+        container.classification_service.classify_incident_stream(incident),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.post("/classify-summarize/jobs", response_model=JobResponse, status_code=202)
+async def submit_classification_job(
+    incident: IncidentJobRequest,
+):
+    """Queues triage as a background job; keyword-predicted high severity jumps the queue."""
+    priority = PRIORITIES.get(predict_severity(incident.description), PRIORITIES["Medium"])
+    try:
+        job = await job_queue.submit(
+            "classification", incident.model_dump(exclude={"callback_url"}), priority, incident.callback_url
+        )
+    except CallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_dict()
+
+
+@router.post("/classify-batch", response_model=BatchClassificationResponse)
+async def classify_incident_batch(
+    batch: BatchIncidentRequest,
+):
+    await container.ready()
+    return await container.batch_service.classify_batch(batch.descriptions)
+
+
+@router.post("/classify-stream")
+async def classify_incident_ndjson_stream(
+    request: Request,
+    resume_token: Optional[str] = None,
+):
+    """Reads NDJSON incidents from the body and streams one NDJSON result per line."""
+    await container.ready()
+    if resume_token:
+        container.batch_service.decode_resume_token(resume_token)
+    return BodyStreamingResponse(
+        container.batch_service.classify_stream(request.stream(), resume_token),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.get("/drafts/{draft_id}", response_model=DraftResponse)
+async def get_draft(
+    draft_id: str,
+    wait: bool = True,
+):
+    """Summary and email for a classification; deferred drafts are generated on first request."""
+    await container.ready()
+    draft = await container.classification_service.draft_store.get(draft_id, wait=wait)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+    return draft.to_dict()
+
+
+@router.post("/assignments/{assignment_id}/close", response_model=Dict[str, Any])
+async def close_assignment(
+    assignment_id: str,
+):
+    """Marks a ticket closed so its assignee's open-assignment count drops."""
+    staff_id = workload_tracker.close(assignment_id)
+    if staff_id is None:
+        raise HTTPException(status_code=404, detail="Assignment not found or already closed")
+    return {
+        "assignment_id": assignment_id,
+        "staff_id": staff_id,
+        "open_assignments": workload_tracker.open_assignments(staff_id)
+    }
+
+
+@router.get("/history", response_model=Dict[str, Any])
+async def list_incidents(
+    department: Optional[str] = None,
+    severity: Optional[str] = None,
+    staff_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """Stored incidents, newest first; pass next_cursor back as cursor for the following page."""
+    store = get_incident_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Incident store is disabled")
+    try:
+        return await asyncio.to_thread(
+            store.query, department, severity, staff_id,
+            since.timestamp() if since else None, until.timestamp() if until else None, limit, cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/history/{incident_id}", response_model=Dict[str, Any])
+async def get_incident(
+    incident_id: str,
+):
+    """One stored incident with its full result, model classification and stage timings."""
+    store = get_incident_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Incident store is disabled")
+    incident = await asyncio.to_thread(store.get, incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
 
 
 @router.post("/regenerate",response_model=RegenerateResponse)
 async def regenerate_response(
     regenerate:RegenerateRequest
 ):
-    return await regenerator.regenerate(regenerate)
+    await container.ready()
+    return await container.regenerator.regenerate(regenerate)
+
+
+@router.post("/regenerate/jobs", response_model=JobResponse, status_code=202)
+async def submit_regeneration_job(
+    regenerate: RegenerateJobRequest,
+):
+    """Queues regeneration as a background job; poll /jobs/{job_id} or pass a callback_url."""
+    try:
+        job = await job_queue.submit(
+            "regeneration", regenerate.model_dump(exclude={"callback_url"}), REGENERATION_PRIORITY, regenerate.callback_url
+        )
+    except CallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+
+@router.post("/regenerate/stream")
+async def regenerate_response_stream(
+    regenerate:RegenerateRequest
+):
+    await container.ready()
+    return StreamingResponse(
+        container.regenerator.regenerate_stream(regenerate),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
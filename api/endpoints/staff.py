@@ -1,68 +1,61 @@
 from fastapi import HTTPException, APIRouter
-from typing import List, Any, Dict
+from typing import Any, Dict
 
 import httpx
-from models.staff_validations import StaffRecord
+from models.requests import CandidateRequest
+from services.roster_index import get_roster_index
+from services.roster_refresher import roster_refresher
+from services.roster_sync import roster_sync, shared_workers
+from services.skill_matcher import get_skill_matcher
+from services.workload import workload_tracker
 
 router = APIRouter()
 
-stored_staff_data: List[StaffRecord] = []
-
 @router.get("/api/staff", response_model=Dict[str, Any])
 async def get_staff_data():
     try:
-        # Power Automate HTTP trigger URL
-        power_automate_url = (
-            "https://5f257beee4e8e7459c386335509b51.00.environment.api.powerplatform.com:443"
-            "/powerautomate/automations/direct/workflows/3a1112fadb5b43d68c8a52b8f26efc01"
-            "/triggers/manual/paths/invoke/?api-version=1&tenantId=tId"
-            "&environmentName=5f257bee-e4e8-e745-9c38-6335509b5100"
-            "&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=efZ9TBpZp1te-ko_d4CaPIS2fhLfb8BGbLguWNdoJg4"
-        )
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(power_automate_url)
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Power Automate API request failed: {response.text}"
-                )
-
-            response_data = response.json()
-
-            if isinstance(response_data, list):
-                staff_records = response_data
-            else:
-                staff_records = response_data.get("value", response_data)
-
-            if not isinstance(staff_records, list):
-                raise HTTPException(
-                    status_code=400,
-                    detail="Unexpected response format from Power Automate API"
-                )
-
-            # Validate and convert response data to StaffRecord models
-            try:
-                global stored_staff_data
-                stored_staff_data = [StaffRecord(**record) for record in staff_records]
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Error parsing staff data: {str(e)}"
-                )
-
-        if not stored_staff_data:
+        if shared_workers() and not roster_sync.is_leader:
+            # Only the leader refreshes and publishes generations; a follower serves what it last synced
+            delta = None
+            staff_records = [entry.record for entry in get_roster_index().entries.values()]
+        else:
+            # Pulls the Power Automate feed and applies only records whose etag changed
+            delta = await roster_refresher.refresh()
+            staff_records = roster_refresher.records
+
+        if not staff_records:
             raise HTTPException(status_code=404, detail="No staff data retrieved")
 
         return {
             "message": "Staff data retrieved successfully",
-            "records_retrieved": len(stored_staff_data),
+            "records_retrieved": len(staff_records),
             "status": "success",
-            "data": [record.model_dump(by_alias=True) for record in stored_staff_data]
+            "delta": delta,
+            "data": staff_records
         }
 
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Error connecting to Power Automate API: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving staff data: {str(e)}")
-    
+
+
+@router.post("/candidates", response_model=Dict[str, Any])
+async def rank_candidates(request: CandidateRequest):
+    """Top-K staff in a department ranked by skill similarity to the required skills."""
+    ranked = get_skill_matcher().rank(request.required_skills, request.department, request.top_k)
+    return {
+        "department": request.department,
+        "candidates": [
+            {
+                "staff_id": entry.staff_id,
+                "name": entry.record["cr6dd_UserID"]["cr6dd_name"],
+                "skillset": entry.record.get("cr6dd_skillset"),
+                "score": score,
+                "open_assignments": workload_tracker.open_assignments(entry.staff_id)
+            }
+            for entry, score in ranked
+        ]
+    }
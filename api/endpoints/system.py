@@ -0,0 +1,106 @@
+import asyncio
+from fastapi import APIRouter
+from typing import Any, Dict
+from config import settings
+from utils.http_client import http_pool
+from utils.metrics import metrics
+from services.usage_ledger import usage_ledger
+from services.ai_service import azure_scheduler, admission_scheduler
+from services.workload import workload_tracker
+from services.embedding_index import get_embedding_index
+from services.container import container
+from services.roster_sync import roster_sync
+from services.incident_store import incident_writer
+from utils.background import job_queue
+
+router = APIRouter()
+
+@router.get("/services", response_model=Dict[str, Any])
+async def get_services():
+    return {"warmup": settings.service_warmup, "built": container.built()}
+
+
+@router.get("/roster-sync", response_model=Dict[str, Any])
+async def get_roster_sync_stats():
+    return roster_sync.stats()
+
+
+@router.get("/incident-store", response_model=Dict[str, Any])
+async def get_incident_store_stats():
+    return await asyncio.to_thread(incident_writer.stats)
+
+
+@router.get("/jobs", response_model=Dict[str, Any])
+async def get_job_queue_stats():
+    return job_queue.stats()
+
+
+@router.get("/http-pool", response_model=Dict[str, Any])
+async def get_http_pool_stats():
+    return http_pool.stats()
+
+
+@router.get("/latency", response_model=Dict[str, Any])
+async def get_stage_latency():
+    return metrics.stage_quantiles()
+
+
+@router.get("/llm-usage", response_model=Dict[str, Any])
+async def get_llm_usage():
+    return usage_ledger.stats()
+
+
+@router.get("/azure-scheduler", response_model=Dict[str, Any])
+async def get_azure_scheduler_stats():
+    return azure_scheduler.stats()
+
+
+@router.get("/admission", response_model=Dict[str, Any])
+async def get_admission_stats():
+    return admission_scheduler.stats()
+
+
+@router.get("/classification-cache", response_model=Dict[str, Any])
+async def get_classification_cache_stats():
+    await container.ready()
+    if not container.classification_service.classification_cache:
+        return {"enabled": False}
+    return {"enabled": True, **container.classification_service.classification_cache.stats()}
+
+
+@router.get("/single-flight", response_model=Dict[str, Any])
+async def get_single_flight_stats():
+    await container.ready()
+    return container.classification_service.single_flight.stats()
+
+
+@router.get("/workload", response_model=Dict[str, Any])
+async def get_workload_stats():
+    return workload_tracker.stats()
+
+
+@router.get("/embedding-index", response_model=Dict[str, Any])
+async def get_embedding_index_stats():
+    return get_embedding_index().stats()
+
+
+@router.get("/local-classifier", response_model=Dict[str, Any])
+async def get_local_classifier_stats():
+    await container.ready()
+    if not container.classification_service.local_classifier:
+        return {"enabled": False}
+    return container.classification_service.local_classifier.stats()
+
+
+@router.get("/screening", response_model=Dict[str, Any])
+async def get_screening_stats():
+    await container.ready()
+    return container.classification_service.content_validator.rules.stats()
+
+
+@router.post("/screening/reload", response_model=Dict[str, Any])
+async def reload_screening_rules():
+    await container.ready()
+    validator = container.classification_service.content_validator
+    reloaded = await asyncio.to_thread(validator.reload, True)
+    return {"reloaded": reloaded, **validator.rules.stats()}
@@ -3,7 +3,15 @@ from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from config import settings
 from api.api import api_router
+from api.endpoints.metrics import router as metrics_router
 from utils.logging import logger
+from services.roster_refresher import roster_refresher
+from services.container import container
+from services.roster_sync import roster_sync, shared_workers
+from services.incident_store import get_incident_store, incident_writer
+from utils.background import job_queue
+from utils.http_client import http_pool
+from utils.metrics import TimingMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,8 +19,25 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     logger.info("AI Incident Triage API starting up...")
+    # The HTTP pool, roster and services are built by the container, in the
+    # background by default, so the server binds without waiting for them
+    await container.startup()
+    incident_writer.start()
+    container.register_jobs(job_queue)
+    await job_queue.start(spill_store=get_incident_store())
+    if shared_workers():
+        # Only the worker holding the roster lock polls the feed; the rest follow its snapshots
+        roster_sync.start(on_leader=roster_refresher.start if settings.staff_refresh_enabled else None)
+    elif settings.staff_refresh_enabled:
+        roster_refresher.start()
     yield
     logger.info("AI Incident Triage API shutting down...")
+    await roster_sync.stop()
+    await roster_refresher.stop()
+    await job_queue.stop()
+    await incident_writer.stop()
+    await container.shutdown()
+    await http_pool.aclose()
 
 def create_application()->FastAPI:
     app= FastAPI(
@@ -21,6 +46,8 @@ def create_application()->FastAPI:
     )
 
     app.include_router(api_router, prefix="/api/v1")
+    app.include_router(metrics_router)
+    app.add_middleware(TimingMiddleware)
 
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
@@ -47,4 +74,11 @@ if __name__ == "__main__":
     import os
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host=settings.host, port=port)
+    if settings.workers > 1:
+        from services.roster_index import get_roster_index
+        from services.roster_snapshot import save_roster_snapshot
+        # Write the snapshot once so every worker loads the same roster instead of building its own
+        save_roster_snapshot(get_roster_index())
+        uvicorn.run("app:app", host=settings.host, port=port, workers=settings.workers)
+    else:
+        uvicorn.run(app, host=settings.host, port=port)
@@ -0,0 +1,11 @@
+"""Benchmarks and load tests that run without Azure credentials.
+
+    python -m benchmarks micro --sizes 10,1000,100000
+    python -m benchmarks load --sizes 10,10000 --concurrency 32 --latency lognormal:0.3,0.4
+    python -m benchmarks load --save baseline.json
+    python -m benchmarks load --baseline baseline.json --tolerance 0.2
+
+The load test serves a fake Azure OpenAI deployment on a local port, points the
+service at it and drives the app in-process; --target points it at a running
+deployment instead, and `python -m benchmarks fake-azure` serves only the fake.
+"""
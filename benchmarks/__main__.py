@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_azure import FakeAzureOpenAI, FakeAzureServer
+
+
+def configure_environment(azure_endpoint: Optional[str], with_caches: bool):
+    """Settings are read when config is first imported, so this runs before any service module loads."""
+    defaults = {
+        "AZURE_API_KEY": "benchmark",
+        "STAFF_REFRESH_ENABLED": "false",
+        "SERVICE_WARMUP": "eager",
+        "ROSTER_SNAPSHOT_PATH": "",
+        "EMBEDDING_INDEX_DIR": "",
+        # Synthetic incidents must not reach the real history, which warms caches on the next start
+        "INCIDENT_STORE_BACKEND": "none",
+        "LOG_LEVEL": "ERROR"
+    }
+    if not with_caches:
+        defaults.update({"CLASSIFICATION_CACHE_ENABLED": "false", "LOCAL_CLASSIFIER_ENABLED": "false"})
+    if azure_endpoint:
+        os.environ["AZURE_ENDPOINT"] = azure_endpoint
+    else:
+        defaults["AZURE_ENDPOINT"] = "http://127.0.0.1:9"
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    import logging
+    logging.getLogger("utils.logging").setLevel(os.environ["LOG_LEVEL"])
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]):
+    widths = [max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(width) for column, width in zip(columns, widths)))
+
+
+def result_key(row: Dict[str, Any]) -> str:
+    return f"{row.get('benchmark') or row.get('endpoint')}@{row['size']}"
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """Lists results that are worse than the baseline by more than tolerance (0.2 = 20%)."""
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = {result_key(row): row for row in json.load(baseline_file)["results"]}
+    regressions = []
+    for row in results:
+        previous = baseline.get(result_key(row))
+        if previous is None:
+            continue
+        checks = [("value", row.get("better") == "higher")] if "value" in row else [("p95_ms", False), ("rps", True)]
+        for field, higher_is_better in checks:
+            old, new = previous.get(field), row.get(field)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            if change > tolerance:
+                regressions.append(f"{result_key(row)} {field}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def parse_sizes(text: str) -> List[int]:
+    return [int(size) for size in text.split(",") if size]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Micro-benchmarks and load tests.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro", help="time the routing building blocks per roster size")
+    micro.add_argument("--sizes", default="10,1000,10000,100000")
+    micro.add_argument("--min-seconds", type=float, default=0.2)
+
+    load = commands.add_parser("load", help="drive classify/regenerate against a fake Azure deployment")
+    load.add_argument("--sizes", default="10,1000,10000")
+    load.add_argument("--endpoints", default="classify,regenerate")
+    load.add_argument("--requests", type=int, default=300)
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--target", help="base URL of a running service instead of the in-process app")
+    load.add_argument("--with-caches", action="store_true", help="keep the classification cache and local classifier on")
+
+    server = commands.add_parser("fake-azure", help="serve only the fake Azure OpenAI deployment")
+    server.add_argument("--port", type=int, default=8089)
+
+    for command in (load, server):
+        command.add_argument("--latency", default="lognormal:0.3,0.4",
+                             help="const:S | uniform:A,B | lognormal:MEDIAN,SIGMA | exp:MEAN (seconds)")
+        command.add_argument("--error-rate", type=float, default=0.0)
+        command.add_argument("--throttle-rate", type=float, default=0.0)
+        command.add_argument("--completion-tokens", type=int, default=60)
+    for command in (micro, load):
+        command.add_argument("--save", help="write the results as JSON")
+        command.add_argument("--baseline", help="fail when results regress against this JSON file")
+        command.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    fake_server = None
+    if args.command in ("load", "fake-azure") and not getattr(args, "target", None):
+        fake = FakeAzureOpenAI(args.latency, args.error_rate, args.throttle_rate, args.completion_tokens)
+        fake_server = FakeAzureServer(fake, port=getattr(args, "port", None)).start()
+        print(f"Fake Azure OpenAI listening on {fake_server.url} (latency {args.latency})", file=sys.stderr)
+    configure_environment(fake_server.url if fake_server else None, getattr(args, "with_caches", False))
+
+    try:
+        if args.command == "fake-azure":
+            while True:
+                time.sleep(3600)
+        if args.command == "micro":
+            from benchmarks.micro import run_micro
+            results = run_micro(parse_sizes(args.sizes), args.min_seconds)
+            print_table(results, ["benchmark", "size", "value", "unit"])
+        else:
+            from benchmarks.load import run_load
+            results = asyncio.run(run_load(
+                parse_sizes(args.sizes), args.endpoints.split(","), args.requests, args.concurrency,
+                target=args.target, fake=fake_server.fake if fake_server else None
+            ))
+            print_table(results, ["endpoint", "size", "concurrency", "requests", "rps", "p50_ms", "p95_ms", "p99_ms", "statuses"])
+            if fake_server:
+                print(f"Fake Azure: {fake_server.fake.stats()}", file=sys.stderr)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if fake_server:
+            fake_server.stop()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as output:
+            json.dump({"command": args.command, "created": time.time(), "results": results}, output, indent=2)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+_DEPARTMENTS = re.compile(r"Available Departments: (.*)")
+_SKILLS = re.compile(r"Available Skills: (.*)")
+
+
+class LatencyDistribution:
+    """Response latency in seconds, parsed from "const:0.2", "uniform:0.1,0.5", "lognormal:0.3,0.5" or "exp:0.25".
+
+    lognormal takes the median and sigma; exp takes the mean.
+    """
+
+    def __init__(self, spec: str = "const:0"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value]
+        if kind not in ("const", "uniform", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "const":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return median * rng.lognormvariate(0.0, sigma)
+        return rng.expovariate(1.0 / self.params[0])
+
+
+class FakeAzureOpenAI:
+    """Chat-completions stand-in that answers like the deployment the service expects.
+
+    Classification prompts get a department and skills picked from the ones listed in
+    the prompt (consistent with each other when skill_departments maps skills to the
+    departments holding them), drafting and regeneration prompts get summary/email JSON. Latency,
+    error and throttling rates and completion sizes are configurable, rate-limit
+    headers are sent with every response and streaming requests are answered as SSE.
+    """
+
+    def __init__(self, latency: str = "const:0.05", error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 completion_tokens: int = 60, seed: int = 0):
+        self.latency = LatencyDistribution(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.completion_tokens = completion_tokens
+        self.rng = random.Random(seed)
+        self.skill_departments: Dict[str, List[str]] = {}
+        self.requests = 0
+        self.responses: Dict[int, int] = {}
+        self.app = Starlette(routes=[
+            Route("/openai/deployments/{deployment}/chat/completions", self.chat_completions, methods=["POST"])
+        ])
+
+    def answer(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        prompt = messages[-1]["content"] if messages else ""
+        if "Improve the following" in prompt:
+            return {"summary": "Clear, structured summary of the incident.",
+                    "email": {"subject": "Incident update", "body": "Dear team, please find the incident details below."}}
+        if "Write the ticket text" in prompt:
+            return {"summary": "User-facing service is degraded and needs attention.",
+                    "email": "Hello, an incident has been assigned to you. Please review and respond."}
+        departments = _DEPARTMENTS.search(prompt)
+        skills = _SKILLS.search(prompt)
+        department_options = departments.group(1).split(", ") if departments else ["Admin"]
+        skill_options = skills.group(1).split(", ") if skills else ["general support"]
+        known = [skill for skill in skill_options if skill in self.skill_departments]
+        if known:
+            skill = self.rng.choice(known)
+            department = self.rng.choice(self.skill_departments[skill])
+            required_skills = [skill]
+        else:
+            department = self.rng.choice(department_options)
+            required_skills = self.rng.sample(skill_options, min(2, len(skill_options)))
+        return {
+            "category": "Service Disruption",
+            "severity": self.rng.choice(["Low", "Medium", "High"]),
+            "department": department,
+            "required_skills": required_skills,
+            "title": f"Incident {uuid.uuid4().hex[:8]}"
+        }
+
+    def _headers(self) -> Dict[str, str]:
+        return {"x-ratelimit-remaining-requests": "10000", "x-ratelimit-remaining-tokens": "1000000"}
+
+    async def chat_completions(self, request: Request) -> Response:
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency.sample(self.rng))
+
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            return self._respond(JSONResponse(
+                {"error": {"code": "429", "message": "Rate limit is exceeded."}}, status_code=429,
+                headers={**self._headers(), "retry-after-ms": "200"}
+            ))
+        if roll < self.throttle_rate + self.error_rate:
+            return self._respond(JSONResponse({"error": {"code": "500", "message": "Internal error"}}, status_code=500))
+
+        messages = body.get("messages", [])
+        content = json.dumps(self.answer(messages))
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                 "total_tokens": prompt_tokens + self.completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "gpt-4o")
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return self._respond(StreamingResponse(
+                self._stream(completion_id, model, content, usage if include_usage else None),
+                media_type="text/event-stream", headers=self._headers()
+            ))
+        return self._respond(JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        }, headers=self._headers()))
+
+    async def _stream(self, completion_id: str, model: str, content: str, usage: Optional[Dict[str, int]]):
+        def chunk(choices, extra=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": choices, **(extra or {})}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        for start in range(0, len(content), 16):
+            yield chunk([{"index": 0, "delta": {"content": content[start:start + 16]}, "finish_reason": None}])
+            await asyncio.sleep(0)
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage is not None:
+            yield chunk([], {"usage": usage})
+        yield "data: [DONE]\n\n"
+
+    def _respond(self, response: Response) -> Response:
+        self.responses[response.status_code] = self.responses.get(response.status_code, 0) + 1
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "responses": dict(self.responses), "latency": self.latency.spec}
+
+
+class FakeAzureServer:
+    """Runs a FakeAzureOpenAI app with uvicorn on a background thread of this process."""
+
+    def __init__(self, fake: FakeAzureOpenAI, host: str = "127.0.0.1", port: Optional[int] = None):
+        self.fake = fake
+        self.host = host
+        self.port = port or self._free_port(host)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket() as probe:
+            probe.bind((host, 0))
+            return probe.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "FakeAzureServer":
+        import uvicorn
+        config = uvicorn.Config(self.fake.app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="fake-azure", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake Azure server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
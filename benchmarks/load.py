@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.fake_azure import FakeAzureOpenAI
+from benchmarks.micro import DESCRIPTIONS
+from benchmarks.roster import generate_roster
+
+ENDPOINTS = {
+    "classify": "/api/v1/incidents/classify-summarize",
+    "regenerate": "/api/v1/incidents/regenerate"
+}
+
+
+def request_body(endpoint: str, number: int, rng: random.Random) -> Dict[str, Any]:
+    if endpoint == "regenerate":
+        return {"summary": f"Incident {number}: {rng.choice(DESCRIPTIONS)}", "email": "Please look into this issue."}
+    # A request number and random words keep descriptions distinct, so every request reaches the model
+    noise = " ".join(rng.choice(("urgent", "again", "since", "today", "morning", "floor", "team", "site"))
+                     for _ in range(4))
+    return {"description": f"{rng.choice(DESCRIPTIONS)} ({noise}, ref {number})"}
+
+
+def summarize(endpoint: str, size: int, latencies_ns: List[int], statuses: Dict[int, int], elapsed: float,
+              concurrency: int) -> Dict[str, Any]:
+    latencies_ms = np.array(latencies_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = (np.percentile(latencies_ms, q) if len(latencies_ms) else 0.0 for q in (50, 95, 99))
+    return {
+        "endpoint": endpoint,
+        "size": size,
+        "concurrency": concurrency,
+        "requests": len(latencies_ns),
+        "rps": round(len(latencies_ns) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+
+async def drive(client, endpoint: str, total: int, concurrency: int, seed: int = 0):
+    """Closed-loop load: `concurrency` clients issue `total` requests back to back."""
+    rng = random.Random(seed)
+    path = ENDPOINTS[endpoint]
+    latencies_ns: List[int] = []
+    statuses: Dict[int, int] = {}
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            issued += 1
+            body = request_body(endpoint, issued, rng)
+            started = time.perf_counter_ns()
+            try:
+                response = await client.post(path, json=body)
+                status = response.status_code
+            except Exception:
+                status = 0
+            latencies_ns.append(time.perf_counter_ns() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies_ns, statuses, time.perf_counter() - started
+
+
+async def run_load(sizes: Sequence[int], endpoints: Sequence[str], requests: int, concurrency: int,
+                   warmup: int = 20, seed: int = 0, target: Optional[str] = None,
+                   fake: Optional[FakeAzureOpenAI] = None) -> List[Dict[str, Any]]:
+    """Runs the app in-process (or against target, a base URL) once per roster size and endpoint.
+
+    In-process runs swap in a synthetic roster of each size before driving load, so the
+    numbers show how routing cost grows with the roster; the fake deployment is told
+    which departments hold which skills so its answers route like real ones.
+    """
+    import httpx
+
+    results: List[Dict[str, Any]] = []
+    if target:
+        async with httpx.AsyncClient(base_url=target, timeout=120) as client:
+            for endpoint in endpoints:
+                await drive(client, endpoint, warmup, concurrency, seed)
+                latencies, statuses, elapsed = await drive(client, endpoint, requests, concurrency, seed + 1)
+                results.append(summarize(endpoint, 0, latencies, statuses, elapsed, concurrency))
+        return results
+
+    from app import app
+    from services.roster_index import RosterIndex, swap_roster_index
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            for size in sizes:
+                roster = RosterIndex(generate_roster(size, seed=seed))
+                swap_roster_index(roster)
+                if fake is not None:
+                    fake.skill_departments = {
+                        skill: sorted({entry.department for entry in roster.staff_with_skill(skill)})
+                        for skill in roster.skills
+                    }
+                for endpoint in endpoints:
+                    await drive(client, endpoint, warmup, concurrency, seed)
+                    latencies, statuses, elapsed = await drive(client, endpoint, requests, concurrency, seed + 1)
+                    results.append(summarize(endpoint, size, latencies, statuses, elapsed, concurrency))
+    return results
@@ -0,0 +1,109 @@
+import random
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from benchmarks.roster import DEPARTMENTS, generate_roster
+
+DESCRIPTIONS = (
+    "VPN keeps disconnecting every few minutes when working from home",
+    "Payroll run failed for the March cycle and employees were not paid",
+    "The general ledger posting in D365 F&O throws an error on period close",
+    "Custom plugin in Dynamics CE crashes when saving a case record",
+    "The network printer on the third floor is printing blank pages",
+    "Need access to the visitor logs for the audit next week"
+)
+
+
+def measure(fn: Callable[[], Any], min_seconds: float = 0.2, repeat: int = 3) -> float:
+    """Best per-call time in seconds over `repeat` rounds of at least min_seconds each."""
+    fn()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds / 10 or loops >= 1 << 20:
+            break
+        loops *= 2
+    loops = max(1, int(loops * (min_seconds / max(elapsed, 1e-9))))
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - started) / loops)
+    return best
+
+
+def result(name: str, size: int, seconds: float) -> Dict[str, Any]:
+    return {"benchmark": name, "size": size, "value": round(seconds * 1e6, 3), "unit": "us", "better": "lower"}
+
+
+def run_micro(sizes: Sequence[int], min_seconds: float = 0.2, seed: int = 0) -> List[Dict[str, Any]]:
+    """Times roster indexing, staff selection, screening, prompt retrieval and response building per roster size."""
+    from config import settings
+    from services.content_validators import ContentValidator
+    from services.response_builder import ResponseBuilder
+    from services.roster_index import RosterIndex, get_roster_index, swap_roster_index
+    from services.skill_matcher import SkillMatcher
+    from services.skill_retriever import get_skill_retriever
+    from services.staff_selector import StaffSelector
+    from services.workload import WorkloadTracker
+
+    rng = random.Random(seed)
+    results: List[Dict[str, Any]] = []
+
+    validator = ContentValidator()
+    for index, description in enumerate(DESCRIPTIONS[:2]):
+        results.append(result(f"content_validator.screen[{index}]", 0,
+                              measure(lambda: validator.find_inappropriate_content(description), min_seconds)))
+
+    balancing = settings.workload_balancing_enabled
+    matching = settings.skill_matching_mode
+    try:
+        for size in sizes:
+            records = generate_roster(size, seed=seed)
+
+            results.append(result("roster_index.build", size, measure(lambda: RosterIndex(records), min_seconds)))
+            swap_roster_index(RosterIndex(records))
+            roster = get_roster_index()
+
+            def build_skill_index():
+                # What SkillIndexer.skill_index costs the first time after a roster swap
+                roster._skill_index = None
+                return roster.skill_index
+
+            results.append(result("skill_indexer.skill_index", size, measure(build_skill_index, min_seconds)))
+            results.append(result("skill_matcher.build", size, measure(lambda: SkillMatcher(roster), min_seconds)))
+            results.append(result("skill_retriever.select_candidates", size, measure(
+                lambda: get_skill_retriever().select_candidates(rng.choice(DESCRIPTIONS), 25, 4), min_seconds
+            )))
+
+            queries = [(department, rng.sample(list(skills), 2)) for department, skills in DEPARTMENTS.items()]
+            selector = StaffSelector(WorkloadTracker())
+            for mode in ("exact", "vector"):
+                settings.skill_matching_mode = mode
+                for balanced in (False, True):
+                    settings.workload_balancing_enabled = balanced
+                    name = f"staff_selector.{mode}{'.balanced' if balanced else ''}"
+                    results.append(result(name, size, measure(
+                        lambda: selector.select_best_staff(*reversed(rng.choice(queries))), min_seconds
+                    )))
+
+            builder = ResponseBuilder(selector)
+            department, skills = queries[0]
+            staff = selector.select_best_staff(skills, department)
+            classification = {"category": "Service Disruption", "severity": "High", "department": department,
+                              "required_skills": skills, "title": "Benchmark", "summary": "s", "email": "e"}
+            results.append(result("response_builder.classification", size, measure(
+                lambda: builder.create_classification_response(classification, staff, department, skills, department),
+                min_seconds
+            )))
+            results.append(result("response_builder.fallback", size, measure(
+                lambda: builder.create_fallback_response("Benchmark", is_unclassified=True), min_seconds
+            )))
+    finally:
+        settings.workload_balancing_enabled = balancing
+        settings.skill_matching_mode = matching
+    return results
@@ -0,0 +1,54 @@
+import random
+import uuid
+from typing import Dict, List, Optional, Sequence
+
+from utils.types import Staff
+
+DEPARTMENTS: Dict[str, Sequence[str]] = {
+    "IT Support": ("Laptop troubleshooting", "Windows OS", "VPN troubleshooting", "Network printers", "MFA",
+                   "Office 365", "Antivirus deployment", "BitLocker", "Active Directory", "Email configuration"),
+    "HR": ("HR leadership", "Labor law compliance", "Performance appraisals", "Payroll processing",
+           "Onboarding", "Grievance handling", "Benefits administration", "Recruitment"),
+    "Finance & Operations (MBS)": ("D365 F&O", "General ledger", "Accounts payable", "ERP migration",
+                                   "Fiscal calendars", "SSRS reports", "Procurement tracking", "Budgeting"),
+    "Customer Experience/CRM": ("D365 CE", "Custom plugins", "Power Automate", "Canvas apps", "Call routing",
+                                "Dataverse", "CE testing", "Duplicate detection"),
+    "Admin": ("General support", "Office maintenance", "Visitor logs", "Facility operations", "Asset tagging")
+}
+_QUALIFIERS = ("", "", "", "advanced", "legacy", "cloud", "regional", "enterprise")
+
+
+def generate_roster(size: int, seed: int = 0, departments: Optional[Dict[str, Sequence[str]]] = None,
+                    skills_per_staff: int = 4, availability: float = 0.9) -> List[Staff]:
+    """Synthetic staff records in the staff feed's shape.
+
+    Skills are drawn from each department's vocabulary, some with a qualifier prefix,
+    so larger rosters also have more distinct skills, as real ones do.
+    """
+    rng = random.Random(seed)
+    departments = departments or DEPARTMENTS
+    names = list(departments)
+    records: List[Staff] = []
+    for number in range(size):
+        department = names[number % len(names)] if number < len(names) else rng.choice(names)
+        vocabulary = departments[department]
+        skills = set()
+        while len(skills) < min(skills_per_staff, len(vocabulary)):
+            qualifier = rng.choice(_QUALIFIERS)
+            skill = rng.choice(vocabulary)
+            skills.add(f"{qualifier} {skill}".strip() if qualifier else skill)
+        staff_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        records.append({
+            "@odata.etag": f'W/"{number}"',
+            "cr6dd_staff1id": staff_id,
+            "cr6dd_staffid": f"STF-{number:06d}",
+            "cr6dd_departmentname": department,
+            "cr6dd_skillset": ",".join(sorted(skills)),
+            # The first staff member of each department is always available
+            "cr6dd_availability": "True" if number < len(names) or rng.random() < availability else "False",
+            "cr6dd_UserID": {
+                "cr6dd_name": f"Staff {number}",
+                "cr6dd_email": f"staff{number}@example.com"
+            }
+        })
+    return records
@@ -5,17 +5,34 @@ from dotenv import load_dotenv
  
 load_dotenv()
 
-INAPPROPRIATE_PATTERNS = [
-    r'\b(fuck|shit|damn|bitch|asshole|crap)\b',
-    r'\b(hate|kill|die|murder|suicide)\b',
-    r'\b(porn|sex|nude|naked)\b',
-    r'\b(racist|sexist|homophobic)\b'
+# Built-in screening rules; settings.screening_wordlist_path adds more
+INAPPROPRIATE_TERMS = {
+    "profanity": ["fuck", "shit", "damn", "bitch", "asshole", "crap"],
+    "violence": ["hate", "kill", "die", "murder", "suicide"],
+    "sexual": ["porn", "sex", "nude", "naked"],
+    "discrimination": ["racist", "sexist", "homophobic"]
+}
+
+HIGH_SEVERITY_KEYWORDS = [
+    "outage", "down", "breach", "hacked", "phishing", "ransomware", "malware", "virus", "security",
+    "urgent", "critical", "emergency", "all users", "everyone", "production", "data loss", "cannot access"
+]
+LOW_SEVERITY_KEYWORDS = [
+    "request", "question", "how to", "how do", "new account", "minor", "cosmetic", "when possible", "information"
 ]
 
 DEFAULT_FALLBACK_DEPARTMENT = "Admin"
 DEFAULT_FALLBACK_SKILLS = ["general support"]
+DEFAULT_SEVERITY = "Medium"
 AI_TEMPERATURE = 0.2
 AI_MAX_TOKENS = 400
+AI_CLASSIFY_MAX_TOKENS = 150
+
+# USD per 1K (prompt, completion) tokens, used for cost estimates in the usage ledger
+MODEL_PRICING_PER_1K_TOKENS = {
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006)
+}
 
 class Settings(BaseSettings):
     title: str = "AI Incident Triage and Resolution Assistant"
@@ -25,7 +42,160 @@ class Settings(BaseSettings):
     azure_api_version: str = "2024-12-01-preview"
     azure_model: str = "gpt-4o"
 
-    
+    # Power Automate HTTP trigger that returns the staff roster
+    staff_feed_url: str = (
+        "https://5f257beee4e8e7459c386335509b51.00.environment.api.powerplatform.com:443"
+        "/powerautomate/automations/direct/workflows/3a1112fadb5b43d68c8a52b8f26efc01"
+        "/triggers/manual/paths/invoke/?api-version=1&tenantId=tId"
+        "&environmentName=5f257bee-e4e8-e745-9c38-6335509b5100"
+        "&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=efZ9TBpZp1te-ko_d4CaPIS2fhLfb8BGbLguWNdoJg4"
+    )
+    staff_refresh_enabled: bool = True
+    staff_refresh_interval_seconds: float = 300.0
+    # A poll that would remove more than this share of the roster is treated as a feed glitch
+    staff_feed_max_removed_fraction: float = 0.5
+
+    # Shared outbound HTTP pool (staff feed and Azure OpenAI)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    http_connect_timeout_seconds: float = 5.0
+    http_timeout_seconds: float = 60.0
+    http2_enabled: bool = True
+
+    # Classification cache in front of the model call
+    classification_cache_enabled: bool = True
+    classification_cache_max_entries: int = 2048
+    classification_cache_ttl_seconds: float = 3600.0
+    classification_cache_near_duplicate_threshold: float = 0.8
+
+    # Share one in-flight model call between concurrent identical descriptions
+    classification_single_flight_enabled: bool = True
+
+    # Staff scoring: "vector" (cosine over word/trigram features) or "exact" (skill string overlap)
+    skill_matching_mode: str = "vector"
+    skill_match_min_similarity: float = 0.3
+    skill_match_tie_tolerance: float = 0.05
+
+    # Hashed skill embeddings used to map LLM-proposed departments and skills onto the roster
+    embedding_index_enabled: bool = True
+    embedding_index_dir: Optional[str] = ".cache/embeddings"
+    embedding_dim: int = 256
+    embedding_lsh_tables: int = 8
+    embedding_lsh_bits: int = 8
+    embedding_exact_search_max: int = 20000
+    embedding_min_similarity: float = 0.45
+    embedding_description_skills: int = 3
+
+    # Spread tickets over equally skilled staff by open-assignment count
+    workload_balancing_enabled: bool = True
+    workload_max_open_assignments: int = 100000
+    # Selection heaps kept at once (one per department, skill and tied-candidate bucket)
+    workload_max_heaps: int = 4096
+    # Shared counters with more than one worker: staff slots (keep well above the roster size)
+    # and the change log workers read to refresh their heaps
+    workload_shared_slots: int = 131072
+    workload_change_log_size: int = 65536
+
+    # Prompt candidate pre-selection (0 sends the full skills catalogue)
+    prompt_top_k_skills: int = 25
+    prompt_top_k_departments: int = 4
+
+    # Content screening word list ("[rule]" headers, one term per line, "re:" for regexes)
+    screening_wordlist_path: Optional[str] = None
+    screening_reload_interval_seconds: float = 30.0
+
+    # Local fast-path classifier
+    local_classifier_enabled: bool = True
+    local_classifier_threshold: float = 0.6
+    # Model-labelled examples a department needs before local predictions for it skip the model
+    local_classifier_min_examples: int = 5
+
+    # Summary/email drafting after assignment: "inline", "background" or "deferred"
+    email_draft_mode: str = "background"
+    draft_ttl_seconds: float = 3600.0
+    draft_max_entries: int = 10000
+    draft_wait_timeout_seconds: float = 30.0
+
+    # Azure OpenAI client-side scheduling; quotas of 0 are learned from x-ratelimit-* headers
+    azure_requests_per_minute: float = 0.0
+    azure_tokens_per_minute: float = 0.0
+    azure_initial_concurrency: int = 8
+    azure_max_concurrency: int = 64
+    azure_max_retries: int = 6
+    azure_retry_deadline_seconds: float = 45.0
+    azure_backoff_base_seconds: float = 0.5
+    azure_backoff_max_seconds: float = 20.0
+
+    # Structured model replies: JSON mode on every call, and follow-up calls that ask
+    # only for the required fields a reply is missing
+    ai_json_mode: bool = True
+    ai_field_retry_attempts: int = 1
+
+    # Incident history: "sqlite" (WAL database at incident_store_path), "none", or
+    # "package.module:ClassName" for another IncidentStore; written in batches off the request path
+    incident_store_backend: str = "sqlite"
+    incident_store_path: str = ".cache/incidents.db"
+    incident_writer_batch_size: int = 100
+    incident_writer_flush_seconds: float = 0.5
+    incident_writer_queue_size: int = 10000
+    # Recent model classifications replayed into the cache and local classifier at startup
+    incident_warmup_limit: int = 500
+
+    # Background jobs (queued triage and regeneration); 0 workers sizes the pool to
+    # azure_initial_concurrency. Unfinished jobs are spilled to the incident store on shutdown
+    job_workers: int = 0
+    job_max_attempts: int = 3
+    job_retry_backoff_seconds: float = 2.0
+    job_max_preemptions: int = 3
+    job_ttl_seconds: float = 3600.0
+    job_max_entries: int = 10000
+    job_callback_timeout_seconds: float = 10.0
+    # callback_url must use https and either match a comma-separated host (or parent
+    # domain) here or, when this is empty, resolve only to public addresses
+    job_callback_require_https: bool = True
+    job_callback_allowed_hosts: str = ""
+
+    # Admission in front of Azure OpenAI: weighted-fair queues per ticket class, per-class
+    # caps (0 = none) and the longest a call may wait before it is dropped to a fallback
+    admission_enabled: bool = True
+    admission_severity_boost: bool = True
+    admission_interactive_weight: float = 8.0
+    admission_interactive_max_concurrency: int = 0
+    admission_interactive_max_wait_seconds: float = 10.0
+    admission_batch_weight: float = 1.0
+    admission_batch_max_concurrency: int = 0
+    admission_batch_max_wait_seconds: float = 120.0
+    admission_regeneration_weight: float = 2.0
+    admission_regeneration_max_concurrency: int = 0
+    admission_regeneration_max_wait_seconds: float = 30.0
+
+    # Batch classification
+    batch_max_items: int = 500
+    batch_max_concurrency: int = 8
+
+    # NDJSON streaming triage
+    stream_window_size: int = 16
+    stream_max_line_bytes: int = 65536
+
+    # Tokens-per-minute budget across all model calls (0 disables); classification
+    # degrades to the local classifier when over budget, other calls wait up to the limit
+    token_budget_per_minute: int = 0
+    token_budget_max_wait_seconds: float = 10.0
+    token_budget_degrade_to_local: bool = True
+
+    # Adds a Server-Timing header with per-stage durations to every response
+    server_timing_enabled: bool = False
+
+    # Startup: "background" builds services while serving, "eager" before serving, "lazy" on first request
+    service_warmup: str = "background"
+    roster_snapshot_path: Optional[str] = ".cache/roster.snapshot"
+
+    # Worker processes; with more than one, workers share the roster through the snapshot file
+    # and open-assignment counts through <snapshot>.workload. Workers started with
+    # `uvicorn --workers` are detected and share state the same way
+    workers: int = 1
+    roster_sync_interval_seconds: float = 1.0
 
     log_level: str = "INFO"
     host: str = "0.0.0.0"
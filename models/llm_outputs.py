@@ -0,0 +1,73 @@
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import Any, ClassVar, List, Optional, Tuple
+from config import DEFAULT_SEVERITY
+from models.enums import SeverityEnum
+
+# Severity words models use outside the enum; any other word falls back to DEFAULT_SEVERITY
+_SEVERITY_ALIASES = {
+    "Critical": "High", "Urgent": "High", "Severe": "High", "Blocker": "High",
+    "Moderate": "Medium", "Normal": "Medium", "Minor": "Low", "Trivial": "Low",
+}
+
+
+class StructuredOutput(BaseModel):
+    """JSON object expected from a model call.
+
+    Fields that are absent or fail validation come out as None instead of failing the
+    whole object, so callers can keep the valid part and ask again only for the rest.
+    An empty list is an answer (e.g. no skills for an "Unclassified" ticket), not a gap.
+    """
+
+    REQUIRED: ClassVar[Tuple[str, ...]] = ()
+
+    @field_validator("*", mode="wrap")
+    @classmethod
+    def _drop_invalid(cls, value: Any, handler):
+        try:
+            return handler(value)
+        except ValidationError:
+            return None
+
+    def missing_fields(self) -> List[str]:
+        return [field for field in self.REQUIRED if getattr(self, field) in (None, "")]
+
+
+class ClassificationOutput(StructuredOutput):
+    REQUIRED: ClassVar[Tuple[str, ...]] = ("category", "severity", "department", "required_skills")
+
+    category: Optional[str] = None
+    severity: Optional[SeverityEnum] = None
+    department: Optional[str] = None
+    required_skills: Optional[List[str]] = None
+    title: Optional[str] = None
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _severity_case(cls, value: Any):
+        if not isinstance(value, str) or not value.strip():
+            return value
+        severity = value.strip().capitalize()
+        if severity in SeverityEnum._value2member_map_:
+            return severity
+        return _SEVERITY_ALIASES.get(severity, DEFAULT_SEVERITY)
+
+    @field_validator("required_skills", mode="before")
+    @classmethod
+    def _skills_list(cls, value: Any):
+        if isinstance(value, str):
+            return [skill.strip() for skill in value.split(",") if skill.strip()]
+        return value
+
+
+class TicketTextOutput(StructuredOutput):
+    """Summary and email, for drafting and regeneration; an {"subject", "body"} email keeps its body."""
+
+    REQUIRED: ClassVar[Tuple[str, ...]] = ("summary", "email")
+
+    summary: Optional[str] = None
+    email: Optional[str] = None
+
+    @field_validator("email", mode="before")
+    @classmethod
+    def _email_body(cls, value: Any):
+        return value.get("body") if isinstance(value, dict) else value
@@ -1,11 +1,39 @@
 from pydantic import BaseModel,Field
-from typing import Optional
+from typing import Annotated, List, Literal, Optional
+from config import settings
+
+# Shared by every endpoint that takes incident text, so single, batch and stream accept the same input
+IncidentDescription = Annotated[str, Field(min_length=10, max_length=2000)]
 
 class IncidentRequest(BaseModel):
-    description:str = Field(...,min_length=10,max_length=2000)
+    description: IncidentDescription
+    force_llm: bool = False
+    draft_mode: Optional[Literal["inline", "background", "deferred"]] = None
+
+
+
+class BatchIncidentRequest(BaseModel):
+    descriptions: List[IncidentDescription] = Field(..., min_length=1, max_length=settings.batch_max_items)
+
+
+
+class CandidateRequest(BaseModel):
+    required_skills: List[str] = Field(..., min_length=1)
+    department: str
+    top_k: int = Field(5, ge=1, le=100)
 
 
 
 class RegenerateRequest(BaseModel):
     summary:str
     email:str
+
+
+
+class IncidentJobRequest(IncidentRequest):
+    callback_url: Optional[str] = None
+
+
+
+class RegenerateJobRequest(RegenerateRequest):
+    callback_url: Optional[str] = None
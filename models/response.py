@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List,Dict
+from typing import List,Dict,Any
 from typing import Optional
 
 class AIClassificationResponse(BaseModel):
@@ -19,6 +19,43 @@ class StaffAssignment(BaseModel):
 class ClassificationWithStaffResponse(BaseModel):
     classification: AIClassificationResponse
     staff_assignment: StaffAssignment
+    processing_details: Optional[Dict[str, Any]] = None
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: ClassificationWithStaffResponse
+    processing_time_ms: int
+    duplicate_of: Optional[int] = None
+
+class BatchClassificationResponse(BaseModel):
+    results: List[BatchItemResult]
+    total: int
+    unique_descriptions: int
+    model_calls: int
+    processing_time_ms: int
+
+
+class DraftResponse(BaseModel):
+    draft_id: str
+    status: str
+    summary: str
+    email: str
+    error: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    priority: int
+    attempts: int
+    preemptions: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 
 class RegenerateResponse(BaseModel):
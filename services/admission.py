@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config import settings
+from utils.logging import logger
+from utils.metrics import metrics
+
+ADMISSION_CLASSES = ("interactive", "batch", "regeneration")
+
+# (ticket class, predicted severity) of the work the current task is doing
+_admission_context: ContextVar[Tuple[Optional[str], Optional[str]]] = ContextVar("admission_context", default=(None, None))
+
+
+@contextmanager
+def admission_context(ticket_class: Optional[str] = None, severity: Optional[str] = None) -> Iterator[None]:
+    """Tags model calls made inside the block; None keeps what an outer block set."""
+    current_class, current_severity = _admission_context.get()
+    token = _admission_context.set((ticket_class or current_class, severity or current_severity))
+    try:
+        yield
+    finally:
+        _admission_context.reset(token)
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a model call could not be admitted before its deadline, in either scheduler."""
+
+
+class Ticket:
+    __slots__ = ("ticket_class", "boosted", "deadline", "enqueued_at", "future", "admitted")
+
+    def __init__(self, ticket_class: str, boosted: bool, deadline: float):
+        self.ticket_class = ticket_class
+        self.boosted = boosted
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future: Optional[asyncio.Future] = None
+        self.admitted = False
+
+
+class _ClassQueue:
+    def __init__(self, name: str):
+        self.name = name
+        self.waiting: List[Tuple[int, int, Ticket]] = []
+        self.in_flight = 0
+        self.pass_value = 0.0
+        self.admitted = 0
+        self.dropped = 0
+        self.dropped_early = 0
+
+    def setting(self, name: str) -> Any:
+        return getattr(settings, f"admission_{self.name}_{name}")
+
+    def head(self) -> Optional[Ticket]:
+        while self.waiting and self.waiting[0][2].future.done():
+            heapq.heappop(self.waiting)
+        return self.waiting[0][2] if self.waiting else None
+
+    def depth(self) -> int:
+        return sum(1 for _, _, ticket in self.waiting if not ticket.future.done())
+
+
+class AdmissionScheduler:
+    """Weighted-fair admission of model calls by ticket class, in front of the Azure client.
+
+    At most capacity() calls (the Azure scheduler's current AIMD limit) are admitted at
+    once. Waiting calls queue per class (interactive, batch, regeneration); a freed slot
+    goes to the class with the lowest stride-scheduling pass value, which advances by
+    1/weight per admission, so under load each class gets slots in proportion to its
+    weight and an idle class cannot bank credit. Per-class caps bound how many slots a
+    class may hold. With admission_severity_boost, calls whose description predicts
+    High severity go ahead of their class and are served before any unboosted head.
+    A call that cannot be admitted within its class's max wait - or that is already
+    expected not to be, from its queue position and recent call durations - raises
+    AdmissionTimeout so the caller can fall back instead of waiting.
+    """
+
+    def __init__(self, capacity: Callable[[], int]):
+        self.capacity = capacity
+        self._classes = {name: _ClassQueue(name) for name in ADMISSION_CLASSES}
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self._virtual_time = 0.0
+        # EWMA of admitted call durations; early drops wait until one has been measured
+        self._call_seconds: Optional[float] = None
+
+    @staticmethod
+    def resolve_class(call_site: str) -> Tuple[str, bool]:
+        ticket_class, severity = _admission_context.get()
+        if ticket_class not in ADMISSION_CLASSES:
+            ticket_class = "regeneration" if call_site == "regeneration" else "interactive"
+        return ticket_class, settings.admission_severity_boost and severity == "High"
+
+    def _has_room(self, queue: _ClassQueue) -> bool:
+        cap = queue.setting("max_concurrency")
+        return not cap or queue.in_flight < cap
+
+    def _admit(self, queue: _ClassQueue, ticket: Ticket):
+        weight = max(queue.setting("weight"), 1e-6)
+        queue.pass_value = max(queue.pass_value, self._virtual_time) + 1.0 / weight
+        self._virtual_time = min(
+            (other.pass_value for other in self._classes.values() if other.head() is not None or other is queue),
+            default=queue.pass_value
+        )
+        queue.in_flight += 1
+        queue.admitted += 1
+        self.in_flight += 1
+        ticket.admitted = True
+        metrics.observe_stage(f"admission.{queue.name}.wait", int((time.monotonic() - ticket.enqueued_at) * 1e9))
+
+    def _dispatch(self):
+        while self.in_flight < max(1, self.capacity()):
+            candidates = []
+            for queue in self._classes.values():
+                head = queue.head()
+                if head is not None and self._has_room(queue):
+                    candidates.append((not head.boosted, max(queue.pass_value, self._virtual_time), queue.name, queue))
+            if not candidates:
+                return
+            queue = min(candidates)[3]
+            ticket = heapq.heappop(queue.waiting)[2]
+            self._admit(queue, ticket)
+            ticket.future.set_result(None)
+
+    def _expected_wait(self, queue: _ClassQueue, ticket: Ticket) -> float:
+        """Rough time until admission: the calls ahead in the class over the class's share of slots."""
+        ahead = sum(1 for _, _, other in queue.waiting
+                    if not other.future.done() and (other.boosted, -other.enqueued_at) >= (ticket.boosted, -ticket.enqueued_at))
+        active = [other for other in self._classes.values() if other.head() is not None or other is queue]
+        total_weight = sum(other.setting("weight") for other in active) or 1.0
+        slots = max(1.0, self.capacity() * queue.setting("weight") / total_weight)
+        cap = queue.setting("max_concurrency")
+        if cap:
+            slots = min(slots, cap)
+        return ahead * self._call_seconds / slots
+
+    async def acquire(self, call_site: str) -> Ticket:
+        ticket_class, boosted = self.resolve_class(call_site)
+        queue = self._classes[ticket_class]
+        ticket = Ticket(ticket_class, boosted, time.monotonic() + queue.setting("max_wait_seconds"))
+
+        idle = all(other.head() is None for other in self._classes.values())
+        if idle and self.in_flight < max(1, self.capacity()) and self._has_room(queue):
+            self._admit(queue, ticket)
+            return ticket
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiting, (0 if boosted else 1, next(self._sequence), ticket))
+        self._dispatch()
+        if ticket.admitted:
+            return ticket
+        if self._call_seconds is not None and self._expected_wait(queue, ticket) > queue.setting("max_wait_seconds"):
+            ticket.future.cancel()
+            queue.dropped += 1
+            queue.dropped_early += 1
+            raise AdmissionTimeout(f"{ticket_class} admission queue is too long to meet its deadline")
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), ticket.deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            if ticket.admitted:
+                return ticket
+            ticket.future.cancel()
+            queue.dropped += 1
+            logger.warning(f"Dropped a {ticket_class} model call after {queue.setting('max_wait_seconds')}s in the admission queue")
+            raise AdmissionTimeout(f"{ticket_class} call was not admitted within {queue.setting('max_wait_seconds')}s")
+        except asyncio.CancelledError:
+            if ticket.admitted:
+                self.release(ticket)
+            else:
+                ticket.future.cancel()
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket, duration: Optional[float] = None):
+        if not ticket.admitted:
+            return
+        ticket.admitted = False
+        queue = self._classes[ticket.ticket_class]
+        queue.in_flight -= 1
+        self.in_flight -= 1
+        if duration is not None:
+            self._call_seconds = duration if self._call_seconds is None else 0.8 * self._call_seconds + 0.2 * duration
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.admission_enabled,
+            "capacity": self.capacity(),
+            "in_flight": self.in_flight,
+            "call_seconds_ewma": round(self._call_seconds, 3) if self._call_seconds is not None else None,
+            "classes": {
+                name: {
+                    "weight": queue.setting("weight"),
+                    "max_concurrency": queue.setting("max_concurrency"),
+                    "max_wait_seconds": queue.setting("max_wait_seconds"),
+                    "queue_depth": queue.depth(),
+                    "in_flight": queue.in_flight,
+                    "admitted": queue.admitted,
+                    "dropped": queue.dropped,
+                    "dropped_early": queue.dropped_early
+                }
+                for name, queue in self._classes.items()
+            }
+        }
+
+    def render_prometheus(self) -> List[str]:
+        stats = self.stats()["classes"]
+        lines = []
+        for key, kind in (("queue_depth", "gauge"), ("in_flight", "gauge"), ("admitted", "counter"), ("dropped", "counter")):
+            name = f"admission_{key}_total" if kind == "counter" else f"admission_{key}"
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [f'{name}{{class="{ticket_class}"}} {values[key]}' for ticket_class, values in stats.items()]
+        return lines
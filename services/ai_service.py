@@ -1,13 +1,234 @@
+import asyncio
+import random
+import time
+import httpx
+import openai
 from openai import AsyncAzureOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
 from config import settings
+from utils.http_client import http_pool
+from services.usage_ledger import usage_ledger, estimate_tokens
+from services.admission import AdmissionScheduler, AdmissionTimeout
 from utils.logging import logger
+from utils.metrics import metrics
+
+# Errors worth retrying; anything else fails the call straight away
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+THROTTLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads the server's retry hint (retry-after-ms / retry-after) from an OpenAI error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class TokenBucket:
+    """Per-minute quota bucket; a rate of 0 means unknown, which admits everything until headers say otherwise."""
+
+    def __init__(self, per_minute: float = 0.0):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.per_minute > 0:
+            self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        if self.per_minute <= 0 or self.level >= min(amount, self.per_minute):
+            return 0.0
+        return (min(amount, self.per_minute) - self.level) * 60 / self.per_minute
+
+    def take(self, amount: float):
+        if self.per_minute > 0:
+            self.level -= amount
+
+    def observe(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Aligns the bucket with the server's view from x-ratelimit-* headers."""
+        self._refill(now)
+        if limit and limit != self.per_minute:
+            self.per_minute = limit
+            self.level = min(self.level, limit) if self.level else limit
+        if remaining is not None and self.per_minute > 0:
+            self.level = min(self.level, remaining)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+def _header_number(headers: Any, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name) if headers is not None else None
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AzureRequestScheduler:
+    """Client-side admission, retry and concurrency control shared by every Azure OpenAI call.
+
+    Each call passes three gates: a global pause set by the last 429's retry hint, the
+    request and token buckets (kept in line with the x-ratelimit-* response headers), and
+    an AIMD concurrency limit that grows by one slot per limit's worth of successes and
+    halves on throttling. Retryable failures are retried with full-jitter exponential
+    backoff, or the server's hint, until azure_retry_deadline_seconds has passed.
+    """
 
-class AzureClient:
     def __init__(self):
-        self._configure_client()
+        self.requests = TokenBucket(settings.azure_requests_per_minute)
+        self.tokens = TokenBucket(settings.azure_tokens_per_minute)
+        self.limit = float(settings.azure_initial_concurrency)
+        self.in_flight = 0
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
 
-    def _configure_client(self):
+    async def acquire(self, estimated_tokens: int, deadline: float):
+        """Waits for the pause, both buckets and a concurrency slot; raises AdmissionTimeout past the deadline."""
+        async with self.condition:
+            while True:
+                now = time.monotonic()
+                delay = max(
+                    self._resume_at - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(estimated_tokens, now)
+                )
+                if delay <= 0 and self.in_flight < int(self.limit):
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    self.in_flight += 1
+                    return
+                if now >= deadline:
+                    raise AdmissionTimeout("Azure OpenAI admission deadline exceeded")
+                timeout = min(delay if delay > 0 else deadline - now, deadline - now)
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout=max(timeout, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, outcome: str, headers: Any = None, error: Optional[Exception] = None):
+        """Frees the slot and feeds the outcome ("success", "throttled" or "error") to AIMD and the buckets."""
+        async with self.condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if headers is not None:
+                self.requests.observe(_header_number(headers, "x-ratelimit-limit-requests"),
+                                      _header_number(headers, "x-ratelimit-remaining-requests"), now)
+                self.tokens.observe(_header_number(headers, "x-ratelimit-limit-tokens"),
+                                    _header_number(headers, "x-ratelimit-remaining-tokens"), now)
+            if outcome == "success":
+                self.successes += 1
+                self.limit = min(float(settings.azure_max_concurrency), self.limit + 1 / self.limit)
+            elif outcome == "throttled":
+                self.throttles += 1
+                # One multiplicative decrease per burst of throttles rather than one per failed call
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                hinted = retry_after_seconds(error) if error is not None else None
+                if hinted is not None:
+                    self._resume_at = max(self._resume_at, now + hinted)
+                if isinstance(error, openai.RateLimitError):
+                    self.requests.drain(now)
+                    self.tokens.drain(now)
+            else:
+                self.failures += 1
+            self.condition.notify_all()
+
+    def backoff(self, error: Exception, attempt: int) -> float:
+        hinted = retry_after_seconds(error)
+        if hinted is not None:
+            return hinted + random.uniform(0, settings.azure_backoff_base_seconds)
+        cap = min(settings.azure_backoff_max_seconds, settings.azure_backoff_base_seconds * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    async def run(self, send: Callable[[], Awaitable[Any]], estimated_tokens: int,
+                  hold: bool = False) -> Any:
+        """Sends a request through admission and retries; with hold=True the caller releases the slot itself."""
+        deadline = time.monotonic() + settings.azure_retry_deadline_seconds
+        attempt = 0
+        while True:
+            await self.acquire(estimated_tokens, deadline)
+            try:
+                raw = await send()
+            except RETRYABLE_ERRORS as e:
+                throttled = isinstance(e, THROTTLE_ERRORS) or retry_after_seconds(e) is not None
+                await self.release("throttled" if throttled else "error", getattr(getattr(e, "response", None), "headers", None), e)
+                delay = self.backoff(e, attempt)
+                if attempt >= settings.azure_max_retries or time.monotonic() + delay > deadline:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Azure OpenAI retry {attempt} in {delay:.2f}s after {type(e).__name__}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                await self.release("error")
+                raise
+            if not hold:
+                await self.release("success", raw.headers)
+            return raw
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "paused_for_seconds": round(max(0.0, self._resume_at - now), 3),
+            "requests_per_minute": self.requests.per_minute,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_per_minute": self.tokens.per_minute,
+            "tokens_available": round(self.tokens.level, 1),
+            "successes": self.successes,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "failures": self.failures
+        }
+
+    def render_prometheus(self) -> List[str]:
+        stats = self.stats()
+        lines = []
+        for key in ("concurrency_limit", "in_flight", "tokens_available", "requests_available"):
+            lines += [f"# TYPE azure_scheduler_{key} gauge", f"azure_scheduler_{key} {stats[key]}"]
+        for key in ("successes", "throttles", "retries", "failures"):
+            lines += [f"# TYPE azure_scheduler_{key}_total counter", f"azure_scheduler_{key}_total {stats[key]}"]
+        return lines
+
+
+azure_scheduler = AzureRequestScheduler()
+metrics.add_collector(azure_scheduler.render_prometheus)
+admission_scheduler = AdmissionScheduler(lambda: int(azure_scheduler.limit))
+metrics.add_collector(admission_scheduler.render_prometheus)
+
+class AzureClient:
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._configure_client(http_client or http_pool.client)
+
+    def _configure_client(self, http_client: httpx.AsyncClient):
         if not settings.azure_api_key:
             raise ValueError("AZURE_API_KEY environment variable is required")
         if not settings.azure_endpoint:
@@ -17,26 +238,119 @@ class AzureClient:
             api_version=settings.azure_api_version,
             azure_endpoint=settings.azure_endpoint,
             api_key=settings.azure_api_key,
+            http_client=http_client,
+            timeout=settings.http_timeout_seconds,
+            max_retries=0,
         )
         self.model = settings.azure_model
         logger.info(f"Azure client configured with model: {self.model}")
 
     async def create_chat_completion(self, messages: List[Dict[str, str]], 
                                    temperature: float = 1.0,
-                                   max_tokens: int = 4096) -> Any:
+                                   max_tokens: int = 4096,
+                                   call_site: str = "default",
+                                   budget_wait: Optional[float] = None,
+                                   json_mode: bool = False) -> Any:
+        """Runs one completion; raises TokenBudgetExceeded if the token budget stays full past budget_wait.
+
+        json_mode asks the deployment for a JSON object reply (when settings.ai_json_mode allows it).
+        """
+        estimated = estimate_tokens(messages, max_tokens)
+        reserved = await usage_ledger.reserve(call_site, estimated, budget_wait)
+        usage = None
+        ticket = None
+        started = time.monotonic()
         try:
-            response = await self.client.chat.completions.create(
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=1.0,
-                model=self.model
+            if settings.admission_enabled:
+                ticket = await admission_scheduler.acquire(call_site)
+                started = time.monotonic()
+            raw = await azure_scheduler.run(
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    top_p=1.0,
+                    model=self.model,
+                    response_format=self._response_format(json_mode)
+                ),
+                estimated
             )
-            return self._convert_response_format(response)
+            converted = self._convert_response_format(raw.parse())
+            usage = converted.get("usage")
+            return converted
             
         except Exception as e:
             logger.error(f"Azure API error: {e}")
             raise
+        finally:
+            if ticket is not None:
+                admission_scheduler.release(ticket, time.monotonic() - started)
+            usage_ledger.settle(reserved, call_site, self.model, usage)
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]],
+                                     temperature: float = 1.0,
+                                     max_tokens: int = 4096,
+                                     call_site: str = "default",
+                                     budget_wait: Optional[float] = None,
+                                     json_mode: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Yields {"delta": text} chunks as tokens arrive, then one {"finish_reason", "usage"} item."""
+        estimated = estimate_tokens(messages, max_tokens)
+        reserved = await usage_ledger.reserve(call_site, estimated, budget_wait)
+        usage = None
+        ticket = None
+        started = time.monotonic()
+        try:
+            if settings.admission_enabled:
+                ticket = await admission_scheduler.acquire(call_site)
+                started = time.monotonic()
+            # Retries only cover opening the stream; the slot is held until it is consumed
+            raw = await azure_scheduler.run(
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    top_p=1.0,
+                    model=self.model,
+                    response_format=self._response_format(json_mode),
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                estimated,
+                hold=True
+            )
+            outcome = "error"
+            try:
+                finish_reason = None
+                async for chunk in raw.parse():
+                    if chunk.usage is not None:
+                        usage = {
+                            "prompt_tokens": chunk.usage.prompt_tokens,
+                            "completion_tokens": chunk.usage.completion_tokens,
+                            "total_tokens": chunk.usage.total_tokens
+                        }
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                    if choice.delta is not None and choice.delta.content:
+                        yield {"delta": choice.delta.content}
+                outcome = "success"
+                yield {"finish_reason": finish_reason, "usage": usage}
+            finally:
+                await azure_scheduler.release(outcome, raw.headers)
+
+        except Exception as e:
+            logger.error(f"Azure API streaming error: {e}")
+            raise
+        finally:
+            if ticket is not None:
+                admission_scheduler.release(ticket, time.monotonic() - started)
+            usage_ledger.settle(reserved, call_site, self.model, usage)
+
+    @staticmethod
+    def _response_format(json_mode: bool) -> Any:
+        return {"type": "json_object"} if json_mode and settings.ai_json_mode else openai.NOT_GIVEN
 
     def _convert_messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
 
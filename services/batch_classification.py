@@ -0,0 +1,262 @@
+import asyncio
+import base64
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from config import settings
+from models.requests import IncidentRequest
+from .classification import AIClassificationService
+from .admission import admission_context
+from utils.types import ClassificationResponse
+
+
+class BatchClassificationService:
+    """Classifies many descriptions in one call.
+
+    All descriptions are screened first, identical ones are classified once, and the
+    remaining model calls fan out under a concurrency limit; rate limiting and retries
+    are handled by the shared Azure request scheduler. Staff are assigned
+    afterwards in input order, so the same batch against the same roster and open
+    workload always produces the same assignments. Summaries and emails are deferred drafts, written
+    only when fetched from /incidents/drafts/{draft_id}.
+    """
+
+    def __init__(self, classification_service: AIClassificationService, max_concurrency: Optional[int] = None):
+        self.classification_service = classification_service
+        self.max_concurrency = max_concurrency or settings.batch_max_concurrency
+
+    async def classify_batch(self, descriptions: List[str]) -> Dict[str, Any]:
+        """Classifies a list of descriptions and returns results in input order."""
+        if len(descriptions) > settings.batch_max_items:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.batch_max_items} descriptions")
+
+        batch_start = time.perf_counter()
+        service = self.classification_service
+        cleaned = [description.strip() for description in descriptions]
+        elapsed_ms: List[float] = [0.0] * len(cleaned)
+        screened: Dict[int, ClassificationResponse] = {}
+        first_index: Dict[str, int] = {}
+        duplicate_of: Dict[int, int] = {}
+
+        # Screen everything up front so rejected items never reach the model
+        for index, description in enumerate(cleaned):
+            started = time.perf_counter()
+            fallback = service.screen_description(description)
+            elapsed_ms[index] += (time.perf_counter() - started) * 1000
+            if fallback is not None:
+                screened[index] = fallback
+            elif description in first_index:
+                duplicate_of[index] = first_index[description]
+            else:
+                first_index[description] = index
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def classify_one(description: str):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    with admission_context("batch"):
+                        outcome = await self.classification_service.request_classification(description)
+                except Exception as e:
+                    outcome = e
+                return outcome, (time.perf_counter() - started) * 1000
+
+        unique = list(first_index.items())
+        outcomes = await asyncio.gather(*(classify_one(description) for description, _ in unique))
+        model_results = {index: outcome for (_, index), outcome in zip(unique, outcomes)}
+        model_calls = sum(
+            1 for outcome, _ in outcomes
+            if isinstance(outcome, Exception) or outcome[1]["cache"] in ("miss", "disabled")
+        )
+
+        # Assign staff sequentially in input order for deterministic routing
+        results = []
+        for index, description in enumerate(cleaned):
+            started = time.perf_counter()
+            classification_data = None
+            if index in screened:
+                result = screened[index]
+            else:
+                outcome, model_ms = model_results[duplicate_of.get(index, index)]
+                elapsed_ms[index] += model_ms
+                try:
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    classification_data, details = outcome
+                    result = service.assign_staff(classification_data, description)
+                    result["processing_details"].update(details)
+                    service.queue_draft(result, description, classification_data, start=False)
+                except Exception as e:
+                    result = service.create_error_response(e)
+            elapsed_ms[index] += (time.perf_counter() - started) * 1000
+            result["processing_time_ms"] = int(elapsed_ms[index])
+            result["timestamp"] = datetime.now().isoformat()
+            service.record_incident(description, result, classification_data)
+            results.append({
+                "index": index,
+                "result": result,
+                "processing_time_ms": int(elapsed_ms[index]),
+                "duplicate_of": duplicate_of.get(index)
+            })
+
+        return {
+            "results": results,
+            "total": len(results),
+            "unique_descriptions": len(unique),
+            "model_calls": model_calls,
+            "processing_time_ms": int((time.perf_counter() - batch_start) * 1000)
+        }
+
+    @staticmethod
+    def encode_resume_token(next_index: int) -> str:
+        return base64.urlsafe_b64encode(f"v1:{next_index}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_resume_token(token: str) -> int:
+        try:
+            decoded = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            version, next_index = decoded.split(":", 1)
+            if version != "v1" or int(next_index) < 0:
+                raise ValueError(token)
+            return int(next_index)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid resume token")
+
+    async def _read_lines(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """Yields (index, description, error) for each non-blank NDJSON line of the body."""
+        buffer = b""
+        index = 0
+        oversized = False
+
+        def parse(line: bytes) -> Tuple[Optional[str], Optional[str]]:
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                return None, f"Invalid JSON: {e}"
+            if isinstance(item, str):
+                item = {"description": item}
+            if not isinstance(item, dict):
+                return None, "Each line must be a JSON string or an object with a 'description' field"
+            # Same limits as the single-incident endpoint
+            try:
+                return IncidentRequest.model_validate(item).description, None
+            except ValidationError as e:
+                error = e.errors()[0]
+                return None, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+
+        async for chunk in chunks:
+            buffer += chunk
+            while True:
+                newline = buffer.find(b"\n")
+                if newline == -1:
+                    break
+                line, buffer = buffer[:newline], buffer[newline + 1:]
+                if oversized:
+                    oversized = False
+                    continue
+                if line.strip():
+                    yield (index, *parse(line))
+                    index += 1
+            if len(buffer) > settings.stream_max_line_bytes and not oversized:
+                # Drop the rest of an oversized line instead of buffering it
+                yield index, None, f"Line exceeds {settings.stream_max_line_bytes} bytes"
+                index += 1
+                buffer = b""
+                oversized = True
+            elif oversized:
+                buffer = b""
+
+        if buffer.strip() and not oversized:
+            yield (index, *parse(buffer))
+
+    async def _prepare_item(self, description: str) -> Tuple[Any, float]:
+        """Screens one description and, if it passes, obtains its classification."""
+        started = time.perf_counter()
+        fallback = self.classification_service.screen_description(description)
+        if fallback is not None:
+            outcome = fallback
+        else:
+            try:
+                with admission_context("batch"):
+                    outcome = await self.classification_service.request_classification(description)
+            except Exception as e:
+                outcome = e
+        return outcome, (time.perf_counter() - started) * 1000
+
+    def _finish_item(self, index: int, description: str, outcome: Any, elapsed_ms: float) -> Dict[str, Any]:
+        service = self.classification_service
+        started = time.perf_counter()
+        classification_data = None
+        if isinstance(outcome, dict):
+            result = outcome
+        else:
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                classification_data, details = outcome
+                result = service.assign_staff(classification_data, description)
+                result["processing_details"].update(details)
+                service.queue_draft(result, description, classification_data, start=False)
+            except Exception as e:
+                result = service.create_error_response(e)
+        elapsed_ms += (time.perf_counter() - started) * 1000
+        result["processing_time_ms"] = int(elapsed_ms)
+        result["timestamp"] = datetime.now().isoformat()
+        service.record_incident(description, result, classification_data)
+        return {
+            "index": index,
+            "resume_token": self.encode_resume_token(index + 1),
+            "result": result,
+            "processing_time_ms": int(elapsed_ms)
+        }
+
+    async def classify_stream(self, chunks: AsyncIterator[bytes], resume_token: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Classifies an NDJSON body and yields one NDJSON result line per input line, in input order.
+
+        At most stream_window_size items are in flight; once the window is full the body
+        is not read further until the oldest item has been emitted, so memory stays flat
+        for any input size. Items before the resume token's position are skipped.
+        """
+        start_index = self.decode_resume_token(resume_token) if resume_token else 0
+        window: Deque[Tuple[int, Optional[str], Any]] = deque()
+        emitted = 0
+        next_index = start_index
+
+        async def emit_oldest() -> bytes:
+            nonlocal emitted, next_index
+            index, description, pending = window.popleft()
+            if isinstance(pending, str):
+                line = {"index": index, "resume_token": self.encode_resume_token(index + 1), "error": pending}
+            else:
+                outcome, elapsed_ms = await pending
+                line = self._finish_item(index, description, outcome, elapsed_ms)
+            emitted += 1
+            next_index = index + 1
+            return json.dumps(line).encode() + b"\n"
+
+        try:
+            async for index, description, error in self._read_lines(chunks):
+                if index < start_index:
+                    continue
+                if error is not None:
+                    window.append((index, None, error))
+                else:
+                    description = description.strip()
+                    window.append((index, description, asyncio.create_task(self._prepare_item(description))))
+                while len(window) >= settings.stream_window_size:
+                    yield await emit_oldest()
+
+            while window:
+                yield await emit_oldest()
+
+            yield json.dumps({"done": True, "emitted": emitted, "resume_token": self.encode_resume_token(next_index)}).encode() + b"\n"
+        finally:
+            for _, _, pending in window:
+                if isinstance(pending, asyncio.Task):
+                    pending.cancel()
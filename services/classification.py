@@ -1,29 +1,69 @@
+import copy
 import json
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from fastapi import HTTPException
 from models.requests import IncidentRequest
+from models.llm_outputs import ClassificationOutput
 from .skill_indexer import SkillIndexer
 from .content_validators import ContentValidator
 from .staff_selector import StaffSelector
 from .response_builder import ResponseBuilder
 from .ai_service import AzureClient
-from config import AI_TEMPERATURE, AI_MAX_TOKENS, DEFAULT_FALLBACK_DEPARTMENT, DEFAULT_FALLBACK_SKILLS
+from .classification_cache import ClassificationCache, normalize_description
+from .roster_index import normalize_skill
+from .skill_retriever import get_skill_retriever
+from .embedding_index import get_embedding_index
+from .local_classifier import LocalClassifier, predict_severity
+from .drafting import DraftStore, EmailDrafter, provisional_text
+from .response_parser import StructuredOutputError, complete_structured, response_content
+from .usage_ledger import TokenBudgetExceeded
+from .admission import AdmissionTimeout, admission_context
+from .incident_store import incident_record, incident_writer
+from config import settings, AI_TEMPERATURE, AI_CLASSIFY_MAX_TOKENS, DEFAULT_FALLBACK_DEPARTMENT, DEFAULT_FALLBACK_SKILLS
 from utils.types import ClassificationResponse
+from utils.streaming import format_sse
 from utils.logging import logger
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+
+# Fields that drive routing; the classification call returns only these plus a title
+ROUTING_FIELDS = ("category", "severity", "department", "required_skills")
+DRAFT_MODES = ("inline", "background", "deferred")
 
 class AIClassificationService:
-    def __init__(self):
-        self.ai_client = AzureClient()
+    def __init__(self, ai_client: Optional[AzureClient] = None):
+        self.ai_client = ai_client or AzureClient()
         self.skill_indexer = SkillIndexer()
         self.content_validator = ContentValidator()
         self.staff_selector = StaffSelector()
         self.response_builder = ResponseBuilder(self.staff_selector)
+        self.classification_cache = ClassificationCache() if settings.classification_cache_enabled else None
+        self.local_classifier = LocalClassifier() if settings.local_classifier_enabled else None
+        self.drafter = EmailDrafter(self.ai_client)
+        self.draft_store = DraftStore(self.drafter)
+        self.single_flight = SingleFlight()
 
-    def create_classification_prompt(self, description: str) -> str:
-        """Creates a prompt for AI to classify incidents and match to skills."""
+    def select_prompt_candidates(self, description: str) -> Tuple[List[str], List[str]]:
+        """Picks the departments and skills worth listing in the prompt for this description."""
         available_departments = self.skill_indexer.get_available_departments()
-        skills_list = list(self.skill_indexer.skill_index.keys())
+        if settings.prompt_top_k_skills <= 0:
+            return list(available_departments), list(self.skill_indexer.skill_index.keys())
+
+        skills, departments = get_skill_retriever().select_candidates(
+            description, settings.prompt_top_k_skills, settings.prompt_top_k_departments
+        )
+        if DEFAULT_FALLBACK_DEPARTMENT in available_departments and DEFAULT_FALLBACK_DEPARTMENT not in departments:
+            departments.append(DEFAULT_FALLBACK_DEPARTMENT)
+        return departments, skills
+
+    def create_classification_prompt(self, description: str, available_departments: Optional[List[str]] = None,
+                                     skills_list: Optional[List[str]] = None) -> str:
+        """Creates a prompt for AI to classify incidents and match to skills."""
+        if available_departments is None or skills_list is None:
+            available_departments, skills_list = self.select_prompt_candidates(description)
         
         return f"""
         You are an expert incident classifier for a company with specialized departments. Analyze the incident description and classify it based on the required skills and department expertise.
@@ -38,8 +78,7 @@ class AIClassificationService:
         2. Match the incident to the most relevant department based on the skills needed.
         3. If the department mentioned is not in the available departments, classify it as "Manual Assignment Required" and assign to Admin.
         4. Determine severity: Low, Medium, or High based on business impact.
-        5. Provide a professional summary and email content for the assigned staff.
-        6. Only classify as "Unclassified" if the description is inappropriate or too vague.
+        5. Only classify as "Unclassified" if the description is inappropriate or too vague.
 
         Respond with ONLY valid JSON:
         {{
@@ -47,93 +86,355 @@ class AIClassificationService:
             "severity": "Low|Medium|High",
             "department": "matched department or 'Admin'",
             "required_skills": ["list of relevant skills"],
-            "title": "unique title",
-            "summary": "brief professional summary",
-            "email": "professional detailed email content for assigned staff"
+            "title": "unique title"
         }}
         """
 
-    async def classify_incident(self, incident: IncidentRequest) -> ClassificationResponse:
-        """Classifies an incident and assigns it to the appropriate staff."""
-        try:
-            start_time = datetime.now()
-            description = incident.description.strip()
+    def screen_description(self, description: str) -> Optional[ClassificationResponse]:
+        """Runs the content validators; returns a fallback response when the description is rejected."""
+        with metrics.span("classification.screening"):
+            match = self.content_validator.find_inappropriate_content(description)
+            ambiguous = match is None and self.content_validator.is_ambiguous_description(description)
+        if match is not None:
+            logger.warning(f"Inappropriate content detected (rule '{match.rule}'): {description[:50]}...")
+            result = self.response_builder.create_fallback_response("Inappropriate content detected", is_unclassified=True)
+            result["processing_details"]["screening_rule"] = match.rule
+            return result
+        if ambiguous:
+            logger.warning(f"Ambiguous description detected: {description}")
+            return self.response_builder.create_fallback_response("Description too vague or unclear", is_unclassified=True)
+        return None
+
+    def classify_locally(self, description: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Classifies with the in-process model when it is confident and trained enough; None otherwise."""
+        prediction = self.local_classifier.predict(description)
+        if prediction is None or prediction["confidence"] < settings.local_classifier_threshold:
+            return None
+        if self.local_classifier.examples(prediction["department"]) < settings.local_classifier_min_examples:
+            return None
+
+        confidence = prediction.pop("confidence")
+        return prediction, {"classifier": "local", "local_confidence": confidence}
+
+    def classify_over_budget(self, description: str, details: Dict[str, Any],
+                             reason: str = "token_budget") -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Local fallback when the model cannot be used (token budget, admission deadline): the local prediction at any confidence, else Admin."""
+        details = {"cache": details.get("cache"), "classifier": "local", "degraded": reason}
+        prediction = self.local_classifier.predict(description) if self.local_classifier else None
+        if prediction is not None:
+            details["local_confidence"] = prediction.pop("confidence")
+            return prediction, details
+        return {
+            "category": "Manual Assignment Required",
+            "severity": predict_severity(description),
+            "department": DEFAULT_FALLBACK_DEPARTMENT,
+            "required_skills": list(DEFAULT_FALLBACK_SKILLS)
+        }, details
+
+    async def lookup_classification(self, description: str, force_llm: bool = False) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Tries the cache and the local classifier; returns (None, details) when the model is needed."""
+        with metrics.span("classification.cache_lookup"):
+            cached = self.classification_cache.get(description) if self.classification_cache else None
+        if cached:
+            classification_data, cache_status = cached
+            return classification_data, {"cache": cache_status}
+
+        cache_status = "miss" if self.classification_cache else "disabled"
+        if self.local_classifier and not force_llm:
+            with metrics.span("classification.local_classifier"):
+                local = self.classify_locally(description)
+            if local is not None:
+                classification_data, details = local
+                details["cache"] = cache_status
+                return classification_data, details
+
+        return None, {"cache": cache_status}
 
-            if self.content_validator.is_inappropriate_content(description):
-                logger.warning(f"Inappropriate content detected: {description[:50]}...")
-                result = self.response_builder.create_fallback_response("Inappropriate content detected", is_unclassified=True)
-            elif self.content_validator.is_ambiguous_description(description):
-                logger.warning(f"Ambiguous description detected: {description}")
-                result = self.response_builder.create_fallback_response("Description too vague or unclear", is_unclassified=True)
-            else:
-                prompt = self.create_classification_prompt(description)
-                messages = [
-                    {"role": "system", "content": "You are an expert incident classifier. Respond only with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ]
+    def build_classification_messages(self, description: str, details: Dict[str, Any]) -> List[Dict[str, str]]:
+        available_departments, skills_list = self.select_prompt_candidates(description)
+        details.update({
+            "classifier": "llm",
+            "prompt_skills_sent": len(skills_list),
+            "prompt_skills_total": len(self.skill_indexer.skill_index),
+            "prompt_departments_sent": len(available_departments)
+        })
+        prompt = self.create_classification_prompt(description, available_departments, skills_list)
+        return [
+            {"role": "system", "content": "You are an expert incident classifier. Respond only with valid JSON."},
+            {"role": "user", "content": prompt}
+        ]
 
+    def remember_classification(self, description: str, classification_data: Dict[str, Any]):
+        """Feeds a fresh model classification to the cache and the local classifier."""
+        if self.classification_cache:
+            self.classification_cache.put(description, classification_data)
+        if self.local_classifier:
+            self.local_classifier.learn(description, classification_data)
+
+    async def request_classification(self, description: str, force_llm: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Returns the classification for a description and processing details about how it was produced."""
+        classification_data, details = await self.lookup_classification(description, force_llm)
+        if classification_data is not None:
+            return classification_data, details
+
+        # Keyword-predicted severity lets urgent tickets jump the admission queue
+        with admission_context(severity=predict_severity(description)):
+            if not settings.classification_single_flight_enabled:
+                return await self.classify_with_llm(description, details)
+
+            # Identical descriptions arriving together (an outage storm) share one model call;
+            # staff assignment still runs separately for every request
+            (classification_data, llm_details), shared = await self.single_flight.do(
+                normalize_description(description),
+                lambda: self.classify_with_llm(description, dict(details))
+            )
+        if shared:
+            return copy.deepcopy(classification_data), {**llm_details, "coalesced": True}
+        return classification_data, llm_details
+
+    async def classify_with_llm(self, description: str, details: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Classifies with the model and feeds the answer to the cache and local classifier."""
+        with metrics.span("classification.prompt_build"):
+            messages = self.build_classification_messages(description, details)
+
+        degrade = settings.token_budget_degrade_to_local
+        try:
+            with metrics.span("classification.llm_wait"):
                 response = await self.ai_client.create_chat_completion(
                     messages=messages,
                     temperature=AI_TEMPERATURE,
-                    max_tokens=AI_MAX_TOKENS
+                    max_tokens=AI_CLASSIFY_MAX_TOKENS,
+                    call_site="classification",
+                    budget_wait=0 if degrade else None,
+                    json_mode=True
                 )
+            if response.get("usage"):
+                details["token_usage"] = response["usage"]
+            # Follow-up calls for missing fields hit the same budget and admission limits
+            classification_data, retried = await complete_structured(
+                self.ai_client, messages, response_content(response), ClassificationOutput, "classification",
+                max_tokens=AI_CLASSIFY_MAX_TOKENS, budget_wait=0 if degrade else None
+            )
+        except TokenBudgetExceeded:
+            if not degrade:
+                raise
+            return self.classify_over_budget(description, details)
+        except AdmissionTimeout:
+            return self.classify_over_budget(description, details, reason="admission_deadline")
 
-                ai_response = response['choices'][0]["message"]["content"].strip()
-                if ai_response.startswith("```json"):
-                    ai_response = ai_response[7:-3]
-                elif ai_response.startswith("```"):
-                    ai_response = ai_response[3:-3]
-
-                json_start = ai_response.find('{')
-                json_end = ai_response.rfind('}') + 1
-                if json_start != -1 and json_end != -1:
-                    ai_response = ai_response[json_start:json_end]
-
-                classification_data = json.loads(ai_response)
-                category = classification_data.get("category", "Manual Assignment Required")
-                target_department = classification_data.get("department", DEFAULT_FALLBACK_DEPARTMENT)
-                required_skills = classification_data.get("required_skills", DEFAULT_FALLBACK_SKILLS)
-
-                available_departments = self.skill_indexer.get_available_departments()
-                if target_department not in available_departments:
-                    logger.warning(f"Non-existent department '{target_department}' detected: {description[:50]}. Routing to {DEFAULT_FALLBACK_DEPARTMENT} for manual assignment.")
-                    category = "Manual Assignment Required"
-                    target_department = DEFAULT_FALLBACK_DEPARTMENT
-                    required_skills = DEFAULT_FALLBACK_SKILLS
-
-                assigned_staff = self.staff_selector.select_best_staff(required_skills, target_department)
-                if not assigned_staff:
-                    logger.warning(f"No available staff in {target_department}. Trying {DEFAULT_FALLBACK_DEPARTMENT}.")
-                    category = "Manual Assignment Required"
-                    assigned_staff = self.staff_selector.select_best_staff(DEFAULT_FALLBACK_SKILLS, DEFAULT_FALLBACK_DEPARTMENT)
-                    target_department = DEFAULT_FALLBACK_DEPARTMENT
-
-                if not assigned_staff:
-                    result = self.response_builder.create_fallback_response("No available staff found", is_unclassified=False)
-                else:
-                    result = self.response_builder.create_classification_response(
-                        classification_data=classification_data,
-                        assigned_staff=assigned_staff,
-                        target_department=target_department,
-                        required_skills=required_skills,
-                        original_department=classification_data.get("department", DEFAULT_FALLBACK_DEPARTMENT)
-                    )
-
-            result["processing_time_ms"] = int((datetime.now() - start_time).total_seconds() * 1000)
-            result["timestamp"] = datetime.now().isoformat()
-            return result
+        if retried:
+            details["fields_retried"] = retried
+        self.remember_classification(description, classification_data)
+        return classification_data, details
 
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            logger.error(f"Raw AI response: {ai_response}")
-            result = self.response_builder.create_fallback_response(f"AI response parsing failed", is_unclassified=True)
-            result["processing_time_ms"] = int((datetime.now() - start_time).total_seconds() * 1000)
-            result["timestamp"] = datetime.now().isoformat()
-            return result
+    def assign_staff(self, classification_data: Dict[str, Any], description: str) -> ClassificationResponse:
+        """Routes a classification to a department and staff member.
+
+        Summary and email are template text at this point; attach_draft replaces them.
+        """
+        classification_data = {**provisional_text(description, classification_data), **classification_data}
+        category = classification_data.get("category", "Manual Assignment Required")
+        target_department = classification_data.get("department", DEFAULT_FALLBACK_DEPARTMENT)
+        required_skills = classification_data.get("required_skills", DEFAULT_FALLBACK_SKILLS)
+
+        available_departments = self.skill_indexer.get_available_departments()
+        resolution: Dict[str, Any] = {}
+        if settings.embedding_index_enabled:
+            with metrics.span("classification.embedding_resolve"):
+                target_department, required_skills, resolution = self.resolve_routing(
+                    target_department, required_skills, description, available_departments
+                )
+        if target_department not in available_departments:
+            logger.warning(f"Non-existent department '{target_department}' detected: {description[:50]}. Routing to {DEFAULT_FALLBACK_DEPARTMENT} for manual assignment.")
+            category = "Manual Assignment Required"
+            target_department = DEFAULT_FALLBACK_DEPARTMENT
+            required_skills = DEFAULT_FALLBACK_SKILLS
+
+        with metrics.span("classification.staff_selection"):
+            assigned_staff = self.staff_selector.select_best_staff(required_skills, target_department)
+            if not assigned_staff:
+                logger.warning(f"No available staff in {target_department}. Trying {DEFAULT_FALLBACK_DEPARTMENT}.")
+                category = "Manual Assignment Required"
+                assigned_staff = self.staff_selector.select_best_staff(DEFAULT_FALLBACK_SKILLS, DEFAULT_FALLBACK_DEPARTMENT)
+                target_department = DEFAULT_FALLBACK_DEPARTMENT
+
+            assignment_id = self.staff_selector.record_assignment(assigned_staff) if assigned_staff else None
+
+        if not assigned_staff:
+            return self.response_builder.create_fallback_response("No available staff found", is_unclassified=False)
+
+        with metrics.span("classification.response_build"):
+            result = self.response_builder.create_classification_response(
+                classification_data=classification_data,
+                assigned_staff=assigned_staff,
+                target_department=target_department,
+                required_skills=required_skills,
+                original_department=classification_data.get("department", DEFAULT_FALLBACK_DEPARTMENT)
+            )
+        if assignment_id:
+            result["processing_details"]["assignment_id"] = assignment_id
+        result["processing_details"].update(resolution)
+        return result
+
+    def resolve_routing(self, department: str, required_skills: List[str], description: str,
+                        available_departments) -> Tuple[str, List[str], Dict[str, Any]]:
+        """Maps a proposed department and skills onto the roster with the embedding index.
+
+        An unknown department is replaced by the closest real one (by name, else by who
+        holds the skills), missing skills are taken from the description, and each skill
+        is swapped for the roster skill it most resembles. Returns the details recorded.
+        """
+        index = get_embedding_index()
+        resolution: Dict[str, Any] = {}
+        if department not in available_departments:
+            resolved = index.resolve_department(department, required_skills or [description])
+            if resolved is not None:
+                logger.info(f"Resolved unknown department '{department}' to '{resolved}'")
+                resolution["department_resolved_from"] = department
+                department = resolved
+        if department not in available_departments:
+            return department, required_skills, resolution
+
+        if not required_skills:
+            required_skills = [skill for skill, _ in index.search(description, settings.embedding_description_skills, department)]
+            resolution["skills_from_description"] = True
+        mapped = index.resolve_skills(required_skills, department)
+        changed = {skill: match for skill, match in mapped.items() if normalize_skill(skill) != match}
+        if changed:
+            resolution["skills_resolved"] = changed
+            required_skills = list(dict.fromkeys(mapped.get(skill, skill) for skill in required_skills))
+        return department, required_skills, resolution
+
+    def create_error_response(self, error: Exception) -> ClassificationResponse:
+        """Maps a failed classification to the matching fallback response."""
+        if isinstance(error, (json.JSONDecodeError, StructuredOutputError)):
+            logger.error(f"JSON parsing error: {error}")
+            return self.response_builder.create_fallback_response(f"AI response parsing failed", is_unclassified=True)
+        logger.error(f"Classification error: {error}")
+        return self.response_builder.create_fallback_response(f"System error: {str(error)}", is_unclassified=True)
+
+    def record_incident(self, description: str, result: ClassificationResponse,
+                        classification_data: Optional[Dict[str, Any]] = None, timings: Optional[Dict[str, float]] = None):
+        """Queues a finished result for the incident store and returns its id in processing_details."""
+        if not incident_writer.running:
+            return
+        result["processing_details"]["incident_id"] = uuid.uuid4().hex
+        incident_writer.submit(incident_record(description, result, classification_data, timings))
+
+    def warm_from_history(self, history: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Replays stored model classifications (oldest first) into the cache and local classifier."""
+        for description, classification_data in history:
+            self.remember_classification(description, classification_data)
+        return len(history)
+
+    def queue_draft(self, result: ClassificationResponse, description: str,
+                    classification_data: Dict[str, Any], start: bool):
+        """Registers a summary/email draft for an assigned result and records its id in processing_details."""
+        if result["staff_assignment"].get("assignment_status") != "assigned":
+            return
+        draft = self.draft_store.create(
+            description,
+            {**classification_data, "department": result["classification"]["department"]},
+            result["staff_assignment"].get("assigned_staff_name"),
+            summary=result["classification"]["summary"],
+            email=result["classification"]["email"],
+            start=start
+        )
+        result["processing_details"]["draft_id"] = draft.draft_id
+        result["processing_details"]["draft_status"] = draft.status
+
+    async def attach_draft(self, result: ClassificationResponse, description: str,
+                           classification_data: Dict[str, Any], mode: Optional[str] = None):
+        """Second phase: writes the summary and email inline, in the background or on demand."""
+        mode = mode or settings.email_draft_mode
+        if mode not in DRAFT_MODES:
+            logger.warning(f"Unknown email_draft_mode '{mode}', using 'background'")
+            mode = "background"
+        if mode != "inline":
+            self.queue_draft(result, description, classification_data, start=(mode == "background"))
+            return
+        if result["staff_assignment"].get("assignment_status") != "assigned":
+            return
+
+        try:
+            text = await self.drafter.draft(
+                description,
+                {**classification_data, "department": result["classification"]["department"]},
+                result["staff_assignment"].get("assigned_staff_name")
+            )
+            result["classification"].update(text)
+            result["processing_details"]["draft_status"] = "ready"
+        except Exception as e:
+            logger.error(f"Inline draft failed, keeping template text: {e}")
+            result["processing_details"]["draft_status"] = "failed"
+
+    async def classify_incident(self, incident: IncidentRequest) -> ClassificationResponse:
+        """Classifies an incident and assigns it to the appropriate staff."""
+        started = time.perf_counter_ns()
+        classification_data = None
+        try:
+            description = incident.description.strip()
+
+            result = self.screen_description(description)
+            if result is None:
+                classification_data, details = await self.request_classification(description, force_llm=incident.force_llm)
+                result = self.assign_staff(classification_data, description)
+                result["processing_details"].update(details)
+                await self.attach_draft(result, description, classification_data, incident.draft_mode)
 
         except Exception as e:
-            logger.error(f"Classification error: {e}")
-            result = self.response_builder.create_fallback_response(f"System error: {str(e)}", is_unclassified=True)
-            result["processing_time_ms"] = int((datetime.now() - start_time).total_seconds() * 1000)
-            result["timestamp"] = datetime.now().isoformat()
-            return result
\ No newline at end of file
+            result = self.create_error_response(e)
+
+        elapsed_ns = time.perf_counter_ns() - started
+        metrics.observe_stage("classification.total", elapsed_ns)
+        result["processing_time_ms"] = elapsed_ns // 1_000_000
+        result["timestamp"] = datetime.now().isoformat()
+        self.record_incident(incident.description.strip(), result, classification_data, metrics.request_spans())
+        return result
+
+    async def classify_incident_stream(self, incident: IncidentRequest) -> AsyncIterator[str]:
+        """Classifies an incident as Server-Sent Events.
+
+        Emits "classification" and "assignment" once the short routing call returns,
+        then "summary.delta" / "email.delta" token deltas from the drafting call, and
+        finally "complete" with the same payload classify_incident returns.
+        """
+        started = time.perf_counter_ns()
+        description = incident.description.strip()
+        classification_data = None
+        try:
+            result = self.screen_description(description)
+            if result is None:
+                classification_data, details = await self.request_classification(description, force_llm=incident.force_llm)
+                result = self.assign_staff(classification_data, description)
+                result["processing_details"].update(details)
+
+            yield format_sse("classification", {field: result["classification"].get(field) for field in ROUTING_FIELDS})
+            yield format_sse("assignment", result["staff_assignment"])
+
+            if classification_data is not None and result["staff_assignment"].get("assignment_status") == "assigned":
+                draft_input = {**classification_data, "department": result["classification"]["department"]}
+                try:
+                    async for item in self.drafter.draft_stream(
+                        description, draft_input, result["staff_assignment"].get("assigned_staff_name")
+                    ):
+                        if "draft" in item:
+                            result["classification"].update(item["draft"])
+                            result["processing_details"]["draft_status"] = "ready"
+                        else:
+                            yield format_sse(f"{item['field']}.delta", {"text": item["text"]})
+                except Exception as e:
+                    logger.error(f"Streaming draft failed, keeping template text: {e}")
+                    result["processing_details"]["draft_status"] = "failed"
+                    yield format_sse("error", {"detail": f"Draft generation failed: {e}"})
+
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+            result = self.create_error_response(e)
+
+        elapsed_ns = time.perf_counter_ns() - started
+        metrics.observe_stage("classification.total", elapsed_ns)
+        result["processing_time_ms"] = elapsed_ns // 1_000_000
+        result["timestamp"] = datetime.now().isoformat()
+        self.record_incident(description, result, classification_data, metrics.request_spans())
+        yield format_sse("complete", result)
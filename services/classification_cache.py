@@ -0,0 +1,212 @@
+import copy
+import hashlib
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+from config import settings
+from services.roster_index import get_roster_index
+from utils.logging import logger
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Filler words that do not change how an incident is routed
+STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "am", "i", "my", "me", "we", "our",
+    "it", "its", "this", "that", "to", "of", "on", "in", "at", "for", "with", "and", "or", "again",
+    "still", "please", "pls", "hi", "hello", "help", "just", "any", "some", "can", "could", "you"
+})
+
+
+def normalize_description(description: str) -> str:
+    """Lowercases and strips punctuation and repeated whitespace."""
+    return " ".join(_NON_WORD.sub(" ", description.lower()).split())
+
+
+def description_shingles(normalized: str) -> FrozenSet[str]:
+    """Unigram and bigram shingles over the content words of a normalized description."""
+    tokens = [token for token in normalized.split() if token not in STOPWORDS]
+    shingles = set(tokens)
+    shingles.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    return frozenset(shingles)
+
+
+class MinHasher:
+    """MinHash signatures with banded LSH keys for near-duplicate lookup."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+            for shingle in shingles
+        ]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+            for a, b in self._permutations
+        )
+
+    def band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+
+class _CacheEntry:
+    __slots__ = ("value", "expires_at", "shingles", "band_keys")
+
+    def __init__(self, value: Dict[str, Any], expires_at: float, shingles: FrozenSet[str], band_keys: List):
+        self.value = value
+        self.expires_at = expires_at
+        self.shingles = shingles
+        self.band_keys = band_keys
+
+
+class ClassificationCache:
+    """TTL + LRU cache of model classifications keyed on normalized incident text.
+
+    Exact lookups use the normalized description; near-duplicate lookups go through
+    MinHash LSH candidates and are confirmed with the true Jaccard similarity. The
+    cache empties itself whenever the roster's departments or skills change, since
+    cached answers name departments and skills from the roster they were made against.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        near_duplicate_threshold: Optional[float] = None
+    ):
+        self.max_entries = max_entries if max_entries is not None else settings.classification_cache_max_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.classification_cache_ttl_seconds
+        self.near_duplicate_threshold = (
+            near_duplicate_threshold if near_duplicate_threshold is not None
+            else settings.classification_cache_near_duplicate_threshold
+        )
+        self.hasher = MinHasher()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._roster_signature: Optional[str] = None
+        self.hits_exact = 0
+        self.hits_near = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_roster(self):
+        signature = get_roster_index().routing_signature
+        if signature != self._roster_signature:
+            if self._entries:
+                logger.info(f"Roster routing changed; dropping {len(self._entries)} cached classifications")
+                self.invalidations += 1
+            self.clear()
+            self._roster_signature = signature
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in entry.band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _live_entry(self, key: str, now: float) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _near_duplicate(self, shingles: FrozenSet[str], now: float) -> Optional[_CacheEntry]:
+        if not shingles:
+            return None
+        candidates: Set[str] = set()
+        for band_key in self.hasher.band_keys(self.hasher.signature(shingles)):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best_key, best_similarity = None, 0.0
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                continue
+            similarity = len(shingles & entry.shingles) / len(shingles | entry.shingles)
+            if similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+
+        if best_key is None or best_similarity < self.near_duplicate_threshold:
+            return None
+        return self._live_entry(best_key, now)
+
+    def get(self, description: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Returns a copy of the cached classification and the match type ("exact" or "near")."""
+        self._check_roster()
+        now = time.monotonic()
+        key = normalize_description(description)
+
+        entry = self._live_entry(key, now)
+        if entry is not None:
+            self.hits_exact += 1
+            return copy.deepcopy(entry.value), "exact"
+
+        if self.near_duplicate_threshold > 0:
+            entry = self._near_duplicate(description_shingles(key), now)
+            if entry is not None:
+                self.hits_near += 1
+                return copy.deepcopy(entry.value), "near"
+
+        self.misses += 1
+        return None
+
+    def put(self, description: str, classification_data: Dict[str, Any]):
+        self._check_roster()
+        key = normalize_description(description)
+        self._remove(key)
+
+        shingles = description_shingles(key)
+        band_keys = self.hasher.band_keys(self.hasher.signature(shingles)) if self.near_duplicate_threshold > 0 and shingles else []
+        self._entries[key] = _CacheEntry(
+            value=copy.deepcopy(classification_data),
+            expires_at=time.monotonic() + self.ttl_seconds,
+            shingles=shingles,
+            band_keys=band_keys
+        )
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits_exact": self.hits_exact,
+            "hits_near": self.hits_near,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from config import settings
+from utils.logging import logger
+
+WARMUP_MODES = ("eager", "background", "lazy")
+
+
+class ServiceContainer:
+    """Application services, constructed on first use rather than at import time.
+
+    Importing the endpoint modules no longer creates Azure clients or indexes, so the
+    server can bind as soon as the code is loaded. The lifespan calls startup(), which
+    builds everything in a worker thread according to settings.service_warmup
+    ("background" overlaps it with serving, "eager" finishes it before serving and
+    "lazy" leaves it to the first request), and shutdown(), which drops the services
+    so a new lifespan builds them again around a freshly opened HTTP pool. With a
+    screening word list configured, startup() also starts the task that hot-reloads it.
+
+    Building holds a thread lock, so code on the event loop awaits ready() before using
+    a service instead of blocking the loop on that lock while the warm-up thread builds.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._services: Dict[str, Any] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._ready = False
+        self._screening_task: Optional[asyncio.Task] = None
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._services[name] = factory()
+        return service
+
+    async def ready(self):
+        """Waits for the warm-up to finish, starting it if nothing has (lazy mode or a failed warm-up)."""
+        if self._ready:
+            return
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_task = asyncio.create_task(self._warm_up())
+        await asyncio.shield(self._warmup_task)
+
+    @property
+    def ai_client(self):
+        from services.ai_service import AzureClient
+        return self._get("ai_client", AzureClient)
+
+    @property
+    def classification_service(self):
+        from services.classification import AIClassificationService
+        return self._get("classification_service", lambda: AIClassificationService(self.ai_client))
+
+    @property
+    def batch_service(self):
+        from services.batch_classification import BatchClassificationService
+        return self._get("batch_service", lambda: BatchClassificationService(self.classification_service))
+
+    @property
+    def regenerator(self):
+        from services.regenerate import AIRegenerator
+        return self._get("regenerator", lambda: AIRegenerator(self.ai_client))
+
+    def register_jobs(self, queue):
+        """Job kinds the background queue runs; services are resolved when each job starts.
+
+        Regeneration is preemptible, so queued triage can take its worker when the pool is full.
+        Queued triage is admitted to the model as batch work, behind interactive requests.
+        """
+        from models.requests import IncidentRequest, RegenerateRequest
+        from services.admission import admission_context
+
+        async def classify(payload):
+            await self.ready()
+            with admission_context("batch"):
+                return await self.classification_service.classify_incident(IncidentRequest(**payload))
+
+        async def regenerate(payload):
+            await self.ready()
+            return await self.regenerator.regenerate(RegenerateRequest(**payload))
+
+        queue.register("classification", classify)
+        queue.register("regeneration", regenerate, preemptible=True)
+
+    def warm_up(self):
+        """Builds the roster, its indexes and every service."""
+        from services.roster_index import get_roster_index
+        from services.embedding_index import get_embedding_index
+        roster = get_roster_index()
+        roster.skill_index
+        if settings.embedding_index_enabled:
+            get_embedding_index()
+        self.batch_service
+        self.regenerator
+        self._ready = True
+        logger.info(f"Services ready: {', '.join(self.built())}")
+
+    async def _warm_up(self):
+        try:
+            await asyncio.to_thread(self.warm_up)
+        except Exception as e:
+            # Requests construct whatever is missing themselves
+            logger.warning(f"Service warm-up failed: {e}")
+            return
+        await self._warm_from_history()
+
+    async def _warm_from_history(self):
+        """Replays recent model classifications from the incident store into the cache and local classifier.
+
+        Only the read runs in a thread; the replay happens on the event loop, which is
+        where the cache and classifier are otherwise used.
+        """
+        from services.incident_store import get_incident_store
+        service = self.classification_service
+        if settings.incident_warmup_limit <= 0 or not (service.classification_cache or service.local_classifier):
+            return
+        try:
+            store = await asyncio.to_thread(get_incident_store)
+            if store is None:
+                return
+            history = await asyncio.to_thread(store.recent_classifications, settings.incident_warmup_limit)
+            logger.info(f"Warmed the classification cache with {service.warm_from_history(history)} stored incidents")
+        except Exception as e:
+            logger.warning(f"Incident history warm-up failed: {e}")
+
+    async def _watch_screening_rules(self):
+        """Checks the screening word list for changes off the event loop, once services exist."""
+        while True:
+            await asyncio.sleep(settings.screening_reload_interval_seconds)
+            service = self._services.get("classification_service")
+            if service is None:
+                continue
+            try:
+                await asyncio.to_thread(service.content_validator.reload)
+            except Exception as e:
+                logger.warning(f"Screening word list reload failed: {e}")
+
+    async def startup(self):
+        mode = settings.service_warmup if settings.service_warmup in WARMUP_MODES else "background"
+        if mode == "eager":
+            await self._warm_up()
+        elif mode == "background":
+            self._warmup_task = asyncio.create_task(self._warm_up())
+        if settings.screening_wordlist_path:
+            self._screening_task = asyncio.create_task(self._watch_screening_rules())
+
+    async def shutdown(self):
+        if self._screening_task is not None:
+            self._screening_task.cancel()
+            try:
+                await self._screening_task
+            except asyncio.CancelledError:
+                pass
+            self._screening_task = None
+        if self._warmup_task is not None and not self._warmup_task.done():
+            await self._warmup_task
+        self._warmup_task = None
+        with self._lock:
+            self._ready = False
+            self._services.clear()
+
+    def built(self) -> List[str]:
+        return list(self._services)
+
+
+container = ServiceContainer()
@@ -1,21 +1,174 @@
+import os
 import re
-from config import INAPPROPRIATE_PATTERNS
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import settings, INAPPROPRIATE_TERMS
+from utils.logging import logger
+
+_WORD = re.compile(r"\w+")
+_NO_LETTERS = re.compile(r"^[0-9\s\W]+$")
+_SECTION = re.compile(r"^\[(.+)\]$")
+
+
+class ScreeningMatch:
+    __slots__ = ("rule", "term", "position")
+
+    def __init__(self, rule: str, term: str, position: int):
+        self.rule = rule
+        self.term = term
+        self.position = position
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"rule": self.rule, "term": self.term, "position": self.position}
+
+
+def parse_wordlist(lines: Iterable[str]) -> Tuple[Dict[str, List[str]], List[Tuple[str, str]]]:
+    """Parses a screening word list into ({rule: terms}, [(rule, regex)]).
+
+    One term per line under a "[rule]" header; lines starting with "#" are comments and lines
+    prefixed with "re:" are regular expressions rather than literal terms.
+    """
+    terms: Dict[str, List[str]] = {}
+    patterns: List[Tuple[str, str]] = []
+    rule = "default"
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        section = _SECTION.match(line)
+        if section:
+            rule = section.group(1).strip()
+        elif line.startswith("re:"):
+            patterns.append((rule, line[3:].strip()))
+        else:
+            terms.setdefault(rule, []).append(line)
+    return terms, patterns
+
+
+class ScreeningRules:
+    """Immutable compiled form of a screening rule set.
+
+    Literal terms (single or multi-word, any script with word characters) go into a
+    word-level trie, so a description is tokenised once and the cost per token is a
+    dict lookup no matter how many terms there are. The common no-match case is a
+    single C-level set intersection of the description's tokens with the trie roots.
+    Regular-expression rules are combined into one alternation with a named group
+    per rule, so they also cost a single scan.
+    """
+
+    def __init__(self, terms: Dict[str, List[str]], patterns: Optional[List[Tuple[str, str]]] = None, source: str = "builtin"):
+        self.source = source
+        self.term_count = 0
+        self._trie: Dict[str, dict] = {}
+        for rule, rule_terms in terms.items():
+            for term in rule_terms:
+                words = _WORD.findall(term.casefold())
+                if not words:
+                    continue
+                node = self._trie
+                for word in words:
+                    node = node.setdefault(word, {})
+                node.setdefault(None, (rule, " ".join(words)))
+                self.term_count += 1
+        self._roots = frozenset(self._trie)
+
+        self._pattern_rules: Dict[str, str] = {}
+        alternatives = []
+        for index, (rule, pattern) in enumerate(patterns or []):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                logger.warning(f"Skipping invalid screening pattern for rule '{rule}': {e}")
+                continue
+            group = f"r{index}"
+            self._pattern_rules[group] = rule
+            alternatives.append(f"(?P<{group}>{pattern})")
+        self.pattern_count = len(alternatives)
+        self._combined = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def match(self, text: str) -> Optional[ScreeningMatch]:
+        """Returns the earliest match in the text, or None."""
+        folded = text.casefold()
+        found = None
+        tokens = _WORD.findall(folded)
+        if self._roots.intersection(tokens):
+            found = self._match_terms(folded)
+        if self._combined is not None:
+            hit = self._combined.search(folded)
+            if hit is not None and (found is None or hit.start() < found.position):
+                found = ScreeningMatch(self._pattern_rules[hit.lastgroup], hit.group(0), hit.start())
+        return found
+
+    def _match_terms(self, folded: str) -> Optional[ScreeningMatch]:
+        # Re-tokenise with offsets so positions are character offsets; only
+        # descriptions that share a word with the trie roots get this far.
+        spans = list(_WORD.finditer(folded))
+        tokens = [span.group(0) for span in spans]
+        for start, token in enumerate(tokens):
+            node = self._trie.get(token)
+            best = None
+            index = start
+            while node is not None:
+                if None in node:
+                    best = node[None]
+                index += 1
+                node = node.get(tokens[index]) if index < len(tokens) else None
+            if best is not None:
+                return ScreeningMatch(best[0], best[1], spans[start].start())
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        return {"source": self.source, "terms": self.term_count, "patterns": self.pattern_count}
+
 
 class ContentValidator:
-    def __init__(self):
-        self.inappropriate_patterns = INAPPROPRIATE_PATTERNS
+    """Screens descriptions before classification.
+
+    The built-in INAPPROPRIATE_TERMS are extended by settings.screening_wordlist_path
+    when set. Screening never touches the file: the service container calls reload()
+    from a worker thread every screening_reload_interval_seconds, which re-reads the
+    file only when its modification time changed and swaps the compiled rules in whole.
+    """
+
+    def __init__(self, wordlist_path: Optional[str] = None):
+        self.wordlist_path = wordlist_path if wordlist_path is not None else settings.screening_wordlist_path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self.rules = ScreeningRules(INAPPROPRIATE_TERMS)
+        self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompiles the rules if the word list changed; returns True when new rules were loaded."""
+        if not self.wordlist_path:
+            return False
+        with self._lock:
+            try:
+                mtime = os.stat(self.wordlist_path).st_mtime
+            except OSError as e:
+                logger.warning(f"Screening word list unavailable: {e}")
+                return False
+            if not force and mtime == self._mtime:
+                return False
+            with open(self.wordlist_path, encoding="utf-8") as wordlist:
+                terms, patterns = parse_wordlist(wordlist)
+            for rule, builtin_terms in INAPPROPRIATE_TERMS.items():
+                terms.setdefault(rule, [])[:0] = builtin_terms
+            self.rules = ScreeningRules(terms, patterns, source=self.wordlist_path)
+            self._mtime = mtime
+        logger.info(f"Loaded screening rules from {self.wordlist_path}: {self.rules.stats()}")
+        return True
+
+    def find_inappropriate_content(self, description: str) -> Optional[ScreeningMatch]:
+        """Returns the screening rule the description matches, if any."""
+        return self.rules.match(description)
 
     def is_inappropriate_content(self, description: str) -> bool:
         """Checks for inappropriate content in the description."""
-        description_lower = description.lower()
-        for pattern in self.inappropriate_patterns:
-            if re.search(pattern, description_lower, re.IGNORECASE):
-                return True
-        return False
+        return self.find_inappropriate_content(description) is not None
 
     def is_ambiguous_description(self, description: str) -> bool:
         """Checks if the description is too vague or ambiguous."""
         description = description.strip()
-        if len(description) < 10 or len(set(description.lower().replace(' ', ''))) < 3 or re.match(r'^[0-9\s\W]+$', description):
+        if len(description) < 10 or len(set(description.lower().replace(' ', ''))) < 3 or _NO_LETTERS.match(description):
             return True
-        return False
\ No newline at end of file
+        return False
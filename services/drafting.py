@@ -0,0 +1,193 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+from config import settings, AI_TEMPERATURE, AI_MAX_TOKENS, DEFAULT_FALLBACK_DEPARTMENT
+from .ai_service import AzureClient
+from .admission import admission_context
+from .response_parser import complete_structured, partial_string_field, response_content
+from models.llm_outputs import TicketTextOutput
+from utils.logging import logger
+from utils.metrics import metrics
+
+DRAFT_FIELDS = ("summary", "email")
+
+
+def provisional_text(description: str, classification_data: Dict[str, Any]) -> Dict[str, str]:
+    """Template title, summary and email used until (or instead of) a model-written draft."""
+    category = classification_data.get("category", "Incident")
+    severity = classification_data.get("severity", "Medium")
+    department = classification_data.get("department", DEFAULT_FALLBACK_DEPARTMENT)
+    skills = ", ".join(classification_data.get("required_skills", []))
+    headline = description.strip().rstrip(".")
+    if len(headline) > 60:
+        headline = headline[:57].rsplit(" ", 1)[0] + "..."
+    return {
+        "title": f"{category}: {headline}",
+        "summary": f"{severity} severity {category} incident reported: {description.strip()}",
+        "email": (
+            f"Hello,\n\nA new {severity.lower()} severity incident has been assigned to the "
+            f"{department} team.\n\nDescription: {description.strip()}\n"
+            f"Relevant skills: {skills}\n\nPlease review and respond at your earliest convenience.\n\nThank you."
+        )
+    }
+
+
+class EmailDrafter:
+    """Second phase of the pipeline: writes the summary and email for a routed incident."""
+
+    def __init__(self, ai_client: AzureClient):
+        self.ai_client = ai_client
+
+    def build_messages(self, description: str, classification_data: Dict[str, Any],
+                       staff_name: Optional[str] = None) -> List[Dict[str, str]]:
+        prompt = f"""
+        Write the ticket text for this incident, which has already been classified and assigned.
+
+        Incident Description: "{description}"
+        Category: {classification_data.get("category")}
+        Severity: {classification_data.get("severity")}
+        Department: {classification_data.get("department")}
+        Required Skills: {', '.join(classification_data.get("required_skills", []))}
+        Assigned To: {staff_name or "the " + str(classification_data.get("department")) + " team"}
+
+        Respond with ONLY valid JSON:
+        {{
+            "summary": "brief professional summary",
+            "email": "professional detailed email content for assigned staff"
+        }}
+        """
+        return [
+            {"role": "system", "content": "You are an expert incident writer. Respond only with valid JSON."},
+            {"role": "user", "content": prompt}
+        ]
+
+    async def draft(self, description: str, classification_data: Dict[str, Any],
+                    staff_name: Optional[str] = None) -> Dict[str, str]:
+        messages = self.build_messages(description, classification_data, staff_name)
+        with metrics.span("drafting.llm_wait"):
+            response = await self.ai_client.create_chat_completion(
+                messages=messages,
+                temperature=AI_TEMPERATURE,
+                max_tokens=AI_MAX_TOKENS,
+                call_site="drafting",
+                json_mode=True
+            )
+        text, _ = await complete_structured(self.ai_client, messages, response_content(response),
+                                            TicketTextOutput, "drafting")
+        return text
+
+    async def draft_stream(self, description: str, classification_data: Dict[str, Any],
+                           staff_name: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields {"field", "text"} deltas while the draft streams in, then {"draft": {...}}."""
+        messages = self.build_messages(description, classification_data, staff_name)
+        buffer = ""
+        sent = {field: 0 for field in DRAFT_FIELDS}
+        async for item in self.ai_client.stream_chat_completion(
+            messages=messages,
+            temperature=AI_TEMPERATURE,
+            max_tokens=AI_MAX_TOKENS,
+            call_site="drafting",
+            json_mode=True
+        ):
+            if "delta" not in item:
+                continue
+            buffer += item["delta"]
+            for field in DRAFT_FIELDS:
+                text = partial_string_field(buffer, field)
+                if text and len(text) > sent[field]:
+                    yield {"field": field, "text": text[sent[field]:]}
+                    sent[field] = len(text)
+
+        text, _ = await complete_structured(self.ai_client, messages, buffer, TicketTextOutput, "drafting")
+        yield {"draft": text}
+
+
+class Draft:
+    __slots__ = ("draft_id", "status", "description", "classification_data", "staff_name",
+                 "summary", "email", "error", "expires_at", "task")
+
+    def __init__(self, description: str, classification_data: Dict[str, Any], staff_name: Optional[str],
+                 summary: str, email: str):
+        self.draft_id = uuid.uuid4().hex
+        self.status = "pending"
+        self.description = description
+        self.classification_data = classification_data
+        self.staff_name = staff_name
+        self.summary = summary
+        self.email = email
+        self.error: Optional[str] = None
+        self.expires_at = time.monotonic() + settings.draft_ttl_seconds
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "draft_id": self.draft_id,
+            "status": self.status,
+            "summary": self.summary,
+            "email": self.email,
+            "error": self.error
+        }
+
+
+class DraftStore:
+    """Holds summary/email drafts that are written after the assignment has been returned.
+
+    "background" drafts start immediately and run concurrently with the response;
+    "deferred" drafts only start when someone asks for them. Nobody is blocked on
+    either, so their model calls are admitted as batch work.
+    """
+
+    def __init__(self, drafter: EmailDrafter):
+        self.drafter = drafter
+        self._drafts: "OrderedDict[str, Draft]" = OrderedDict()
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._drafts:
+            draft_id, draft = next(iter(self._drafts.items()))
+            if draft.expires_at > now and len(self._drafts) <= settings.draft_max_entries:
+                break
+            if draft.task is not None and not draft.task.done():
+                draft.task.cancel()
+            del self._drafts[draft_id]
+
+    def create(self, description: str, classification_data: Dict[str, Any], staff_name: Optional[str],
+               summary: str, email: str, start: bool) -> Draft:
+        draft = Draft(description, classification_data, staff_name, summary, email)
+        self._drafts[draft.draft_id] = draft
+        self._prune()
+        if start:
+            self._start(draft)
+        return draft
+
+    def _start(self, draft: Draft):
+        if draft.task is None:
+            draft.task = asyncio.create_task(self._run(draft))
+
+    async def _run(self, draft: Draft):
+        draft.status = "running"
+        try:
+            with admission_context("batch"):
+                text = await self.drafter.draft(draft.description, draft.classification_data, draft.staff_name)
+            draft.summary = text.get("summary", draft.summary)
+            draft.email = text.get("email", draft.email)
+            draft.status = "ready"
+        except Exception as e:
+            logger.error(f"Draft {draft.draft_id} failed: {e}")
+            draft.error = str(e)
+            draft.status = "failed"
+
+    async def get(self, draft_id: str, wait: bool = True) -> Optional[Draft]:
+        """Returns a draft, starting it if it was deferred and optionally waiting for it to finish."""
+        draft = self._drafts.get(draft_id)
+        if draft is None or draft.expires_at <= time.monotonic():
+            return None
+        self._start(draft)
+        if wait:
+            try:
+                await asyncio.wait_for(asyncio.shield(draft.task), settings.draft_wait_timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+        return draft
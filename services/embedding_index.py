@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from config import settings
+from services.roster_index import RosterIndex, get_roster_index, normalize_skill
+from services.skill_matcher import skill_features
+from utils.logging import logger
+
+ENCODER_VERSION = 1
+SLOTS_PER_FEATURE = 2
+
+
+@functools.lru_cache(maxsize=65536)
+def _feature_slots(feature: str, dim: int) -> Tuple[Tuple[int, float], ...]:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8 * SLOTS_PER_FEATURE).digest()
+    slots = []
+    for start in range(0, len(digest), 8):
+        value = int.from_bytes(digest[start:start + 8], "little")
+        slots.append((value % dim, (1.0 if value >> 63 else -1.0) / SLOTS_PER_FEATURE ** 0.5))
+    return tuple(slots)
+
+
+class HashingEncoder:
+    """Stateless text encoder: word and character-trigram features hashed into a fixed-width vector.
+
+    The signed hashing trick needs no vocabulary or model download, so queries and the
+    persisted roster vectors stay comparable across restarts as long as dim is unchanged.
+    Each feature lands in two slots, so a single hash collision only adds half a feature
+    of spurious similarity.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in skill_features(text).items():
+                for slot, sign in _feature_slots(feature, self.dim):
+                    vectors[row, slot] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        return vectors / norms[:, None]
+
+
+class EmbeddingIndex:
+    """Embeddings of every roster skill with random-hyperplane LSH for approximate search.
+
+    Vectors live in <embedding_index_dir>/skills-<key>.npy next to a JSON file naming the
+    rows; the key digests the skill list and encoder settings, so a restart with the same
+    roster memory-maps the existing file instead of re-encoding. Each LSH table buckets
+    skills by the sign pattern of embedding_lsh_bits hyperplane projections; a query is
+    reranked exactly over the union of its buckets. Small rosters (and department-scoped
+    searches) skip the tables and are scored with a single matrix-vector product.
+    """
+
+    def __init__(self, roster: RosterIndex, directory: Optional[str] = None):
+        self.roster = roster
+        self.directory = directory if directory is not None else settings.embedding_index_dir
+        self.encoder = HashingEncoder(settings.embedding_dim)
+        self.skills: List[str] = sorted(roster.skills)
+        self.loaded_from_disk = False
+        started = time.perf_counter()
+        self.vectors = self._load_or_build()
+        self.build_seconds = time.perf_counter() - started
+
+        skill_rows = {skill: row for row, skill in enumerate(self.skills)}
+        self._department_rows: Dict[str, np.ndarray] = {
+            department: np.array(sorted({skill_rows[skill] for entry in roster.staff_in_department(department)
+                                         for skill in entry.skills if skill in skill_rows}), dtype=np.int64)
+            for department in roster.available_departments
+        }
+        self._departments = sorted(roster.available_departments)
+        self._department_vectors = self.encoder.encode(self._departments)
+
+        tables, bits = settings.embedding_lsh_tables, settings.embedding_lsh_bits
+        planes = np.random.default_rng(ENCODER_VERSION).standard_normal((tables * bits, self.encoder.dim))
+        self._planes = planes.astype(np.float32)
+        self._powers = (1 << np.arange(bits, dtype=np.int64))
+        codes = self._codes(self.vectors)
+        self._orders = [np.argsort(codes[:, table], kind="stable") for table in range(tables)]
+        self._sorted_codes = [codes[order, table] for table, order in enumerate(self._orders)]
+
+    @property
+    def cache_key(self) -> str:
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"v{ENCODER_VERSION}:dim{self.encoder.dim}\0".encode("utf-8"))
+        for skill in self.skills:
+            digest.update(skill.encode("utf-8") + b"\0")
+        return digest.hexdigest()
+
+    def _paths(self) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"skills-{self.cache_key}")
+        return base + ".npy", base + ".json"
+
+    def _load_or_build(self) -> np.ndarray:
+        if self.directory:
+            vectors_path, names_path = self._paths()
+            try:
+                with open(names_path, encoding="utf-8") as names_file:
+                    names = json.load(names_file)["skills"]
+                vectors = np.load(vectors_path, mmap_mode="r")
+                if names == self.skills and vectors.shape == (len(self.skills), self.encoder.dim):
+                    self.loaded_from_disk = True
+                    return vectors
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug(f"No usable skill embeddings on disk: {e}")
+
+        vectors = self.encoder.encode(self.skills)
+        if self.directory:
+            self._save(vectors)
+        return vectors
+
+    def _save(self, vectors: np.ndarray):
+        vectors_path, names_path = self._paths()
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename, so a concurrent reader (or worker) never maps a partial file
+            with open(vectors_path + suffix, "wb") as vectors_file:
+                np.save(vectors_file, vectors)
+            with open(names_path + suffix, "w", encoding="utf-8") as names_file:
+                json.dump({"encoder_version": ENCODER_VERSION, "dim": self.encoder.dim, "skills": self.skills}, names_file)
+            os.replace(vectors_path + suffix, vectors_path)
+            os.replace(names_path + suffix, names_path)
+        except OSError as e:
+            logger.warning(f"Could not persist skill embeddings to {self.directory}: {e}")
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        bits = settings.embedding_lsh_bits
+        signs = (np.asarray(vectors) @ self._planes.T > 0).reshape(len(vectors), -1, bits)
+        return signs.astype(np.int64) @ self._powers
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        codes = self._codes(query[None, :])[0]
+        found = [
+            order[np.searchsorted(sorted_codes, code, "left"):np.searchsorted(sorted_codes, code, "right")]
+            for order, sorted_codes, code in zip(self._orders, self._sorted_codes, codes)
+        ]
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+    def search(self, text: str, top_k: int = 5, department: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Roster skills most similar to the text, best first, optionally limited to one department's skills."""
+        if not self.skills or not text.strip():
+            return []
+        query = self.encoder.encode([text])[0]
+        if department is not None:
+            rows = self._department_rows.get(department, np.zeros(0, dtype=np.int64))
+        elif len(self.skills) <= settings.embedding_exact_search_max:
+            rows = None
+        else:
+            rows = self._candidate_rows(query)
+            if len(rows) < top_k:
+                rows = None
+        if rows is not None and not len(rows):
+            return []
+
+        similarities = np.asarray(self.vectors if rows is None else self.vectors[rows]) @ query
+        best = np.argsort(-similarities)[:top_k] if len(similarities) <= top_k else \
+            np.argpartition(-similarities, top_k - 1)[:top_k]
+        best = sorted(best, key=lambda index: -similarities[index])
+        return [
+            (self.skills[index if rows is None else rows[index]], round(float(similarities[index]), 4))
+            for index in best
+        ]
+
+    def resolve_skill(self, skill: str, department: Optional[str] = None) -> Optional[str]:
+        """The roster skill a proposed skill refers to: itself when it exists, else its nearest match."""
+        normalized = normalize_skill(skill)
+        if normalized in self.roster.by_skill and (department is None or self.roster.staff_with_skill(normalized, department)):
+            return normalized
+        matches = self.search(normalized, 1, department)
+        if matches and matches[0][1] >= settings.embedding_min_similarity:
+            return matches[0][0]
+        return None
+
+    def resolve_skills(self, skills: Sequence[str], department: Optional[str] = None) -> Dict[str, str]:
+        """Maps each proposed skill that has a roster counterpart to that roster skill."""
+        resolved = {}
+        for skill in skills:
+            match = self.resolve_skill(skill, department)
+            if match is not None:
+                resolved[skill] = match
+        return resolved
+
+    def resolve_department(self, department: str, skills: Sequence[str]) -> Optional[str]:
+        """Maps an unknown department to a real one, by name similarity first and then by who holds the skills."""
+        if self._departments and department.strip():
+            similarities = self._department_vectors @ self.encoder.encode([department])[0]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= settings.embedding_min_similarity:
+                return self._departments[best]
+
+        votes: Dict[str, float] = {}
+        for skill in skills:
+            for match, similarity in self.search(normalize_skill(skill), 3):
+                if similarity < settings.embedding_min_similarity:
+                    break
+                for holder in {entry.department for entry in self.roster.staff_with_skill(match)}:
+                    votes[holder] = votes.get(holder, 0.0) + similarity
+        if not votes:
+            return None
+        return min(votes, key=lambda holder: (-votes[holder], holder))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "skills": len(self.skills),
+            "dim": self.encoder.dim,
+            "lsh_tables": len(self._orders),
+            "lsh_bits": settings.embedding_lsh_bits,
+            "memory_mapped": isinstance(self.vectors, np.memmap),
+            "loaded_from_disk": self.loaded_from_disk,
+            "build_seconds": round(self.build_seconds, 4),
+            "path": self._paths()[0] if self.directory else None
+        }
+
+
+_index_lock = threading.Lock()
+_index: Optional[EmbeddingIndex] = None
+
+
+def get_embedding_index() -> EmbeddingIndex:
+    """Returns the embedding index for the live roster, rebuilding it after a roster swap."""
+    global _index
+    roster = get_roster_index()
+    index = _index
+    if index is None or index.roster is not roster:
+        with _index_lock:
+            if _index is None or _index.roster is not roster:
+                _index = EmbeddingIndex(roster)
+            index = _index
+    return index
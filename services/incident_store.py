@@ -0,0 +1,376 @@
+import asyncio
+import base64
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from config import settings
+from utils.logging import logger
+from utils.types import ClassificationResponse
+
+# Fields of the model's classification kept for cache and local-classifier warm-up
+CLASSIFICATION_FIELDS = ("category", "severity", "department", "required_skills", "title")
+
+
+def incident_record(description: str, result: ClassificationResponse,
+                    classification_data: Optional[Dict[str, Any]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Flattens a triage result into the row written to the incident store."""
+    classification = result.get("classification", {})
+    assignment = result.get("staff_assignment", {})
+    details = result.get("processing_details", {})
+    usage = details.get("token_usage") or {}
+    return {
+        "incident_id": details.get("incident_id") or uuid.uuid4().hex,
+        "created_at": time.time(),
+        "description": description,
+        "category": classification.get("category"),
+        "severity": classification.get("severity"),
+        "department": classification.get("department"),
+        "staff_id": assignment.get("assigned_staff_id"),
+        "staff_name": assignment.get("assigned_staff_name"),
+        "assignment_status": assignment.get("assignment_status"),
+        "classifier": details.get("classifier"),
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "total_tokens": usage.get("total_tokens"),
+        "processing_time_ms": result.get("processing_time_ms"),
+        "classification_data": {
+            field: classification_data[field] for field in CLASSIFICATION_FIELDS if field in classification_data
+        } if classification_data else None,
+        "result": result,
+        "timings": timings or {}
+    }
+
+
+def encode_cursor(created_at: float, incident_id: str) -> str:
+    return base64.urlsafe_b64encode(f"v1:{created_at!r}:{incident_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Raises ValueError for anything encode_cursor did not produce."""
+    decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    version, created_at, incident_id = decoded.split(":", 2)
+    if version != "v1":
+        raise ValueError(cursor)
+    return float(created_at), incident_id
+
+
+class IncidentStore:
+    """Persistence interface for triaged incidents.
+
+    Backends write batches from the background writer and answer filtered queries
+    newest first, paging with an opaque cursor. Methods are blocking and are called
+    from worker threads.
+    """
+
+    def write_many(self, records: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def query(self, department: Optional[str] = None, severity: Optional[str] = None,
+              staff_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Returns {"items": [...], "next_cursor": str or None}."""
+        raise NotImplementedError
+
+    def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def recent_classifications(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """(description, classification_data) of the latest model classifications, oldest first."""
+        raise NotImplementedError
+
+    def spill_jobs(self, jobs: List[Dict[str, Any]]):
+        """Keeps unfinished background jobs across a restart (see utils.background.JobQueue)."""
+        raise NotImplementedError
+
+    def take_spilled_jobs(self) -> List[Dict[str, Any]]:
+        """Returns and forgets the jobs spilled by the last shutdown."""
+        return []
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+
+class SQLiteIncidentStore(IncidentStore):
+    """Incident store in a local SQLite file in WAL mode.
+
+    Writes go through one connection and reads through another, so queries are not
+    blocked by the writer; every filter is served by a (column, created_at, incident_id)
+    index, which is also the keyset the cursor pages on.
+    """
+
+    COLUMNS = ("incident_id", "created_at", "description", "category", "severity", "department", "staff_id",
+               "staff_name", "assignment_status", "classifier", "prompt_tokens", "completion_tokens",
+               "total_tokens", "processing_time_ms")
+    FILTERS = ("department", "severity", "staff_id")
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(f"""
+            CREATE TABLE IF NOT EXISTS incidents (
+                {", ".join(f"{column} {self._column_type(column)}" for column in self.COLUMNS)},
+                classification_data TEXT,
+                result TEXT NOT NULL,
+                timings TEXT
+            );
+            CREATE INDEX IF NOT EXISTS incidents_created ON incidents (created_at, incident_id);
+            CREATE TABLE IF NOT EXISTS spilled_jobs (job_id TEXT PRIMARY KEY, spilled_at REAL NOT NULL, job TEXT NOT NULL);
+            {"".join(f"CREATE INDEX IF NOT EXISTS incidents_{column} ON incidents ({column}, created_at, incident_id);" for column in self.FILTERS)}
+        """)
+        self._reader = self._connect()
+        self.written = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL only risks the last commits on power loss, never corruption
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @staticmethod
+    def _column_type(column: str) -> str:
+        if column == "incident_id":
+            return "TEXT PRIMARY KEY"
+        if column == "created_at":
+            return "REAL NOT NULL"
+        if column.endswith("_tokens") or column.endswith("_ms"):
+            return "INTEGER"
+        return "TEXT"
+
+    def write_many(self, records: List[Dict[str, Any]]):
+        rows = [
+            tuple(record.get(column) for column in self.COLUMNS) + (
+                json.dumps(record["classification_data"]) if record.get("classification_data") else None,
+                json.dumps(record["result"], default=str),
+                json.dumps(record.get("timings") or {})
+            )
+            for record in records
+        ]
+        placeholders = ", ".join("?" * (len(self.COLUMNS) + 3))
+        with self._write_lock:
+            with self._writer:
+                self._writer.execute("BEGIN")
+                self._writer.executemany(
+                    f"INSERT OR REPLACE INTO incidents ({', '.join(self.COLUMNS)}, classification_data, result, timings) "
+                    f"VALUES ({placeholders})",
+                    rows
+                )
+            self.written += len(rows)
+
+    def _row(self, row: sqlite3.Row, full: bool = False) -> Dict[str, Any]:
+        item = {column: row[column] for column in self.COLUMNS}
+        item["timings"] = json.loads(row["timings"]) if row["timings"] else {}
+        if full:
+            item["classification_data"] = json.loads(row["classification_data"]) if row["classification_data"] else None
+            item["result"] = json.loads(row["result"])
+        return item
+
+    def query(self, department: Optional[str] = None, severity: Optional[str] = None,
+              staff_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, value in (("department", department), ("severity", severity), ("staff_id", staff_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            clauses.append("(created_at, incident_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT {', '.join(self.COLUMNS)}, timings FROM incidents {where} "
+               f"ORDER BY created_at DESC, incident_id DESC LIMIT ?")
+        with self._read_lock:
+            rows = self._reader.execute(sql, params + [limit + 1]).fetchall()
+        items = [self._row(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["incident_id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        with self._read_lock:
+            row = self._reader.execute(
+                f"SELECT {', '.join(self.COLUMNS)}, classification_data, result, timings FROM incidents WHERE incident_id = ?",
+                (incident_id,)
+            ).fetchone()
+        return self._row(row, full=True) if row is not None else None
+
+    def recent_classifications(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT description, classification_data FROM incidents "
+                "WHERE classifier = 'llm' AND classification_data IS NOT NULL "
+                "ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [(row["description"], json.loads(row["classification_data"])) for row in reversed(rows)]
+
+    def spill_jobs(self, jobs: List[Dict[str, Any]]):
+        now = time.time()
+        with self._write_lock:
+            with self._writer:
+                self._writer.execute("BEGIN")
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO spilled_jobs (job_id, spilled_at, job) VALUES (?, ?, ?)",
+                    [(job["job_id"], now, json.dumps(job, default=str)) for job in jobs]
+                )
+
+    def take_spilled_jobs(self) -> List[Dict[str, Any]]:
+        with self._write_lock:
+            with self._writer:
+                self._writer.execute("BEGIN IMMEDIATE")
+                rows = self._writer.execute("SELECT job FROM spilled_jobs ORDER BY spilled_at, rowid").fetchall()
+                self._writer.execute("DELETE FROM spilled_jobs")
+        return [json.loads(row["job"]) for row in rows]
+
+    def close(self):
+        with self._write_lock, self._read_lock:
+            self._writer.close()
+            self._reader.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._read_lock:
+            count = self._reader.execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "incidents": count, "written": self.written}
+
+
+STORE_BACKENDS = {"sqlite": lambda: SQLiteIncidentStore(settings.incident_store_path)}
+
+
+def create_incident_store(backend: str) -> Optional[IncidentStore]:
+    """Builds the configured backend: a name from STORE_BACKENDS, "none", or "package.module:ClassName"."""
+    if backend in ("", "none"):
+        return None
+    if backend in STORE_BACKENDS:
+        return STORE_BACKENDS[backend]()
+    module_name, _, class_name = backend.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+_store: Optional[IncidentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_incident_store() -> Optional[IncidentStore]:
+    """The process-wide incident store, or None when persistence is disabled."""
+    global _store
+    if _store is None and settings.incident_store_backend not in ("", "none"):
+        with _store_lock:
+            if _store is None:
+                _store = create_incident_store(settings.incident_store_backend)
+    return _store
+
+
+class IncidentWriter:
+    """Moves incident records to the store off the request path.
+
+    submit() only appends to a bounded queue (dropping the record when it is full, so
+    triage never waits on storage); a background task takes up to
+    incident_writer_batch_size records at a time, waiting at most
+    incident_writer_flush_seconds for a batch to fill, and writes each batch in one
+    transaction on a worker thread.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[Dict[str, Any]] = []
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def submit(self, record: Dict[str, Any]):
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(record)
+            self.submitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        if self._task is not None or get_incident_store() is None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.incident_writer_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            await asyncio.to_thread(get_incident_store().write_many, batch)
+            self.batches += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Incident store write of {len(batch)} records failed: {e}")
+
+    async def _run(self):
+        while True:
+            # Records taken off the queue wait in _pending, so stop() can flush a half-filled batch
+            self._pending.append(await self._queue.get())
+            deadline = time.monotonic() + settings.incident_writer_flush_seconds
+            while len(self._pending) < settings.incident_writer_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            await self._write(batch)
+
+    async def stop(self):
+        """Stops the writer after flushing whatever is still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        pending, self._pending = self._pending, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), settings.incident_writer_batch_size):
+            await self._write(pending[start:start + settings.incident_writer_batch_size])
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        store = get_incident_store()
+        return {
+            "running": self._task is not None,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failures": self.failures,
+            "store": store.stats() if store is not None else None
+        }
+
+
+incident_writer = IncidentWriter()
@@ -0,0 +1,165 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from config import settings, DEFAULT_FALLBACK_SKILLS, HIGH_SEVERITY_KEYWORDS, LOW_SEVERITY_KEYWORDS
+from services.classification_cache import STOPWORDS
+from services.roster_index import get_roster_index
+from services.skill_retriever import get_skill_retriever, tokenize
+
+_MAX_CENTROID_TERMS = 2000
+
+
+def predict_severity(description: str) -> str:
+    """Keyword-based severity estimate: High on outage/security terms, Low on routine requests."""
+    text = description.lower()
+    if any(re.search(rf"\b{re.escape(keyword)}\b", text) for keyword in HIGH_SEVERITY_KEYWORDS):
+        return "High"
+    if any(re.search(rf"\b{re.escape(keyword)}\b", text) for keyword in LOW_SEVERITY_KEYWORDS):
+        return "Low"
+    return "Medium"
+
+
+class _DepartmentModel:
+    """Running centroid of the descriptions the model routed to one department."""
+    __slots__ = ("term_weights", "examples", "categories", "severities", "skills")
+
+    def __init__(self):
+        self.term_weights: Dict[str, float] = {}
+        self.examples = 0
+        self.categories: Counter = Counter()
+        self.severities: Counter = Counter()
+        self.skills: Counter = Counter()
+
+    def add(self, vector: Dict[str, float], category: str, severity: str, skills: List[str]):
+        self.examples += 1
+        for term, weight in vector.items():
+            self.term_weights[term] = self.term_weights.get(term, 0.0) + weight
+        if len(self.term_weights) > _MAX_CENTROID_TERMS:
+            kept = sorted(self.term_weights.items(), key=lambda item: -item[1])[:_MAX_CENTROID_TERMS // 2]
+            self.term_weights = dict(kept)
+        self.categories[category] += 1
+        self.severities[severity] += 1
+        self.skills.update(skills)
+
+    def similarity(self, vector: Dict[str, float]) -> float:
+        norm = math.sqrt(sum(weight * weight for weight in self.term_weights.values()))
+        if not norm:
+            return 0.0
+        return sum(weight * self.term_weights.get(term, 0.0) for term, weight in vector.items()) / norm
+
+
+class LocalClassifier:
+    """In-process classifier for incidents whose routing is obvious.
+
+    Department evidence comes from two places: lexical TF-IDF similarity between the
+    description and roster skills, and a nearest-centroid model trained online on the
+    classifications the LLM has returned. The confidence combines the best department's
+    evidence, its margin over the runner-up and how much of the description was
+    recognised; callers only trust predictions above local_classifier_threshold for
+    departments with at least local_classifier_min_examples learned examples.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, _DepartmentModel] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _vector(description: str) -> Dict[str, float]:
+        counts = Counter(term for term in tokenize(description) if term not in STOPWORDS)
+        weights = {term: 1 + math.log(count) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+    def learn(self, description: str, classification_data: Dict[str, Any]):
+        """Adds one model-labelled example; examples for unknown departments are ignored."""
+        department = classification_data.get("department")
+        if department not in get_roster_index().available_departments:
+            return
+        vector = self._vector(description)
+        if not vector:
+            return
+        skills = [skill.strip().lower() for skill in classification_data.get("required_skills", []) if isinstance(skill, str)]
+        with self._lock:
+            model = self._models.setdefault(department, _DepartmentModel())
+            model.add(vector, str(classification_data.get("category", department)),
+                      str(classification_data.get("severity", "Medium")), skills)
+
+    def _lexical_scores(self, description: str) -> Dict[str, Any]:
+        retriever = get_skill_retriever()
+        terms = [term for term in tokenize(description) if term not in STOPWORDS]
+        known = [term for term in terms if term in retriever.idf]
+        query_norm = math.sqrt(sum(retriever.idf[term] ** 2 for term in set(known))) or 1.0
+        coverage = len(known) / len(terms) if terms else 0.0
+
+        skill_scores = {skill: score / query_norm for skill, score in retriever.score_skills(description).items()}
+        department_scores: Dict[str, float] = {}
+        department_skills: Dict[str, List[str]] = {}
+        roster = get_roster_index()
+        for skill in sorted(skill_scores, key=lambda skill: -skill_scores[skill]):
+            for entry in roster.staff_with_skill(skill):
+                department_scores[entry.department] = max(department_scores.get(entry.department, 0.0), min(skill_scores[skill], 1.0))
+                skills = department_skills.setdefault(entry.department, [])
+                if skill not in skills:
+                    skills.append(skill)
+        return {"departments": department_scores, "skills": department_skills, "coverage": coverage}
+
+    def predict(self, description: str) -> Optional[Dict[str, Any]]:
+        """Returns category, severity, department, required_skills and confidence, or None without evidence."""
+        lexical = self._lexical_scores(description)
+        vector = self._vector(description)
+        evidence: Dict[str, float] = dict(lexical["departments"])
+        learned_coverage = 0.0
+        with self._lock:
+            models = dict(self._models)
+        for department, model in models.items():
+            if department not in get_roster_index().available_departments:
+                continue
+            ramp = min(1.0, model.examples / 5)
+            learned = model.similarity(vector) * ramp
+            if learned > evidence.get(department, 0.0):
+                evidence[department] = learned
+                learned_coverage = max(learned_coverage, sum(1 for term in vector if term in model.term_weights) / len(vector))
+
+        if not evidence:
+            return None
+
+        ranked = sorted(evidence, key=lambda department: -evidence[department])
+        department = ranked[0]
+        best = evidence[department]
+        runner_up = evidence[ranked[1]] if len(ranked) > 1 else 0.0
+        margin = (best - runner_up) / best if best else 0.0
+        coverage = max(lexical["coverage"], learned_coverage)
+        confidence = best * margin * (0.5 + 0.5 * coverage)
+
+        model = models.get(department)
+        skills = lexical["skills"].get(department, [])[:3]
+        if not skills and model is not None:
+            skills = [skill for skill, _ in model.skills.most_common(3)]
+        # Without learned examples there is no category to report, only a department
+        category = model.categories.most_common(1)[0][0] if model is not None and model.examples else "Manual Assignment Required"
+
+        return {
+            "category": category,
+            "severity": predict_severity(description),
+            "department": department,
+            "required_skills": skills or list(DEFAULT_FALLBACK_SKILLS),
+            "confidence": round(confidence, 4)
+        }
+
+    def examples(self, department: str) -> int:
+        """Model-labelled examples learned for the department."""
+        with self._lock:
+            model = self._models.get(department)
+            return model.examples if model is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": settings.local_classifier_enabled,
+                "threshold": settings.local_classifier_threshold,
+                "min_examples": settings.local_classifier_min_examples,
+                "trained_examples": {department: model.examples for department, model in self._models.items()}
+            }
+
@@ -1,16 +1,22 @@
 from models.requests import RegenerateRequest
 from datetime import datetime
 from services.ai_service import AzureClient
-import json
 from datetime import datetime
 from fastapi import HTTPException
 from utils.logging import logger
+from utils.streaming import format_sse
+from services.response_parser import StructuredOutputError, complete_structured, partial_string_field, response_content
+from models.llm_outputs import TicketTextOutput
+from typing import AsyncIterator, Optional
+from utils.metrics import metrics
+from services.usage_ledger import TokenBudgetExceeded
+from services.admission import AdmissionTimeout
 
 
 
 class AIRegenerator():
-    def __init__(self):
-        self.ai_client=AzureClient()
+    def __init__(self, ai_client: Optional[AzureClient] = None):
+        self.ai_client=ai_client or AzureClient()
         self.prompt = """
 Improve the following text by:
 1. Making the summary more clear and structured.
@@ -23,46 +29,84 @@ Summary:
 
 Email:
 {email}
+
+Respond with ONLY valid JSON:
+{{
+    "summary": "improved summary",
+    "email": {{"subject": "email subject", "body": "improved email body"}}
+}}
 """
     
     
+    def _build_messages(self, regenerate: RegenerateRequest):
+        prompt=self.prompt.format(
+            summary=regenerate.summary,
+            email=regenerate.email
+        )
+        return [
+            {"role":"system","content":"You are an expert IT incident classifier and staff assignment specialist.Respond only with valid JSON."},
+            {"role":"user","content":prompt}
+        ]
+
+    async def regenerate_stream(self, regenerate: RegenerateRequest) -> AsyncIterator[str]:
+        """Streams the improved summary and email as "summary.delta" / "email.delta" events, then "complete"."""
+        buffer = ""
+        sent = {"summary": 0, "email": 0}
+        try:
+            messages = self._build_messages(regenerate)
+            async for item in self.ai_client.stream_chat_completion(
+                messages=messages,
+                temperature=0.3,
+                max_tokens=500,
+                call_site="regeneration",
+                json_mode=True
+            ):
+                if "delta" not in item:
+                    continue
+                buffer += item["delta"]
+                for field in sent:
+                    text = partial_string_field(buffer, field)
+                    if text and len(text) > sent[field]:
+                        yield format_sse(f"{field}.delta", {"text": text[sent[field]:]})
+                        sent[field] = len(text)
+
+            parsed, _ = await complete_structured(self.ai_client, messages, buffer, TicketTextOutput, "regeneration",
+                                                  temperature=0.3, max_tokens=500)
+            yield format_sse("complete", parsed)
+
+        except Exception as e:
+            logger.error(f"Regenerate stream error: {e}")
+            yield format_sse("error", {"detail": "Regeneration service error"})
+
     async def regenerate(self,regenerate:RegenerateRequest):
         try:
             start_time = datetime.now()
 
-            prompt=self.prompt.format(
-                summary=regenerate.summary,
-                email=regenerate.email
-            )
-
-            messages=[
-                {"role":"system","content":"You are an expert IT incident classifier and staff assignment specialist.Respond only with valid JSON."},
-                {"role":"user","content":prompt}
-            ]
+            with metrics.span("regenerate.prompt_build"):
+                messages=self._build_messages(regenerate)
 
-            response=await self.ai_client.create_chat_completion(messages=messages,
-                temperature=0.3,
-                max_tokens=500)
-            
-            ai_response=response['choices'][0]['message']['content'].strip()
-            if ai_response.startswith("```json"):
-                ai_response = ai_response[7:-3]
-            elif ai_response.startswith("```"):
-                ai_response = ai_response[3:-3]
-
-            parsed = json.loads(ai_response)
-            
-            if "summary" not in parsed or "email" not in parsed:
-             raise HTTPException(status_code=400, detail="AI response is missing required fields.")
+            with metrics.span("regenerate.llm_wait"):
+                response=await self.ai_client.create_chat_completion(messages=messages,
+                    temperature=0.3,
+                    max_tokens=500,
+                    call_site="regeneration",
+                    json_mode=True)
 
+            parsed, _ = await complete_structured(self.ai_client, messages, response_content(response), TicketTextOutput,
+                                                  "regeneration", temperature=0.3, max_tokens=500)
             return {
             "summary": parsed["summary"],
-            "email": parsed["email"]["body"]
+            "email": parsed["email"]
         }
 
-        except json.JSONDecodeError as e:
+        except TokenBudgetExceeded as e:
+         raise HTTPException(status_code=429, detail=str(e))
+
+        except AdmissionTimeout as e:
+         raise HTTPException(status_code=503, detail=str(e))
+
+        except StructuredOutputError as e:
          logger.error(f"JSON parsing error: {e}")
-         logger.error(f"Raw AI response: {ai_response}")
          raise HTTPException(status_code=500, detail="AI response parsing failed")
 
         except Exception as e:
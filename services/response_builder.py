@@ -44,8 +44,11 @@ class ResponseBuilder:
             logger.error(f"No available Admin staff for {category} fallback response. Reason: {reason}")
             raise ValueError(f"Cannot create fallback response: No available staff in {DEFAULT_FALLBACK_DEPARTMENT} for {category} case")
 
+        # Counted like any routed ticket, so fallbacks spread over the Admins and can be closed
+        assignment_id = self.staff_selector.record_assignment(admin_staff)
+
         # logger.info(f"Creating fallback response for Admin staff: {admin_staff["cr6dd_UserID"]['cr6dd_name']}")
-        return {
+        response = {
             "classification": {
                 "category": category,
                 "severity": "Low",
@@ -70,6 +73,9 @@ class ResponseBuilder:
                 "department_available": True
             }
         }
+        if assignment_id:
+            response["processing_details"]["assignment_id"] = assignment_id
+        return response
 
     def create_classification_response(
         self,
@@ -0,0 +1,183 @@
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+from config import settings, AI_TEMPERATURE, AI_MAX_TOKENS
+from models.llm_outputs import StructuredOutput
+from utils.logging import logger
+from utils.metrics import metrics
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the same error either way
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+_DECODER = json.JSONDecoder()
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```\s*$")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _value_start(buffer: str, key: str) -> Optional[int]:
+    """Index of the first non-blank character after `"key":`, or None if not there yet."""
+    match = re.search(r'"' + re.escape(key) + r'"\s*:\s*', buffer)
+    if match is None or match.end() >= len(buffer):
+        return None
+    return match.end()
+
+
+def extract_complete_fields(buffer: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """Returns the fields of a partially received JSON object whose values are already complete."""
+    fields = {}
+    for key in keys:
+        start = _value_start(buffer, key)
+        if start is None:
+            continue
+        try:
+            value, end = _DECODER.raw_decode(buffer, start)
+        except ValueError:
+            continue
+        # A bare number at the end of the buffer may still be growing
+        if end == len(buffer) and not isinstance(value, (str, list, dict)):
+            continue
+        fields[key] = value
+    return fields
+
+
+def partial_string_field(buffer: str, key: str) -> Optional[str]:
+    """Decodes as much of a (possibly unfinished) JSON string value as has arrived.
+
+    If the value is an object, its "body" string is followed instead, since models
+    sometimes answer with {"email": {"subject": ..., "body": ...}}.
+    """
+    start = _value_start(buffer, key)
+    if start is None:
+        return None
+    if buffer[start] == "{":
+        return partial_string_field(buffer[start:], "body")
+    if buffer[start] != '"':
+        return None
+
+    chars = []
+    index = start + 1
+    while index < len(buffer):
+        char = buffer[index]
+        if char == '"':
+            break
+        if char == "\\":
+            if index + 1 >= len(buffer):
+                break
+            escape = buffer[index + 1]
+            if escape == "u":
+                code = buffer[index + 2:index + 6]
+                if len(code) < 4:
+                    break
+                try:
+                    chars.append(chr(int(code, 16)))
+                except ValueError:
+                    pass
+                index += 6
+                continue
+            chars.append(_ESCAPES.get(escape, escape))
+            index += 2
+            continue
+        chars.append(char)
+        index += 1
+    return "".join(chars)
+
+
+class StructuredOutputError(ValueError):
+    """A model reply that still lacks required fields after the follow-up calls."""
+
+    def __init__(self, schema: Type[StructuredOutput], missing: List[str], content: str):
+        super().__init__(f"AI response is missing required fields: {', '.join(missing)}")
+        self.schema = schema
+        self.missing = missing
+        self.content = content
+
+
+def response_content(response: Dict[str, Any]) -> str:
+    return response['choices'][0]["message"]["content"] or ""
+
+
+def extract_json_object(content: str) -> str:
+    """Strips code fences and any text around the outermost object; an unterminated object is kept to the end."""
+    text = _FENCE.sub("", content.strip())
+    start = text.find('{')
+    if start == -1:
+        return text
+    end = text.rfind('}')
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def parse_json_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Parses the JSON object in a chat completion, tolerating code fences and stray text."""
+    ai_response = extract_json_object(response_content(response))
+    try:
+        return _loads(ai_response)
+    except json.JSONDecodeError:
+        logger.error(f"Raw AI response: {ai_response}")
+        raise
+
+
+def parse_structured(content: str, schema: Type[StructuredOutput]) -> Tuple[Dict[str, Any], List[str]]:
+    """Returns the valid fields of a model reply and the required fields it is missing.
+
+    The whole object is parsed in one go when it is well formed; a truncated or
+    malformed reply (e.g. cut off at max_tokens) keeps every field whose value is
+    complete. Either way the result is validated against the schema once.
+    """
+    text = extract_json_object(content)
+    try:
+        data = _loads(text)
+    except json.JSONDecodeError:
+        data = extract_complete_fields(text, schema.model_fields)
+    if not isinstance(data, dict):
+        data = {}
+    output = schema.model_validate(data)
+    fields = {field: value for field, value in output.model_dump(mode="json").items() if value is not None}
+    return fields, output.missing_fields()
+
+
+async def complete_structured(ai_client, messages: List[Dict[str, str]], content: str,
+                              schema: Type[StructuredOutput], call_site: str,
+                              temperature: float = AI_TEMPERATURE,
+                              max_tokens: int = AI_MAX_TOKENS,
+                              budget_wait: Optional[float] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Parses a model reply and asks again for just the required fields it is missing.
+
+    Returns the fields and the names of those that took a follow-up call; raises
+    StructuredOutputError if any are still missing after ai_field_retry_attempts.
+    Follow-up calls wait at most budget_wait for the token budget, like the first one.
+    """
+    with metrics.span(f"{call_site}.json_parse"):
+        fields, missing = parse_structured(content, schema)
+    retried: List[str] = []
+    attempt = 0
+    while missing and attempt < settings.ai_field_retry_attempts:
+        attempt += 1
+        logger.warning(f"{call_site} response is missing {', '.join(missing)}; asking again for those fields")
+        retried.extend(field for field in missing if field not in retried)
+        follow_up = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": (
+                f"Your reply was incomplete or invalid for: {', '.join(missing)}. "
+                f"Respond with ONLY a JSON object containing just those fields."
+            )}
+        ]
+        with metrics.span(f"{call_site}.field_retry"):
+            response = await ai_client.create_chat_completion(
+                messages=follow_up,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                call_site=call_site,
+                budget_wait=budget_wait,
+                json_mode=True
+            )
+        retry_fields, _ = parse_structured(response_content(response), schema)
+        fields.update({field: retry_fields[field] for field in missing if field in retry_fields})
+        missing = schema.model_validate(fields).missing_fields()
+
+    if missing:
+        logger.error(f"Raw AI response: {content}")
+        raise StructuredOutputError(schema, missing, content)
+    return fields, retried
@@ -0,0 +1,293 @@
+import hashlib
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from utils.types import Staff, SkillIndex
+from utils.logging import logger
+
+
+class StaffEntry:
+    """Compact, pre-normalized view of one roster record."""
+    __slots__ = ("position", "staff_id", "department", "skills", "record")
+
+    def __init__(self, position: int, staff_id: str, department: str, skills: FrozenSet[str], record: Staff):
+        self.position = position
+        self.staff_id = staff_id
+        self.department = department
+        self.skills = skills
+        self.record = record
+
+
+def normalize_skill(skill: str) -> str:
+    return skill.strip().lower()
+
+
+def parse_skillset(skillset: Optional[str]) -> FrozenSet[str]:
+    """Splits a comma separated skillset into normalized skills."""
+    if not skillset:
+        return frozenset()
+    return frozenset(skill for skill in (normalize_skill(part) for part in skillset.split(",")) if skill)
+
+
+def staff_key(staff: Staff) -> str:
+    return staff.get("cr6dd_staff1id") or staff.get("cr6dd_staffid", "")
+
+
+def is_available(staff: Staff) -> bool:
+    """The feed sends availability as a bool, the static roster as "True"/"False" strings."""
+    availability = staff.get("cr6dd_availability", False)
+    if isinstance(availability, str):
+        return availability.strip().lower() == "true"
+    return bool(availability)
+
+
+def is_assignable(staff: Staff) -> bool:
+    return is_available(staff) and bool(staff.get("cr6dd_UserID"))
+
+
+class RosterIndex:
+    """Immutable lookup structures over the staff roster.
+
+    Built once per roster version and replaced wholesale through swap_roster_index,
+    so readers never observe a half-updated index.
+    """
+
+    def __init__(self, records: Iterable[Staff], generation: int = 0):
+        self.generation = generation
+        self.entries: Dict[str, StaffEntry] = {}
+        for position, staff in enumerate(records):
+            entry = self._make_entry(position, staff)
+            self.entries[entry.staff_id] = entry
+        self._next_position = len(self.entries)
+        self._build_lookups()
+
+    @classmethod
+    def from_positioned(cls, records: Iterable[Tuple[int, Staff]], next_position: int,
+                        generation: int = 0) -> "RosterIndex":
+        """Builds an index that keeps each record's roster position, e.g. when read back from a snapshot."""
+        index = cls.__new__(cls)
+        index.generation = generation
+        index.entries = {}
+        for position, staff in records:
+            entry = cls._make_entry(position, staff)
+            index.entries[entry.staff_id] = entry
+        index._next_position = next_position
+        index._build_lookups()
+        return index
+
+    @property
+    def next_position(self) -> int:
+        return self._next_position
+
+    @staticmethod
+    def _make_entry(position: int, staff: Staff) -> StaffEntry:
+        return StaffEntry(
+            position=position,
+            staff_id=staff_key(staff) or str(position),
+            department=staff.get("cr6dd_departmentname", ""),
+            skills=parse_skillset(staff.get("cr6dd_skillset")),
+            record=staff
+        )
+
+    def _build_lookups(self):
+        by_department: Dict[str, List[StaffEntry]] = {}
+        by_department_skill: Dict[str, Dict[str, List[StaffEntry]]] = {}
+        by_skill: Dict[str, List[StaffEntry]] = {}
+
+        for entry in sorted(self.entries.values(), key=lambda e: e.position):
+            if not is_assignable(entry.record):
+                continue
+            by_department.setdefault(entry.department, []).append(entry)
+            department_skills = by_department_skill.setdefault(entry.department, {})
+            for skill in entry.skills:
+                by_skill.setdefault(skill, []).append(entry)
+                department_skills.setdefault(skill, []).append(entry)
+
+        self.by_department: Dict[str, Tuple[StaffEntry, ...]] = {
+            department: tuple(entries) for department, entries in by_department.items()
+        }
+        self.by_skill: Dict[str, Tuple[StaffEntry, ...]] = {
+            skill: tuple(entries) for skill, entries in by_skill.items()
+        }
+        self._by_department_skill: Dict[str, Dict[str, Tuple[StaffEntry, ...]]] = {
+            department: {skill: tuple(entries) for skill, entries in skills.items()}
+            for department, skills in by_department_skill.items()
+        }
+        self._finish_lookups()
+
+    def _finish_lookups(self):
+        self.available_departments: FrozenSet[str] = frozenset(self.by_department)
+        self.skills: Tuple[str, ...] = tuple(self.by_skill)
+        self._skill_index: Optional[SkillIndex] = None
+        self._routing_signature: Optional[str] = None
+        self._skill_columns: Optional[Dict[str, int]] = None
+
+    def apply_delta(self, upserts: Iterable[Staff], removed_ids: Iterable[str]) -> "RosterIndex":
+        """Returns a new index with records added, replaced or removed.
+
+        Unchanged entries are shared with this index and only the department and
+        skill buckets touched by the delta are rebuilt.
+        """
+        index = RosterIndex.__new__(RosterIndex)
+        index.generation = self.generation
+        index.entries = dict(self.entries)
+        index._next_position = self._next_position
+
+        stale: List[StaffEntry] = []
+        fresh: List[StaffEntry] = []
+        for staff_id in removed_ids:
+            entry = index.entries.pop(staff_id, None)
+            if entry is not None:
+                stale.append(entry)
+        for staff in upserts:
+            previous = index.entries.get(staff_key(staff))
+            if previous is not None:
+                stale.append(previous)
+                position = previous.position
+            else:
+                position = index._next_position
+                index._next_position += 1
+            entry = self._make_entry(position, staff)
+            index.entries[entry.staff_id] = entry
+            fresh.append(entry)
+
+        touched_ids = {entry.staff_id for entry in stale} | {entry.staff_id for entry in fresh}
+        added = [entry for entry in fresh if is_assignable(entry.record)]
+
+        def merge(existing: Tuple[StaffEntry, ...], additions: List[StaffEntry]) -> Tuple[StaffEntry, ...]:
+            kept = [entry for entry in existing if entry.staff_id not in touched_ids]
+            return tuple(sorted(kept + additions, key=lambda entry: entry.position))
+
+        def rebuild(buckets: Dict[str, Tuple[StaffEntry, ...]], key: str, additions: List[StaffEntry]):
+            merged = merge(buckets.get(key, ()), additions)
+            if merged:
+                buckets[key] = merged
+            else:
+                buckets.pop(key, None)
+
+        affected_departments = {entry.department for entry in stale} | {entry.department for entry in fresh}
+        index.by_department = dict(self.by_department)
+        index._by_department_skill = dict(self._by_department_skill)
+        for department in affected_departments:
+            department_additions = [entry for entry in added if entry.department == department]
+            rebuild(index.by_department, department, department_additions)
+
+            department_skills = dict(index._by_department_skill.get(department, {}))
+            stale_skills = {skill for entry in stale if entry.department == department for skill in entry.skills}
+            for skill in stale_skills | {skill for entry in department_additions for skill in entry.skills}:
+                rebuild(department_skills, skill, [entry for entry in department_additions if skill in entry.skills])
+            if department_skills:
+                index._by_department_skill[department] = department_skills
+            else:
+                index._by_department_skill.pop(department, None)
+
+        affected_skills = {skill for entry in stale for skill in entry.skills} | {skill for entry in fresh for skill in entry.skills}
+        index.by_skill = dict(self.by_skill)
+        for skill in affected_skills:
+            rebuild(index.by_skill, skill, [entry for entry in added if skill in entry.skills])
+
+        index._finish_lookups()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def staff_in_department(self, department: str) -> Tuple[StaffEntry, ...]:
+        """Available staff of a department in roster order."""
+        return self.by_department.get(department, ())
+
+    def staff_with_skill(self, skill: str, department: Optional[str] = None) -> Tuple[StaffEntry, ...]:
+        """Available staff holding a normalized skill, optionally limited to one department."""
+        if department is None:
+            return self.by_skill.get(skill, ())
+        return self._by_department_skill.get(department, {}).get(skill, ())
+
+    def department_incidence(self, department: str) -> Tuple[np.ndarray, sparse.csc_matrix]:
+        """Sorted positions in self.skills held in the department, and the skill-by-staff
+        incidence matrix over staff_in_department(department) restricted to those skills."""
+        if self._skill_columns is None:
+            self._skill_columns = {skill: column for column, skill in enumerate(self.skills)}
+        skill_column = self._skill_columns
+        entries = self.staff_in_department(department)
+        columns = sorted({skill_column[skill] for entry in entries for skill in entry.skills if skill in skill_column})
+        local = {column: row for row, column in enumerate(columns)}
+        rows, cols = [], []
+        for staff_column, entry in enumerate(entries):
+            for skill in entry.skills:
+                if skill in skill_column:
+                    rows.append(local[skill_column[skill]])
+                    cols.append(staff_column)
+        incidence = sparse.csc_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(columns), len(entries)))
+        return np.array(columns, dtype=np.int64), incidence
+
+    @property
+    def routing_signature(self) -> str:
+        """Digest of the routable departments and skills; changes only when routing options change."""
+        if self._routing_signature is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for department in sorted(self.available_departments):
+                digest.update(b"d:" + department.encode("utf-8") + b"\0")
+            for skill in sorted(self.skills):
+                digest.update(b"s:" + skill.encode("utf-8") + b"\0")
+            self._routing_signature = digest.hexdigest()
+        return self._routing_signature
+
+    @property
+    def skill_index(self) -> SkillIndex:
+        """Skill -> staff summaries, in the shape SkillIndexer has always exposed."""
+        if self._skill_index is None:
+            self._skill_index = {
+                skill: [
+                    {
+                        "department": entry.department,
+                        "name": entry.record["cr6dd_UserID"]["cr6dd_name"],
+                        "email": entry.record["cr6dd_UserID"]["cr6dd_email"],
+                        "staffid": entry.staff_id,
+                        "skillset": entry.record["cr6dd_skillset"]
+                    }
+                    for entry in entries
+                ]
+                for skill, entries in self.by_skill.items()
+            }
+        return self._skill_index
+
+
+_index_lock = threading.Lock()
+_current_index: Optional[RosterIndex] = None
+
+
+def get_roster_index() -> RosterIndex:
+    """Returns the live roster index, loading the snapshot or building from the static roster on first use."""
+    global _current_index
+    index = _current_index
+    if index is None:
+        with _index_lock:
+            if _current_index is None:
+                from services.roster_snapshot import load_roster_snapshot, save_roster_snapshot
+                index = load_roster_snapshot()
+                if index is not None:
+                    logger.info(f"Roster index generation {index.generation} loaded from snapshot with {len(index)} staff records")
+                else:
+                    from services.staff_data import get_staff_data
+                    index = RosterIndex(get_staff_data(), generation=1)
+                    logger.info(f"Roster index built with {len(index)} staff records")
+                    save_roster_snapshot(index)
+                _current_index = index
+            index = _current_index
+    return index
+
+
+def swap_roster_index(index: RosterIndex, generation: Optional[int] = None) -> RosterIndex:
+    """Atomically replaces the live roster index and returns the previous one.
+
+    The new index gets the next generation number, or the given one when adopting
+    a generation published by another worker.
+    """
+    global _current_index
+    with _index_lock:
+        previous = _current_index
+        index.generation = generation if generation is not None else (previous.generation if previous else 0) + 1
+        _current_index = index
+    logger.info(f"Roster index swapped to generation {index.generation} ({len(index)} staff records)")
+    return previous
@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from config import settings
+from models.staff_validations import StaffRecord
+from services.roster_index import get_roster_index, staff_key, swap_roster_index
+from services.embedding_index import get_embedding_index
+from services.roster_snapshot import save_roster_snapshot
+from utils.http_client import http_pool
+from utils.types import Staff
+from utils.logging import logger
+from utils.metrics import metrics
+
+
+class RosterRefresher:
+    """Polls the Power Automate staff feed and applies record-level deltas to the roster index.
+
+    Each record's @odata.etag is compared with the held copy; only added, changed and
+    removed records are validated and applied, and the new index is swapped in atomically
+    so in-flight classifications keep routing against the index they started with. An
+    empty feed, or one missing more than staff_feed_max_removed_fraction of the roster,
+    is refused and the current index kept.
+    """
+
+    def __init__(self, feed_url: Optional[str] = None, interval_seconds: Optional[float] = None):
+        self.feed_url = feed_url or settings.staff_feed_url
+        self.interval_seconds = interval_seconds or settings.staff_refresh_interval_seconds
+        self._records: Optional[Dict[str, Staff]] = None
+        self._etags: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[datetime] = None
+        self.last_delta: Dict[str, int] = {"added": 0, "changed": 0, "removed": 0}
+
+    def _seed_from_index(self):
+        """Holds the records the live index was built from, so the first poll is a delta too."""
+        if self._records is not None:
+            return
+        self._records = {}
+        for staff_id, entry in get_roster_index().entries.items():
+            self._records[staff_id] = entry.record
+            self._etags[staff_id] = entry.record.get("@odata.etag", "")
+
+    @property
+    def records(self) -> List[Staff]:
+        self._seed_from_index()
+        return list(self._records.values())
+
+    async def fetch_feed(self) -> List[Dict[str, Any]]:
+        response = await http_pool.client.get(self.feed_url)
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Power Automate API request failed: {response.text}"
+            )
+
+        response_data = response.json()
+        if isinstance(response_data, list):
+            staff_records = response_data
+        else:
+            staff_records = response_data.get("value", response_data)
+
+        if not isinstance(staff_records, list):
+            raise HTTPException(
+                status_code=400,
+                detail="Unexpected response format from Power Automate API"
+            )
+        return staff_records
+
+    def compute_delta(self, feed_records: List[Dict[str, Any]]) -> Tuple[List[Staff], List[Staff], List[str]]:
+        """Splits a feed snapshot into validated added and changed records plus removed ids."""
+        self._seed_from_index()
+        added: List[Staff] = []
+        changed: List[Staff] = []
+        seen = set()
+
+        for raw in feed_records:
+            staff_id = staff_key(raw)
+            if not staff_id:
+                logger.warning("Skipping staff record without an id")
+                continue
+            seen.add(staff_id)
+            etag = raw.get("@odata.etag", "")
+            if staff_id in self._records and etag and self._etags.get(staff_id) == etag:
+                continue
+            try:
+                record = StaffRecord(**raw).model_dump(by_alias=True)
+            except ValidationError as e:
+                logger.warning(f"Skipping invalid staff record {staff_id}: {e}")
+                continue
+            (changed if staff_id in self._records else added).append(record)
+
+        removed = [staff_id for staff_id in self._records if staff_id not in seen]
+        return added, changed, removed
+
+    def _check_removals(self, feed_records: List[Dict[str, Any]], removed: List[str]):
+        """Raises instead of letting an empty or truncated feed empty the roster."""
+        held = len(self._records)
+        if not held:
+            return
+        if not feed_records or len(removed) > settings.staff_feed_max_removed_fraction * held:
+            logger.warning(
+                f"Refusing staff feed with {len(feed_records)} records: it would remove {len(removed)} of {held} staff"
+            )
+            raise HTTPException(
+                status_code=502,
+                detail=f"Staff feed would remove {len(removed)} of {held} staff; keeping the current roster"
+            )
+
+    async def refresh(self) -> Dict[str, int]:
+        """Fetches the feed once and applies whatever changed since the last poll."""
+        with metrics.span("staff.fetch"):
+            feed_records = await self.fetch_feed()
+        async with self._lock:
+            with metrics.span("staff.compute_delta"):
+                added, changed, removed = self.compute_delta(feed_records)
+            self._check_removals(feed_records, removed)
+            if added or changed or removed:
+                upserts = added + changed
+                with metrics.span("staff.apply_delta"):
+                    swap_roster_index(get_roster_index().apply_delta(upserts, removed))
+                for record in upserts:
+                    staff_id = staff_key(record)
+                    self._records[staff_id] = record
+                    self._etags[staff_id] = record.get("@odata.etag", "")
+                for staff_id in removed:
+                    self._records.pop(staff_id, None)
+                    self._etags.pop(staff_id, None)
+                logger.info(f"Roster delta applied: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+                # The next start loads the current feed state instead of the static roster
+                await asyncio.to_thread(save_roster_snapshot, get_roster_index())
+                if settings.embedding_index_enabled:
+                    # Build (or map from disk) the new roster's embeddings before requests need them
+                    await asyncio.to_thread(get_embedding_index)
+
+            self.last_refresh = datetime.now()
+            self.last_delta = {"added": len(added), "changed": len(changed), "removed": len(removed)}
+            return self.last_delta
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Roster refresh failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Roster refresher started (interval {self.interval_seconds}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+roster_refresher = RosterRefresher()
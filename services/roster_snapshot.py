@@ -0,0 +1,492 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from config import settings
+from services.roster_index import RosterIndex, StaffEntry
+from utils.types import Staff
+from utils.logging import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SNAPSHOT_MAGIC = b"RSNP"
+SNAPSHOT_FORMAT = 2
+_HEADER = struct.Struct("<4sIQ")
+_ALIGN = 16
+_GENERATION = struct.Struct("<q")
+_STATIC_ROSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "staff_data.py")
+
+
+def static_roster_stamp() -> Optional[Dict[str, int]]:
+    """Size and mtime of the static roster module; a snapshot taken against another version is stale."""
+    try:
+        stat = os.stat(_STATIC_ROSTER)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class GenerationCounter:
+    """Roster generation published through an 8-byte memory-mapped file next to the snapshot.
+
+    Every worker maps the file; reading the generation is a single aligned load, so
+    followers can check for a swap on every poll without touching the snapshot itself.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+
+    def _mapped(self) -> mmap.mmap:
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a+b") as counter:
+                        if os.fstat(counter.fileno()).st_size < _GENERATION.size:
+                            counter.truncate(_GENERATION.size)
+                        self._map = mmap.mmap(counter.fileno(), _GENERATION.size)
+        return self._map
+
+    @property
+    def value(self) -> int:
+        return _GENERATION.unpack_from(self._mapped())[0]
+
+    def publish(self, generation: int):
+        mapped = self._mapped()
+        _GENERATION.pack_into(mapped, 0, generation)
+        mapped.flush()
+
+
+_counters: Dict[str, GenerationCounter] = {}
+
+
+def generation_counter(path: Optional[str] = None) -> Optional[GenerationCounter]:
+    """The generation counter belonging to a snapshot path; None when snapshots are disabled."""
+    path = path if path is not None else settings.roster_snapshot_path
+    if not path:
+        return None
+    counter = _counters.get(path)
+    if counter is None:
+        counter = _counters.setdefault(path, GenerationCounter(path + ".generation"))
+    return counter
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _encode_record(record: Staff) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record, default=str)
+    return json.dumps(record, separators=(",", ":"), default=str).encode("utf-8")
+
+
+_decode_record = orjson.loads if orjson is not None else json.loads
+
+
+def _blob(items: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.fromiter((len(item) for item in items), dtype=np.int64, count=len(items)))
+    return np.frombuffer(b"".join(items), dtype=np.uint8), offsets
+
+
+def _csr(groups: List[List[int]], dtype=np.int32) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.fromiter((len(group) for group in groups), dtype=np.int64, count=len(groups)))
+    values = np.fromiter((value for group in groups for value in group), dtype=dtype, count=int(indptr[-1]))
+    return indptr, values
+
+
+def _snapshot_sections(index) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Flattens an index into arrays: string tables with hash lookups, and CSR member lists of row numbers."""
+    entries = sorted(index.entries.values(), key=lambda entry: entry.position)
+    row_of = {entry.staff_id: row for row, entry in enumerate(entries)}
+    routable = list(index.skills)
+    skill_ids = {skill: column for column, skill in enumerate(routable)}
+    for entry in entries:
+        for skill in sorted(entry.skills):
+            skill_ids.setdefault(skill, len(skill_ids))
+    departments = sorted({entry.department for entry in entries})
+    department_ids = {department: number for number, department in enumerate(departments)}
+
+    def rows(members) -> List[int]:
+        return [row_of[member.staff_id] for member in members]
+
+    sections: Dict[str, np.ndarray] = {
+        "positions": np.array([entry.position for entry in entries], dtype=np.int64),
+        "staff_department": np.array([department_ids[entry.department] for entry in entries], dtype=np.int32)
+    }
+    for table, values in (("staff_id", [entry.staff_id for entry in entries]), ("department", departments),
+                          ("skill", list(skill_ids))):
+        sections[f"{table}_blob"], sections[f"{table}_offsets"] = _blob([value.encode("utf-8") for value in values])
+        hashes = np.array([_hash64(value) for value in values], dtype=np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        sections[f"{table}_hashes"], sections[f"{table}_ids"] = hashes[order], order.astype(np.int32)
+    sections["record_blob"], sections["record_offsets"] = _blob([_encode_record(entry.record) for entry in entries])
+    sections["staff_skill_indptr"], sections["staff_skill_ids"] = _csr(
+        [sorted(skill_ids[skill] for skill in entry.skills) for entry in entries]
+    )
+    sections["department_indptr"], sections["department_members"] = _csr(
+        [rows(index.staff_in_department(department)) for department in departments]
+    )
+    sections["skill_indptr"], sections["skill_members"] = _csr([rows(index.staff_with_skill(skill)) for skill in routable])
+
+    # (department, skill) buckets keyed department << 32 | skill, in key order, and each
+    # department's skill-by-staff incidence matrix in CSC form for the skill matcher
+    pair_keys, pair_groups = [], []
+    column_groups, incidence_indptr, incidence_indices, incidence_base = [], [], [], [0]
+    for number, department in enumerate(departments):
+        members = index.staff_in_department(department)
+        for skill in sorted({skill_ids[skill] for member in members for skill in member.skills}):
+            pair_keys.append(number << 32 | skill)
+            pair_groups.append(rows(index.staff_with_skill(routable[skill], department)))
+        columns, incidence = index.department_incidence(department)
+        incidence = incidence.tocsc()
+        incidence.sort_indices()
+        column_groups.append(columns.tolist())
+        incidence_indptr.append(incidence.indptr.astype(np.int32))
+        incidence_indices.append(incidence.indices.astype(np.int32))
+        incidence_base.append(incidence_base[-1] + incidence.nnz)
+    sections["pair_keys"] = np.array(pair_keys, dtype=np.uint64)
+    sections["pair_indptr"], sections["pair_members"] = _csr(pair_groups)
+    sections["incidence_column_indptr"], sections["incidence_columns"] = _csr(column_groups, np.int64)
+    sections["incidence_indptr"] = np.concatenate(incidence_indptr) if incidence_indptr else np.zeros(0, dtype=np.int32)
+    sections["incidence_indices"] = np.concatenate(incidence_indices) if incidence_indices else np.zeros(0, dtype=np.int32)
+    sections["incidence_base"] = np.array(incidence_base, dtype=np.int64)
+    sections["incidence_data"] = np.ones(incidence_base[-1], dtype=np.float64)
+
+    meta = {"records": len(entries), "next_position": index.next_position, "routable_skills": len(routable),
+            "routing_signature": index.routing_signature}
+    return sections, meta
+
+
+def save_roster_snapshot(index, path: Optional[str] = None) -> bool:
+    """Writes the index in the mapped snapshot format and publishes its generation."""
+    path = path if path is not None else settings.roster_snapshot_path
+    if not path:
+        return False
+    if isinstance(index, MappedRosterIndex) and index.path == path and index.file_generation == index.generation:
+        # Already on disk as it is; only the generation needs publishing
+        generation_counter(path).publish(index.generation)
+        return True
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        sections, meta = _snapshot_sections(index)
+        layout: Dict[str, List[Any]] = {}
+        offset = 0
+        for name, array in sections.items():
+            layout[name] = [offset, array.dtype.str, int(array.size)]
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+        meta.update({"format": SNAPSHOT_FORMAT, "static_roster": static_roster_stamp(),
+                     "generation": index.generation, "sections": layout})
+        encoded = json.dumps(meta).encode("utf-8")
+        data_start = -(-(_HEADER.size + len(encoded)) // _ALIGN) * _ALIGN
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(temporary, "wb") as snapshot:
+            snapshot.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(encoded)) + encoded)
+            for name, array in sections.items():
+                snapshot.seek(data_start + layout[name][0])
+                snapshot.write(array.tobytes())
+            snapshot.truncate(data_start + offset)
+        # The snapshot is in place before its generation is published, so a worker
+        # that sees the new number always finds a snapshot at least that new
+        os.replace(temporary, path)
+        generation_counter(path).publish(index.generation)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write roster snapshot to {path}: {e}")
+        return False
+    return True
+
+
+def load_roster_snapshot(path: Optional[str] = None) -> Optional["MappedRosterIndex"]:
+    """Maps the roster snapshot read-only; None when missing, unreadable or stale."""
+    path = path if path is not None else settings.roster_snapshot_path
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as snapshot:
+            mapped = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = _HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+            logger.info("Roster snapshot has an old format; rebuilding from the static roster")
+            return None
+        meta = json.loads(mapped[_HEADER.size:_HEADER.size + meta_length])
+        if meta.get("static_roster") != static_roster_stamp():
+            logger.info("Roster snapshot is stale; rebuilding from the static roster")
+            return None
+        data_start = -(-(_HEADER.size + meta_length) // _ALIGN) * _ALIGN
+        return MappedRosterIndex(path, mapped, meta, data_start)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.warning(f"Ignoring unreadable roster snapshot {path}: {e}")
+        return None
+
+
+class _MappedEntry(StaffEntry):
+    """StaffEntry for one row of a mapped snapshot; fields are decoded from the file on first use."""
+    __slots__ = ("_roster", "_row", "_record", "_skills")
+
+    def __init__(self, roster: "MappedRosterIndex", row: int):
+        self._roster = roster
+        self._row = row
+        self._record: Optional[Staff] = None
+        self._skills: Optional[FrozenSet[str]] = None
+
+    @property
+    def position(self) -> int:
+        return int(self._roster._positions[self._row])
+
+    @property
+    def staff_id(self) -> str:
+        return self._roster._string("staff_id", self._row)
+
+    @property
+    def department(self) -> str:
+        return self._roster._string("department", int(self._roster._staff_department[self._row]))
+
+    @property
+    def skills(self) -> FrozenSet[str]:
+        if self._skills is None:
+            roster = self._roster
+            start, end = roster._staff_skill_indptr[self._row:self._row + 2]
+            self._skills = frozenset(roster._string("skill", int(skill)) for skill in roster._staff_skill_ids[start:end])
+        return self._skills
+
+    @property
+    def record(self) -> Staff:
+        if self._record is None:
+            self._record = self._roster._record(self._row)
+        return self._record
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, _MappedEntry):
+            return NotImplemented
+        return self._roster is other._roster and self._row == other._row
+
+    def __hash__(self) -> int:
+        return hash(self._row)
+
+
+class _EntryView(Sequence):
+    """Staff entries for a slice of row numbers, created as they are accessed."""
+    __slots__ = ("_roster", "_rows")
+
+    def __init__(self, roster: "MappedRosterIndex", rows: np.ndarray):
+        self._roster = roster
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return _EntryView(self._roster, self._rows[item])
+        return _MappedEntry(self._roster, int(self._rows[item]))
+
+    def __iter__(self) -> Iterator[StaffEntry]:
+        roster = self._roster
+        for row in self._rows.tolist():
+            yield _MappedEntry(roster, row)
+
+
+class _Entries(Mapping):
+    """staff_id -> entry over every row of the snapshot."""
+
+    def __init__(self, roster: "MappedRosterIndex"):
+        self._roster = roster
+
+    def __getitem__(self, staff_id: str) -> StaffEntry:
+        row = self._roster._find("staff_id", staff_id)
+        if row is None:
+            raise KeyError(staff_id)
+        return _MappedEntry(self._roster, row)
+
+    def __contains__(self, staff_id) -> bool:
+        return isinstance(staff_id, str) and self._roster._find("staff_id", staff_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._roster._string("staff_id", row) for row in range(len(self)))
+
+    def __len__(self) -> int:
+        return self._roster._records
+
+    def values(self):
+        return _EntryView(self._roster, np.arange(len(self)))
+
+    def items(self):
+        return ((entry.staff_id, entry) for entry in self.values())
+
+
+class _SkillMap(Mapping):
+    """Routable skill -> value(skill), without materializing the values up front."""
+
+    def __init__(self, roster: "MappedRosterIndex", value):
+        self._roster = roster
+        self._value = value
+
+    def __getitem__(self, skill: str):
+        if skill not in self:
+            raise KeyError(skill)
+        return self._value(skill)
+
+    def __contains__(self, skill) -> bool:
+        if not isinstance(skill, str):
+            return False
+        skill_id = self._roster._find("skill", skill)
+        return skill_id is not None and skill_id < self._roster._routable
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._roster.skills)
+
+    def __len__(self) -> int:
+        return self._roster._routable
+
+
+class MappedRosterIndex:
+    """Read-only roster index served in place from a memory-mapped snapshot.
+
+    Every lookup structure is a numpy view of the file: string tables resolved by
+    binary search over 64-bit name hashes, and CSR lists of row numbers per department,
+    skill and (department, skill). Worker processes mapping the same snapshot share its
+    pages through the page cache, so each added worker costs only the few entries it is
+    currently looking at rather than a copy of the roster. Entries are proxies decoded
+    on access; apply_delta builds an in-memory RosterIndex to apply the change to.
+    """
+
+    def __init__(self, path: str, mapped: mmap.mmap, meta: Dict[str, Any], data_start: int):
+        self.path = path
+        self.generation = self.file_generation = meta["generation"]
+        self.next_position = meta["next_position"]
+        self.routing_signature = meta["routing_signature"]
+        self._map = mapped
+        self._records = meta["records"]
+        self._routable = meta["routable_skills"]
+        self._offsets = {name: data_start + offset for name, (offset, _, _) in meta["sections"].items()}
+        self._arrays = {
+            name: np.frombuffer(mapped, dtype=np.dtype(dtype), count=count, offset=self._offsets[name])
+            for name, (_, dtype, count) in meta["sections"].items()
+        }
+        for name in ("positions", "staff_department", "staff_skill_indptr", "staff_skill_ids", "pair_keys"):
+            setattr(self, f"_{name}", self._arrays[name])
+        self._department_ids = {
+            self._string("department", number): number for number in range(len(self._arrays["department_offsets"]) - 1)
+        }
+        indptr = self._arrays["department_indptr"]
+        self.available_departments: FrozenSet[str] = frozenset(
+            department for department, number in self._department_ids.items() if indptr[number + 1] > indptr[number]
+        )
+        self._skills: Optional[Tuple[str, ...]] = None
+        self.entries = _Entries(self)
+        self.by_skill = _SkillMap(self, self.staff_with_skill)
+        self.skill_index = _SkillMap(self, self._skill_summaries)
+
+    def __len__(self) -> int:
+        return self._records
+
+    def _string(self, table: str, number: int) -> str:
+        offsets = self._arrays[f"{table}_offsets"]
+        return self._arrays[f"{table}_blob"][offsets[number]:offsets[number + 1]].tobytes().decode("utf-8")
+
+    def _find(self, table: str, value: str) -> Optional[int]:
+        hashes = self._arrays[f"{table}_hashes"]
+        target = np.uint64(_hash64(value))
+        at = int(np.searchsorted(hashes, target))
+        while at < len(hashes) and hashes[at] == target:
+            number = int(self._arrays[f"{table}_ids"][at])
+            if self._string(table, number) == value:
+                return number
+            at += 1
+        return None
+
+    def _exact(self, name: str, start: int, end: int) -> np.ndarray:
+        """A section slice as its own array over the file; scipy copies slices of much larger arrays."""
+        dtype = self._arrays[name].dtype
+        return np.frombuffer(self._map, dtype=dtype, count=end - start, offset=self._offsets[name] + start * dtype.itemsize)
+
+    def _record(self, row: int) -> Staff:
+        offsets = self._arrays["record_offsets"]
+        return _decode_record(self._arrays["record_blob"][offsets[row]:offsets[row + 1]].tobytes())
+
+    def _members(self, group: str, number: int):
+        indptr = self._arrays[f"{group}_indptr"]
+        start, end = indptr[number], indptr[number + 1]
+        return _EntryView(self, self._arrays[f"{group}_members"][start:end]) if end > start else ()
+
+    @property
+    def skills(self) -> Tuple[str, ...]:
+        if self._skills is None:
+            self._skills = tuple(self._string("skill", number) for number in range(self._routable))
+        return self._skills
+
+    def staff_in_department(self, department: str):
+        """Available staff of a department in roster order."""
+        number = self._department_ids.get(department)
+        return self._members("department", number) if number is not None else ()
+
+    def staff_with_skill(self, skill: str, department: Optional[str] = None):
+        """Available staff holding a normalized skill, optionally limited to one department."""
+        skill_id = self._find("skill", skill)
+        if skill_id is None or skill_id >= self._routable:
+            return ()
+        if department is None:
+            return self._members("skill", skill_id)
+        number = self._department_ids.get(department)
+        if number is None:
+            return ()
+        key = np.uint64(number << 32 | skill_id)
+        at = int(np.searchsorted(self._pair_keys, key))
+        if at == len(self._pair_keys) or self._pair_keys[at] != key:
+            return ()
+        return self._members("pair", at)
+
+    def department_incidence(self, department: str) -> Tuple[np.ndarray, sparse.csc_matrix]:
+        """Same as RosterIndex.department_incidence, as views of the snapshot."""
+        number = self._department_ids.get(department)
+        if number is None:
+            return np.zeros(0, dtype=np.int64), sparse.csc_matrix((0, 0))
+        arrays = self._arrays
+        column_start, column_end = arrays["incidence_column_indptr"][number:number + 2]
+        columns = arrays["incidence_columns"][column_start:column_end]
+        member_start, member_end = arrays["department_indptr"][number:number + 2]
+        members = int(member_end - member_start)
+        indptr_start = int(member_start) + number
+        base, end = (int(value) for value in arrays["incidence_base"][number:number + 2])
+        incidence = sparse.csc_matrix(
+            (self._exact("incidence_data", base, end), self._exact("incidence_indices", base, end),
+             self._exact("incidence_indptr", indptr_start, indptr_start + members + 1)),
+            shape=(len(columns), members), copy=False
+        )
+        return columns, incidence
+
+    def _skill_summaries(self, skill: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "department": entry.department,
+                "name": entry.record["cr6dd_UserID"]["cr6dd_name"],
+                "email": entry.record["cr6dd_UserID"]["cr6dd_email"],
+                "staffid": entry.staff_id,
+                "skillset": entry.record["cr6dd_skillset"]
+            }
+            for entry in self.staff_with_skill(skill)
+        ]
+
+    def to_index(self) -> RosterIndex:
+        """Decodes every record into an in-memory RosterIndex with the same positions."""
+        return RosterIndex.from_positioned(
+            ((entry.position, entry.record) for entry in self.entries.values()), self.next_position, self.generation
+        )
+
+    def apply_delta(self, upserts, removed_ids) -> RosterIndex:
+        return self.to_index().apply_delta(upserts, removed_ids)
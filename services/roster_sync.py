@@ -0,0 +1,125 @@
+import asyncio
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, Optional
+from config import settings
+from services.roster_index import get_roster_index, swap_roster_index
+from services.roster_snapshot import generation_counter, load_roster_snapshot
+from utils.logging import logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def shared_workers() -> bool:
+    """True when this process is one of uvicorn's workers, whether started by app.py or `uvicorn --workers`.
+
+    uvicorn runs its workers (and the --reload server) as multiprocessing children, so
+    any such process shares roster and workload state through the snapshot files.
+    """
+    return settings.workers > 1 or multiprocessing.parent_process() is not None
+
+
+class RosterSync:
+    """Keeps worker processes on one roster generation through the shared snapshot file.
+
+    One worker holds an exclusive lock on <snapshot>.lock and runs the feed refresher;
+    every swap it makes is written as a snapshot and its generation published through
+    the memory-mapped counter. The other workers poll the counter every
+    roster_sync_interval_seconds and load the snapshot when the number moves, so all
+    of them route against the same roster. The lock is released when the leader exits,
+    and the next follower to poll takes over refreshing.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = None, interval_seconds: Optional[float] = None):
+        self.snapshot_path = snapshot_path if snapshot_path is not None else settings.roster_snapshot_path
+        self.interval_seconds = interval_seconds or settings.roster_sync_interval_seconds
+        self.is_leader = False
+        self.reloads = 0
+        self._lock_file = None
+        self._seen_generation: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def try_lead(self) -> bool:
+        """Takes the leader lock if no other worker holds it."""
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            logger.warning("File locking is unavailable; every worker refreshes the roster itself")
+            self.is_leader = True
+            return True
+        lock_file = open(self.snapshot_path + ".lock", "a+b")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_leader = True
+        logger.info(f"Worker {os.getpid()} is the roster leader")
+        return True
+
+    def sync(self) -> bool:
+        """Adopts the published roster generation if it differs from ours; returns True on a swap."""
+        published = generation_counter(self.snapshot_path).value
+        if published == self._seen_generation or published == get_roster_index().generation:
+            return False
+        index = load_roster_snapshot(self.snapshot_path)
+        self._seen_generation = published
+        if index is None or index.generation == get_roster_index().generation:
+            return False
+        swap_roster_index(index, index.generation)
+        self.reloads += 1
+        return True
+
+    async def _run(self, on_leader: Optional[Callable[[], None]]):
+        while True:
+            try:
+                if not self.is_leader and self.try_lead():
+                    if on_leader is not None:
+                        on_leader()
+                if not self.is_leader:
+                    await asyncio.to_thread(self.sync)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Roster sync failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self, on_leader: Optional[Callable[[], None]] = None):
+        """Starts polling; on_leader runs once if and when this worker becomes the leader."""
+        if not self.snapshot_path:
+            raise RuntimeError("Several workers need ROSTER_SNAPSHOT_PATH to share the roster; set it or run one worker")
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(on_leader))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+
+    def stats(self) -> Dict[str, Any]:
+        counter = generation_counter(self.snapshot_path) if self.snapshot_path else None
+        return {
+            "workers": settings.workers,
+            "shared": shared_workers(),
+            "pid": os.getpid(),
+            "role": "leader" if self.is_leader else "follower",
+            "generation": get_roster_index().generation,
+            "published_generation": counter.value if counter else None,
+            "reloads": self.reloads
+        }
+
+
+roster_sync = RosterSync()
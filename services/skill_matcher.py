@@ -0,0 +1,127 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from config import settings
+from services.roster_index import RosterIndex, StaffEntry, get_roster_index, normalize_skill
+from services.skill_retriever import tokenize
+
+
+def skill_features(skill: str) -> Dict[str, float]:
+    """Word and character-trigram features of a skill, so "VPN troubleshooting" overlaps "vpn"."""
+    features: Dict[str, float] = {}
+    for word in tokenize(skill):
+        features[f"w:{word}"] = features.get(f"w:{word}", 0.0) + 1.0
+        padded = f"#{word}#"
+        for start in range(len(padded) - 2):
+            gram = f"g:{padded[start:start + 3]}"
+            features[gram] = features.get(gram, 0.0) + 0.5
+    return features
+
+
+class _DepartmentSkills:
+    __slots__ = ("entries", "skill_columns", "incidence")
+
+    def __init__(self, entries: Tuple[StaffEntry, ...], skill_columns: np.ndarray, incidence: sparse.csc_matrix):
+        self.entries = entries
+        self.skill_columns = skill_columns
+        self.incidence = incidence
+
+
+class SkillMatcher:
+    """Vectorized skill scoring over the roster.
+
+    Every distinct roster skill is a TF-IDF vector of word and character-trigram
+    features, stacked into one sparse matrix. Required skills are vectorized the same
+    way and compared with all skills in a single sparse product. A staff member's
+    score is, for each required skill, the best cosine similarity among their own
+    skills, summed over the required skills — the exact-match overlap count when the
+    strings are identical, and partial credit when they only resemble each other.
+    Each department keeps a sparse skill-to-staff incidence matrix, so scoring a
+    department is a handful of vectorized max-reductions regardless of its size.
+    """
+
+    def __init__(self, roster: RosterIndex):
+        self.roster = roster
+        self.skills: List[str] = list(roster.skills)
+
+        documents = [skill_features(skill) for skill in self.skills]
+        self.vocabulary: Dict[str, int] = {}
+        document_frequency: Dict[str, int] = {}
+        for features in documents:
+            for feature in features:
+                self.vocabulary.setdefault(feature, len(self.vocabulary))
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        total = max(len(documents), 1)
+        self.idf = np.ones(len(self.vocabulary))
+        for feature, column in self.vocabulary.items():
+            self.idf[column] = np.log((1 + total) / (1 + document_frequency[feature])) + 1
+        self.skill_matrix = self._vectorize(documents).T.tocsr()
+
+        # A snapshot-mapped roster serves the incidence matrices from the shared file
+        self._departments: Dict[str, _DepartmentSkills] = {}
+        for department in roster.available_departments:
+            columns, incidence = roster.department_incidence(department)
+            self._departments[department] = _DepartmentSkills(roster.staff_in_department(department), columns, incidence)
+
+    def _vectorize(self, documents: Sequence[Dict[str, float]]) -> sparse.csr_matrix:
+        rows, cols, values = [], [], []
+        for row, features in enumerate(documents):
+            for feature, weight in features.items():
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    rows.append(row)
+                    cols.append(column)
+                    values.append(weight * self.idf[column])
+        matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(documents), len(self.vocabulary)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1 / norms) @ matrix
+
+    def scores(self, required_skills: Sequence[str], department: str) -> Tuple[Tuple[StaffEntry, ...], np.ndarray]:
+        """Returns the department's staff and their summed best-match similarity to the required skills."""
+        department_skills = self._departments.get(department)
+        if department_skills is None or not department_skills.entries:
+            return (), np.zeros(0)
+        entries = department_skills.entries
+        totals = np.zeros(len(entries))
+        required = sorted({normalize_skill(skill) for skill in required_skills if normalize_skill(skill)})
+        if not required or not len(department_skills.skill_columns):
+            return entries, totals
+
+        queries = self._vectorize([skill_features(skill) for skill in required])
+        similarity = (queries @ self.skill_matrix[:, department_skills.skill_columns]).toarray()
+        similarity[similarity < settings.skill_match_min_similarity] = 0.0
+        for row in similarity:
+            if not row.any():
+                continue
+            weighted = department_skills.incidence.multiply(row[:, None]).tocsc()
+            totals += weighted.max(axis=0).toarray().ravel()
+        return entries, totals
+
+    def rank(self, required_skills: Sequence[str], department: str, top_k: int = 5) -> List[Tuple[StaffEntry, float]]:
+        """Top-K staff of a department by score; staff with no similarity at all are left out."""
+        entries, totals = self.scores(required_skills, department)
+        candidates = np.flatnonzero(totals > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-totals[candidates], top_k - 1)[:top_k]]
+        ordered = sorted(candidates, key=lambda index: (-totals[index], entries[index].position))
+        return [(entries[index], round(float(totals[index]), 4)) for index in ordered]
+
+
+_matcher_lock = threading.Lock()
+_matcher: Optional[SkillMatcher] = None
+
+
+def get_skill_matcher() -> SkillMatcher:
+    """Returns a matcher for the live roster, rebuilding it after a roster swap."""
+    global _matcher
+    roster = get_roster_index()
+    matcher = _matcher
+    if matcher is None or matcher.roster is not roster:
+        with _matcher_lock:
+            if _matcher is None or _matcher.roster is not roster:
+                _matcher = SkillMatcher(roster)
+            matcher = _matcher
+    return matcher
@@ -0,0 +1,132 @@
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from services.roster_index import RosterIndex, get_roster_index
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def _stem(token: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, lightly stemmed word tokens."""
+    return [_stem(token) for token in _TOKEN.findall(text.lower())]
+
+
+class SkillRetriever:
+    """TF-IDF retriever over the roster's skills, used to pre-select prompt candidates.
+
+    Each skill string is a document; a description is scored against every skill
+    sharing at least one term with it, and departments are ranked by the scores of
+    their matching skills plus any direct mention of the department name.
+    """
+
+    def __init__(self, roster: RosterIndex):
+        self.roster = roster
+        self._postings: Dict[str, List[Tuple[str, float]]] = {}
+        self._department_terms: Dict[str, set] = {}
+        self._skill_departments: Dict[str, set] = {}
+
+        skill_terms = {skill: tokenize(skill) for skill in roster.skills}
+        document_frequency: Dict[str, int] = {}
+        for terms in skill_terms.values():
+            for term in set(terms):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        total = max(len(skill_terms), 1)
+        self.idf = {term: math.log((1 + total) / (1 + frequency)) + 1 for term, frequency in document_frequency.items()}
+        for skill, terms in skill_terms.items():
+            if not terms:
+                continue
+            weights = {term: terms.count(term) * self.idf[term] for term in set(terms)}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for term, weight in weights.items():
+                self._postings.setdefault(term, []).append((skill, weight / norm))
+            self._skill_departments[skill] = {entry.department for entry in roster.staff_with_skill(skill)}
+
+        for department in roster.available_departments:
+            self._department_terms[department] = set(tokenize(department))
+
+        # Skills interleaved across departments (most widely held first) and departments by
+        # head count; used to pad the candidates when a description matches little or nothing
+        department_skills = [
+            sorted({skill for entry in roster.staff_in_department(department) for skill in entry.skills},
+                   key=lambda skill: (-len(roster.staff_with_skill(skill)), skill))
+            for department in sorted(roster.available_departments)
+        ]
+        self._padding_skills: List[str] = []
+        padded = set()
+        for rank in range(max((len(skills) for skills in department_skills), default=0)):
+            for skills in department_skills:
+                if rank < len(skills) and skills[rank] not in padded:
+                    padded.add(skills[rank])
+                    self._padding_skills.append(skills[rank])
+        self._padding_departments = sorted(
+            roster.available_departments, key=lambda department: (-len(roster.staff_in_department(department)), department)
+        )
+
+    def score_skills(self, description: str) -> Dict[str, float]:
+        terms = tokenize(description)
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            query_weight = terms.count(term) * idf
+            for skill, weight in self._postings[term]:
+                scores[skill] = scores.get(skill, 0.0) + query_weight * weight
+        return scores
+
+    def select_candidates(self, description: str, top_k_skills: int, top_k_departments: int) -> Tuple[List[str], List[str]]:
+        """Returns the top-K skills and departments for a description."""
+        skill_scores = self.score_skills(description)
+        skills = sorted(skill_scores, key=lambda skill: -skill_scores[skill])[:top_k_skills]
+        for skill in self._padding_skills:
+            if len(skills) >= top_k_skills:
+                break
+            if skill not in skill_scores:
+                skills.append(skill)
+
+        description_terms = set(tokenize(description))
+        department_scores: Dict[str, float] = {}
+        for skill, score in skill_scores.items():
+            for department in self._skill_departments.get(skill, ()):
+                department_scores[department] = department_scores.get(department, 0.0) + score
+        for department, terms in self._department_terms.items():
+            if terms & description_terms:
+                department_scores[department] = department_scores.get(department, 0.0) + 1.0
+
+        departments = sorted(department_scores, key=lambda department: -department_scores[department])[:top_k_departments]
+        if not departments:
+            # Nothing to go on: let the model choose among every department
+            return skills, list(self._padding_departments)
+        for department in self._padding_departments:
+            if len(departments) >= top_k_departments:
+                break
+            if department not in department_scores:
+                departments.append(department)
+        return skills, departments
+
+
+_retriever_lock = threading.Lock()
+_retriever: Optional[SkillRetriever] = None
+
+
+def get_skill_retriever() -> SkillRetriever:
+    """Returns a retriever for the live roster, rebuilding it after a roster swap."""
+    global _retriever
+    roster = get_roster_index()
+    retriever = _retriever
+    if retriever is None or retriever.roster is not roster:
+        with _retriever_lock:
+            if _retriever is None or _retriever.roster is not roster:
+                _retriever = SkillRetriever(roster)
+            retriever = _retriever
+    return retriever
@@ -1,42 +1,93 @@
-from typing import List, Optional
-from .staff_data import get_staff_data
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from .roster_index import get_roster_index, normalize_skill, StaffEntry
+from .workload import WorkloadTracker, workload_tracker
+from .skill_matcher import get_skill_matcher
 from utils.types import Staff
-from config import DEFAULT_FALLBACK_DEPARTMENT
+from config import settings, DEFAULT_FALLBACK_DEPARTMENT
 from utils.logging import logger
 
 class StaffSelector:
+    def __init__(self, workload: Optional[WorkloadTracker] = None):
+        self.workload = workload or workload_tracker
+
     def select_best_staff(self, required_skills: List[str], department: str) -> Optional[Staff]:
         """Selects the best staff member based on skill matching and availability."""
-        staff_data = get_staff_data()
-        if not staff_data:
+        roster = get_roster_index()
+        if not len(roster):
             logger.error(f"No staff data available for department: {department}")
             return None
 
-        best_staff = None
-        best_score = 0
+        balanced = settings.workload_balancing_enabled
+        if settings.skill_matching_mode == "vector":
+            best_entry = self._select_by_similarity(roster, required_skills, department, balanced)
+            if best_entry is not None:
+                return best_entry.record
+            return self._admin_fallback(roster, department, balanced)
+
+        # Exact matching: only staff sharing at least one skill are visited, via the
+        # department-scoped inverted index.
+        scores: Dict[StaffEntry, int] = {}
+        matched_skills = []
+        for skill in {normalize_skill(skill) for skill in required_skills}:
+            candidates = roster.staff_with_skill(skill, department)
+            if candidates:
+                matched_skills.append(skill)
+            for entry in candidates:
+                scores[entry] = scores.get(entry, 0) + 1
+
+        if scores:
+            if not balanced:
+                # Highest score wins; ties go to the earliest roster entry.
+                return min(scores, key=lambda entry: (-scores[entry], entry.position)).record
+            if len(matched_skills) == 1:
+                # Everyone with the one matching skill ties: take the top of its heap
+                skill = matched_skills[0]
+                return self.workload.least_loaded(
+                    roster, department, skill, roster.staff_with_skill(skill, department)
+                ).record
+            # Highest score wins; ties go to the least loaded, least recently assigned person,
+            # from a heap over the top scorers for this combination of matching skills
+            best_score = max(scores.values())
+            return self.workload.least_loaded(
+                roster, department, ("exact", *sorted(matched_skills)),
+                (entry for entry, score in scores.items() if score == best_score)
+            ).record
+
+        return self._admin_fallback(roster, department, balanced)
 
-        # First attempt: prioritize skill matching
-        for staff in staff_data:
-            if staff["cr6dd_departmentname"] == department and staff.get("cr6dd_availability", False):
-                staff_skills = set(skill.strip().lower() for skill in staff["cr6dd_skillset"].split(","))
-                required_skills_set = set(skill.lower() for skill in required_skills)
-                match_score = len(staff_skills.intersection(required_skills_set))
-                # logger.debug(f"Evaluating staff {staff["cr6dd_UserID"]['cr6dd_name']} in {department}: match_score={match_score}, skills={staff_skills}")
-                if match_score > best_score:
-                    best_score = match_score
-                    best_staff = staff
+    @staticmethod
+    def _tied_by_similarity(required_skills: List[str], department: str) -> Iterator[StaffEntry]:
+        """Best cosine-scored staff; scores within skill_match_tie_tolerance of the best count as ties."""
+        entries, totals = get_skill_matcher().scores(required_skills, department)
+        if not len(totals) or totals.max() <= 0:
+            return
+        for index in np.flatnonzero(totals >= totals.max() - settings.skill_match_tie_tolerance):
+            yield entries[index]
 
+    def _select_by_similarity(self, roster, required_skills: List[str], department: str,
+                              balanced: bool) -> Optional[StaffEntry]:
+        tied = self._tied_by_similarity(required_skills, department)
+        if not balanced:
+            return min(tied, key=lambda entry: entry.position, default=None)
+        # The tied set depends only on the roster and the skills asked for, so it gets a heap
+        # of its own: scored once, then each request pops its least loaded member in O(log n)
+        bucket = ("similarity", *sorted({normalize_skill(skill) for skill in required_skills} - {""}))
+        return self.workload.least_loaded(roster, department, bucket, tied)
+
+    def _admin_fallback(self, roster, department: str, balanced: bool) -> Optional[Staff]:
         # For Admin fallback, select any available staff if no skill match found
-        if not best_staff and department == DEFAULT_FALLBACK_DEPARTMENT:
-            for staff in staff_data:
-                if staff["cr6dd_departmentname"] == department and staff.get("cr6dd_availability", False):
-                    best_staff = staff
-                    # logger.info(f"No skill match for Admin fallback, selecting available staff: {staff["cr6dd_UserID"]['cr6dd_name']}")
-                    break
-
-        # if not best_staff:
-            # logger.warning(f"No available staff found for department: {department} with skills: {required_skills}")
-        # else:
-        #     logger.info(f"Selected staff {best_staff["cr6dd_UserID"]['cr6dd_name']} for department: {department}")
-
-        return best_staff
\ No newline at end of file
+        if department == DEFAULT_FALLBACK_DEPARTMENT:
+            department_staff = roster.staff_in_department(department)
+            if department_staff:
+                if not balanced:
+                    return department_staff[0].record
+                return self.workload.least_loaded(roster, department, None, department_staff).record
+
+        return None
+
+    def record_assignment(self, staff: Staff) -> Optional[str]:
+        """Counts an open assignment for the staff member; returns the assignment id used to close it."""
+        if not settings.workload_balancing_enabled:
+            return None
+        return self.workload.assign(staff.get("cr6dd_staff1id") or staff.get("cr6dd_staffid", ""))
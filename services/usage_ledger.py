@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from config import settings, MODEL_PRICING_PER_1K_TOKENS
+from utils.logging import logger
+from utils.metrics import metrics
+
+WINDOW_SECONDS = 60.0
+HISTORY_MINUTES = 60
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a model call would push usage over the tokens-per-minute budget."""
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Upper-bound token estimate for a call: ~4 characters per prompt token plus the completion cap."""
+    return sum(len(message.get("content", "")) for message in messages) // 4 + max_tokens
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICING_PER_1K_TOKENS.get(model, (0.0, 0.0))
+    return prompt_tokens / 1000 * prompt_price + completion_tokens / 1000 * completion_price
+
+
+class UsageLedger:
+    """Tracks LLM token usage per call site and model and enforces the tokens-per-minute budget.
+
+    Callers reserve an estimate before each model call and settle it with the real usage
+    afterwards. A reservation that does not fit in the last minute's budget waits for
+    older usage to age out of the window, up to max_wait seconds, and then raises
+    TokenBudgetExceeded so the caller can degrade instead of drawing a 429.
+    """
+
+    def __init__(self, tokens_per_minute: Optional[int] = None):
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else settings.token_budget_per_minute
+        self._lock = threading.Lock()
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._window_tokens = 0
+        self._reserved = 0
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._per_minute: Dict[int, Dict[str, int]] = {}
+        self.budget_waits = 0
+        self.budget_rejections: Dict[str, int] = {}
+
+    def _expire(self, now: float):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    async def reserve(self, call_site: str, estimated_tokens: int, max_wait: Optional[float] = None) -> int:
+        """Holds budget for one call; returns the reserved amount to pass to settle()."""
+        if self.tokens_per_minute <= 0:
+            return 0
+        max_wait = settings.token_budget_max_wait_seconds if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._expire(now)
+                used = self._window_tokens + self._reserved
+                # An oversized call is let through on an idle budget rather than blocked forever
+                if used + estimated_tokens <= self.tokens_per_minute or used == 0:
+                    self._reserved += estimated_tokens
+                    return estimated_tokens
+                delay = self._window[0][0] + WINDOW_SECONDS - now if self._window else 0.25
+
+            if now + delay > deadline:
+                with self._lock:
+                    self.budget_rejections[call_site] = self.budget_rejections.get(call_site, 0) + 1
+                logger.warning(f"Token budget reached for {call_site}: {used}/{self.tokens_per_minute} tokens in the last minute")
+                raise TokenBudgetExceeded(f"Token budget of {self.tokens_per_minute} tokens/minute reached")
+            if not waited:
+                waited = True
+                with self._lock:
+                    self.budget_waits += 1
+            await asyncio.sleep(max(delay, 0.01))
+
+    def settle(self, reserved: int, call_site: str, model: str, usage: Optional[Dict[str, int]]):
+        """Releases a reservation and records the call's actual usage."""
+        prompt_tokens = (usage or {}).get("prompt_tokens") or 0
+        completion_tokens = (usage or {}).get("completion_tokens") or 0
+        total_tokens = prompt_tokens + completion_tokens
+        now = time.monotonic()
+        minute = int(time.time() // 60)
+        with self._lock:
+            self._reserved = max(0, self._reserved - reserved)
+            if total_tokens:
+                self._window.append((now, total_tokens))
+                self._window_tokens += total_tokens
+            totals = self._totals.setdefault(
+                (call_site, model), {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += estimate_cost(model, prompt_tokens, completion_tokens)
+            bucket = self._per_minute.setdefault(minute, {})
+            bucket[call_site] = bucket.get(call_site, 0) + total_tokens
+            for stale in [key for key in self._per_minute if key <= minute - HISTORY_MINUTES]:
+                del self._per_minute[stale]
+
+    def tokens_last_minute(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._window_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        tokens_last_minute = self.tokens_last_minute()
+        with self._lock:
+            return {
+                "tokens_per_minute_budget": self.tokens_per_minute,
+                "tokens_last_minute": tokens_last_minute,
+                "tokens_per_second": round(tokens_last_minute / WINDOW_SECONDS, 3),
+                "reserved_tokens": self._reserved,
+                "budget_waits": self.budget_waits,
+                "budget_rejections": dict(self.budget_rejections),
+                "totals": [
+                    {"call_site": call_site, "model": model, **{key: round(value, 6) for key, value in totals.items()}}
+                    for (call_site, model), totals in sorted(self._totals.items())
+                ],
+                "per_minute": {str(minute * 60): dict(sites) for minute, sites in sorted(self._per_minute.items())}
+            }
+
+    def render_prometheus(self) -> List[str]:
+        tokens_last_minute = self.tokens_last_minute()
+        with self._lock:
+            lines = [
+                "# HELP llm_tokens_total Tokens consumed by model calls.",
+                "# TYPE llm_tokens_total counter"
+            ]
+            for (call_site, model), totals in sorted(self._totals.items()):
+                for kind in ("prompt", "completion"):
+                    lines.append(f'llm_tokens_total{{call_site="{call_site}",model="{model}",kind="{kind}"}} {int(totals[kind + "_tokens"])}')
+            lines += ["# HELP llm_cost_usd_total Estimated model cost in US dollars.", "# TYPE llm_cost_usd_total counter"]
+            for (call_site, model), totals in sorted(self._totals.items()):
+                lines.append(f'llm_cost_usd_total{{call_site="{call_site}",model="{model}"}} {totals["cost_usd"]:.6f}')
+            lines += ["# HELP llm_budget_rejections_total Calls refused by the token budget.", "# TYPE llm_budget_rejections_total counter"]
+            for call_site, count in sorted(self.budget_rejections.items()):
+                lines.append(f'llm_budget_rejections_total{{call_site="{call_site}"}} {count}')
+            lines += [
+                "# HELP llm_tokens_per_second Token throughput over the last minute.",
+                "# TYPE llm_tokens_per_second gauge",
+                f"llm_tokens_per_second {tokens_last_minute / WINDOW_SECONDS:.3f}",
+                "# HELP llm_token_budget_per_minute Configured tokens-per-minute budget (0 is unlimited).",
+                "# TYPE llm_token_budget_per_minute gauge",
+                f"llm_token_budget_per_minute {self.tokens_per_minute}",
+                "# HELP llm_tokens_reserved Tokens reserved by calls in flight.",
+                "# TYPE llm_tokens_reserved gauge",
+                f"llm_tokens_reserved {self._reserved}"
+            ]
+        return lines
+
+
+usage_ledger = UsageLedger()
+metrics.add_collector(usage_ledger.render_prometheus)
@@ -0,0 +1,368 @@
+import hashlib
+import heapq
+import mmap
+import os
+import secrets
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import numpy as np
+from config import settings
+from .roster_index import RosterIndex, StaffEntry
+from .roster_sync import shared_workers
+from utils.logging import logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_HeapKey = Tuple[str, Optional[Hashable]]
+_HeapItem = Tuple[int, int, int, str, int]
+
+_TABLE_SIGNATURE = int.from_bytes(b"WKLD\x01\x00\x00\x00", "little")
+# Header words: signature, run id, slots, ring size and change log size (checked on open),
+# then the assignment sequence, change count, assignments issued and open assignments
+_SEQUENCE, _CHANGES, _ISSUED, _OPEN = range(5, 9)
+_HEADER_WORDS = 16
+_ID_BYTES = 64
+
+
+class _LocalCounts:
+    """Open-assignment counters kept in this process."""
+
+    def __init__(self, max_open_assignments: int):
+        self.max_open_assignments = max_open_assignments
+        self._open: Dict[str, int] = {}
+        self._last_assigned: Dict[str, int] = {}
+        self._assignments: "OrderedDict[str, str]" = OrderedDict()
+        self._sequence = 0
+        self._changed: List[str] = []
+
+    def load(self, staff_id: str) -> Tuple[int, int]:
+        return self._open.get(staff_id, 0), self._last_assigned.get(staff_id, 0)
+
+    def change_sequence(self) -> int:
+        return 0
+
+    def changes(self, seen: int) -> Tuple[int, Optional[List[str]]]:
+        changed, self._changed = self._changed, []
+        return seen, changed
+
+    def assign(self, staff_id: str) -> str:
+        assignment_id = uuid.uuid4().hex
+        self._sequence += 1
+        self._open[staff_id] = self._open.get(staff_id, 0) + 1
+        self._last_assigned[staff_id] = self._sequence
+        self._assignments[assignment_id] = staff_id
+        self._changed.append(staff_id)
+        while len(self._assignments) > self.max_open_assignments:
+            _, oldest_staff_id = self._assignments.popitem(last=False)
+            self._decrement(oldest_staff_id)
+            logger.warning(f"Open assignment limit reached; treating oldest assignment of {oldest_staff_id} as closed")
+        return assignment_id
+
+    def _decrement(self, staff_id: str):
+        if self._open.get(staff_id, 0) > 0:
+            self._open[staff_id] -= 1
+            if not self._open[staff_id]:
+                del self._open[staff_id]
+            self._changed.append(staff_id)
+
+    def close(self, assignment_id: str) -> Optional[str]:
+        staff_id = self._assignments.pop(assignment_id, None)
+        if staff_id is not None:
+            self._decrement(staff_id)
+        return staff_id
+
+    def open_total(self) -> int:
+        return len(self._assignments)
+
+    def by_staff(self) -> Dict[str, int]:
+        return dict(self._open)
+
+
+class SharedWorkloadTable:
+    """Open-assignment counters shared by the worker processes through a memory-mapped file.
+
+    Staff members get a slot in an open-addressed table keyed by a 64-bit hash of
+    their id; slots are never removed, so lookups read the mapped arrays without
+    locking. Assignments live in a ring of workload_max_open_assignments entries and
+    their id names the ring position and a random nonce; an assignment still open
+    when its position comes round again is treated as closed. Every counter change
+    appends the slot to a change log, which workers read to refresh their own
+    selection heaps. Mutations hold an exclusive flock on the file. The table is
+    reset when the parent process (the uvicorn supervisor) differs from the one that
+    created it, so counts from a previous run do not carry over.
+    """
+
+    def __init__(self, path: str, slots: int, ring: int, log: int):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        words = _HEADER_WORDS + 3 * slots + 2 * ring + log
+        size = words * 8 + slots * _ID_BYTES
+        with self._locked(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            table = np.frombuffer(self._map, dtype=np.uint64, count=words)
+            self._header = table[:_HEADER_WORDS]
+            expected = [_TABLE_SIGNATURE, os.getppid(), slots, ring, log]
+            if self._header[:_SEQUENCE].tolist() != expected:
+                np.frombuffer(self._map, dtype=np.uint8)[:] = 0
+                self._header[:_SEQUENCE] = expected
+        start = _HEADER_WORDS
+        self._hashes = table[start:start + slots]
+        self._open = table[start + slots:start + 2 * slots].view(np.int64)
+        self._last = table[start + 2 * slots:start + 3 * slots]
+        start += 3 * slots
+        self._nonces = table[start:start + ring]
+        self._ring_slots = table[start + ring:start + 2 * ring]
+        self._log = table[start + 2 * ring:start + 2 * ring + log]
+        self._ids = np.frombuffer(self._map, dtype=f"S{_ID_BYTES}", count=slots, offset=words * 8)
+        self._slot_of: Dict[str, int] = {}
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slot(self, staff_id: str, create: bool = False) -> int:
+        slot = self._slot_of.get(staff_id)
+        if slot is not None:
+            return slot
+        key = int.from_bytes(hashlib.blake2b(staff_id.encode(), digest_size=8).digest(), "little") or 1
+        slots = len(self._hashes)
+        slot = key % slots
+        for _ in range(slots):
+            current = int(self._hashes[slot])
+            if current == key:
+                self._slot_of[staff_id] = slot
+                return slot
+            if not current:
+                if not create:
+                    return -1
+                # Ids longer than the slot are only used for reporting, so truncating them is harmless
+                self._ids[slot] = staff_id.encode()[:_ID_BYTES]
+                self._hashes[slot] = key
+                self._slot_of[staff_id] = slot
+                return slot
+            slot = (slot + 1) % slots
+        if create:
+            raise RuntimeError("Shared workload table is full; raise WORKLOAD_SHARED_SLOTS")
+        return -1
+
+    def _changed(self, slot: int, delta: int):
+        self._open[slot] += delta
+        self._header[_OPEN] = int(self._header[_OPEN]) + delta
+        changes = int(self._header[_CHANGES]) + 1
+        self._log[changes % len(self._log)] = slot
+        self._header[_CHANGES] = changes
+
+    def load(self, staff_id: str) -> Tuple[int, int]:
+        slot = self._slot(staff_id)
+        if slot < 0:
+            return 0, 0
+        return int(self._open[slot]), int(self._last[slot])
+
+    def change_sequence(self) -> int:
+        return int(self._header[_CHANGES])
+
+    def changes(self, seen: int) -> Tuple[int, Optional[List[str]]]:
+        """Staff ids whose counters changed after change number seen, or None if the log has wrapped."""
+        if int(self._header[_CHANGES]) == seen:
+            return seen, []
+        with self._locked(fcntl.LOCK_SH):
+            current = int(self._header[_CHANGES])
+            if current - seen > len(self._log):
+                return current, None
+            slots = self._log[[number % len(self._log) for number in range(seen + 1, current + 1)]]
+            return current, [self._ids[slot].decode() for slot in np.unique(slots)]
+
+    def assign(self, staff_id: str) -> str:
+        with self._locked(fcntl.LOCK_EX):
+            slot = self._slot(staff_id, create=True)
+            issued = int(self._header[_ISSUED])
+            position = issued % len(self._nonces)
+            if self._nonces[position]:
+                evicted = int(self._ring_slots[position])
+                self._changed(evicted, -1)
+                logger.warning(f"Open assignment limit reached; treating oldest assignment of "
+                               f"{self._ids[evicted].decode()} as closed")
+            nonce = secrets.randbits(64) or 1
+            self._nonces[position] = nonce
+            self._ring_slots[position] = slot
+            self._header[_ISSUED] = issued + 1
+            sequence = int(self._header[_SEQUENCE]) + 1
+            self._header[_SEQUENCE] = sequence
+            self._last[slot] = sequence
+            self._changed(slot, 1)
+        return f"{position:08x}{nonce:016x}"
+
+    def close(self, assignment_id: str) -> Optional[str]:
+        if len(assignment_id) != 24:
+            return None
+        try:
+            position, nonce = int(assignment_id[:8], 16), int(assignment_id[8:], 16)
+        except ValueError:
+            return None
+        if position >= len(self._nonces) or not nonce:
+            return None
+        with self._locked(fcntl.LOCK_EX):
+            if int(self._nonces[position]) != nonce:
+                return None
+            self._nonces[position] = 0
+            slot = int(self._ring_slots[position])
+            self._changed(slot, -1)
+        return self._ids[slot].decode()
+
+    def open_total(self) -> int:
+        return int(self._header[_OPEN])
+
+    def by_staff(self) -> Dict[str, int]:
+        busy = np.flatnonzero(self._open > 0)
+        return {self._ids[slot].decode(): int(self._open[slot]) for slot in busy}
+
+
+class WorkloadTracker:
+    """Open-assignment counters per staff member with lazily maintained selection heaps.
+
+    Heaps are kept per (department, skill), per department (skill None) and per
+    candidate bucket (any other hashable standing for a fixed set of tied staff), and
+    ordered by (open assignments, last assignment sequence, roster position), so the
+    least loaded, least recently assigned person is at the top. A load change pushes a
+    fresh item instead of re-heapifying; stale items are recognised by their version and
+    dropped when they surface, which keeps both updates and selection O(log n). At most
+    workload_max_heaps heaps are kept; the least recently used is dropped and rebuilt
+    from its entries if it is asked for again.
+
+    With more than one worker the counters live in a SharedWorkloadTable next to the
+    roster snapshot, so every worker balances against the same loads; the heaps stay
+    per worker and pick up other workers' changes from the table's change log.
+    """
+
+    def __init__(self, max_open_assignments: Optional[int] = None):
+        self.max_open_assignments = max_open_assignments or settings.workload_max_open_assignments
+        self._lock = threading.Lock()
+        self._counts = None
+        self._seen = 0
+        self._versions: Dict[str, int] = {}
+        self._roster: Optional[RosterIndex] = None
+        self._heaps: "OrderedDict[_HeapKey, List[_HeapItem]]" = OrderedDict()
+        self._members: Dict[_HeapKey, Dict[str, StaffEntry]] = {}
+        self._memberships: Dict[str, List[_HeapKey]] = {}
+
+    def _store(self):
+        if self._counts is None:
+            path = settings.roster_snapshot_path
+            if shared_workers() and path and fcntl is not None:
+                self._counts = SharedWorkloadTable(f"{path}.workload", settings.workload_shared_slots,
+                                                   self.max_open_assignments, settings.workload_change_log_size)
+            else:
+                self._counts = _LocalCounts(self.max_open_assignments)
+            self._seen = self._counts.change_sequence()
+        return self._counts
+
+    def _item(self, entry: StaffEntry) -> _HeapItem:
+        staff_id = entry.staff_id
+        open_count, last_assigned = self._store().load(staff_id)
+        return (open_count, last_assigned, entry.position, staff_id, self._versions.get(staff_id, 0))
+
+    def load_key(self, entry: StaffEntry) -> Tuple[int, int, int]:
+        """Ordering used to break skill-score ties: open load, then least recently assigned, then roster order."""
+        return self._item(entry)[:3]
+
+    def _clear_heaps(self):
+        self._heaps.clear()
+        self._members.clear()
+        self._memberships.clear()
+
+    def _heap(self, roster: RosterIndex, key: _HeapKey, entries: Iterable[StaffEntry]) -> List[_HeapItem]:
+        if self._roster is not roster:
+            self._roster = roster
+            self._clear_heaps()
+        heap = self._heaps.get(key)
+        if heap is not None:
+            self._heaps.move_to_end(key)
+            return heap
+        members = {entry.staff_id: entry for entry in entries}
+        heap = [self._item(entry) for entry in members.values()]
+        heapq.heapify(heap)
+        self._heaps[key] = heap
+        self._members[key] = members
+        for staff_id in members:
+            self._memberships.setdefault(staff_id, []).append(key)
+        while len(self._heaps) > settings.workload_max_heaps:
+            evicted, _ = self._heaps.popitem(last=False)
+            for staff_id in self._members.pop(evicted):
+                self._memberships[staff_id].remove(evicted)
+        return heap
+
+    def _sync(self):
+        self._seen, changed = self._store().changes(self._seen)
+        if changed is None:
+            self._clear_heaps()
+            return
+        for staff_id in changed:
+            self._bump(staff_id)
+
+    def least_loaded(self, roster: RosterIndex, department: str, skill: Optional[Hashable],
+                     entries: Iterable[StaffEntry]) -> Optional[StaffEntry]:
+        """Top of the (department, skill) heap; entries seeds the heap the first time it is used.
+
+        entries is only iterated then, so a generator defers computing the candidates
+        until the heap is actually missing.
+        """
+        key = (department, skill)
+        with self._lock:
+            self._sync()
+            heap = self._heap(roster, key, entries)
+            members = self._members[key]
+            while heap:
+                _, _, _, staff_id, version = heap[0]
+                if version == self._versions.get(staff_id, 0):
+                    return members[staff_id]
+                heapq.heappop(heap)
+            return None
+
+    def _bump(self, staff_id: str):
+        self._versions[staff_id] = self._versions.get(staff_id, 0) + 1
+        for key in self._memberships.get(staff_id, ()):
+            heap = self._heaps[key]
+            heapq.heappush(heap, self._item(self._members[key][staff_id]))
+            if len(heap) > 4 * len(self._members[key]) + 16:
+                self._heaps[key] = heap = [self._item(entry) for entry in self._members[key].values()]
+                heapq.heapify(heap)
+
+    def assign(self, staff_id: str) -> str:
+        """Counts a new open assignment for the staff member and returns its assignment id."""
+        with self._lock:
+            return self._store().assign(staff_id)
+
+    def close(self, assignment_id: str) -> Optional[str]:
+        """Closes one assignment; returns the staff id it belonged to, or None if unknown."""
+        with self._lock:
+            return self._store().close(assignment_id)
+
+    def open_assignments(self, staff_id: str) -> int:
+        with self._lock:
+            return self._store().load(staff_id)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = self._store()
+            return {
+                "shared": isinstance(counts, SharedWorkloadTable),
+                "open_assignments": counts.open_total(),
+                "by_staff": dict(sorted(counts.by_staff().items(), key=lambda item: -item[1])),
+                "heaps": len(self._heaps)
+            }
+
+
+workload_tracker = WorkloadTracker()
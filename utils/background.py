@@ -1,16 +1,379 @@
-# import json
-# from datetime import datetime
-# from app.models import IncidentAnalysis,IncidentRequest
-# from app.utils.logging import logger
-
-# async def log_incident_metrics(incident:IncidentRequest,analysis:IncidentAnalysis):
-#     metrics={
-#         "timestamp": analysis.timestamp.isoformat(),
-#         "category": analysis.classification.category,
-#         "severity": analysis.classification.severity,
-#         "confidence": analysis.classification.confidence_score,
-#         "processing_time_ms": analysis.processing_time_ms,
-#         "department": incident.department
-#     }
-
-#     logger.info(f"Incident metrics: {json.dumps(metrics)}")
+import asyncio
+import heapq
+import ipaddress
+import itertools
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from config import settings
+from utils.http_client import http_pool
+from utils.logging import logger
+
+# Lower runs first; classification jobs take their predicted severity's priority
+PRIORITIES = {"High": 0, "Medium": 1, "Low": 2}
+REGENERATION_PRIORITY = 3
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class CallbackURLError(ValueError):
+    """A callback_url the server will not POST job results to."""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_callback_url(url: str):
+    """Raises CallbackURLError unless the URL is safe to send job results to.
+
+    The scheme must be https (unless job_callback_require_https is off). With
+    job_callback_allowed_hosts set, the host must be one of them or a subdomain;
+    otherwise every address the host resolves to must be public, which keeps
+    callbacks away from loopback, private, link-local and metadata addresses.
+    """
+    parts = urlsplit(url)
+    schemes = ("https",) if settings.job_callback_require_https else ("https", "http")
+    if parts.scheme not in schemes:
+        raise CallbackURLError(f"callback_url must use {' or '.join(schemes)}")
+    host = (parts.hostname or "").rstrip(".").lower()
+    if not host or parts.username or parts.password:
+        raise CallbackURLError("callback_url must name a host and carry no credentials")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise CallbackURLError("callback_url has an invalid port")
+
+    allowed = [entry.strip().lstrip(".").lower() for entry in settings.job_callback_allowed_hosts.split(",") if entry.strip()]
+    if allowed:
+        if not any(host == entry or host.endswith("." + entry) for entry in allowed):
+            raise CallbackURLError(f"callback_url host '{host}' is not on the allowed list")
+        return
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise CallbackURLError(f"callback_url host '{host}' does not resolve")
+        addresses = [info[4][0] for info in infos]
+    if not addresses or not all(_is_public(address) for address in addresses):
+        raise CallbackURLError(f"callback_url host '{host}' is not a public address")
+
+
+class Job:
+    __slots__ = ("job_id", "kind", "priority", "payload", "callback_url", "status", "result", "error",
+                 "attempts", "preemptions", "created_at", "started_at", "finished_at", "expires_at",
+                 "task", "interrupt")
+
+    def __init__(self, kind: str, payload: Dict[str, Any], priority: int, callback_url: Optional[str] = None,
+                 job_id: Optional[str] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.payload = payload
+        self.callback_url = callback_url
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.preemptions = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.expires_at = time.monotonic() + settings.job_ttl_seconds
+        self.task: Optional[asyncio.Task] = None
+        # Why a running job's task was cancelled: "preempted" or "cancelled"
+        self.interrupt: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "preemptions": self.preemptions,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    def spill_record(self) -> Dict[str, Any]:
+        return {"job_id": self.job_id, "kind": self.kind, "priority": self.priority, "payload": self.payload,
+                "callback_url": self.callback_url, "attempts": self.attempts, "created_at": self.created_at}
+
+
+class JobQueue:
+    """In-process priority job queue for model work that should not hold a request open.
+
+    Jobs wait in a heap ordered by (priority, submission order) and are run by a pool
+    of worker tasks, sized to the Azure concurrency budget unless job_workers is set.
+    Failed jobs are retried with linear backoff up to job_max_attempts; finished jobs
+    stay pollable for job_ttl_seconds and, if they carry a callback_url, their final
+    state is POSTed there. When every worker is busy, a new job may preempt the
+    lowest-priority running job of a preemptible kind that ranks below it: that job is
+    cancelled and queued again (at most job_max_preemptions times, so it cannot starve).
+    Callback URLs are checked by check_callback_url on submit and again before sending.
+    On shutdown, queued and running jobs are written to the spill store and picked up
+    again by the next start().
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Tuple[JobHandler, bool]] = {}
+        self._heap: List[Tuple[int, int, Job]] = []
+        self._sequence = itertools.count()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._running: Dict[str, Job] = {}
+        self._workers: List[asyncio.Task] = []
+        self._retry_tasks: Set[asyncio.Task] = set()
+        self._condition: Optional[asyncio.Condition] = None
+        self._spill_store = None
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.preemptions = 0
+        self.callbacks_failed = 0
+
+    def register(self, kind: str, handler: JobHandler, preemptible: bool = False):
+        """Sets the coroutine function that runs jobs of this kind with their payload."""
+        self._handlers[kind] = (handler, preemptible)
+
+    @property
+    def worker_count(self) -> int:
+        return settings.job_workers or settings.azure_initial_concurrency
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if job.status not in FINISHED or (job.expires_at > now and len(self._jobs) <= settings.job_max_entries):
+                break
+            del self._jobs[job_id]
+
+    def _push(self, job: Job):
+        job.status = "queued"
+        heapq.heappush(self._heap, (job.priority, next(self._sequence), job))
+        self.condition.notify()
+
+    async def submit(self, kind: str, payload: Dict[str, Any], priority: int,
+                     callback_url: Optional[str] = None) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        if callback_url:
+            await check_callback_url(callback_url)
+        job = Job(kind, payload, priority, callback_url)
+        self._jobs[job.job_id] = job
+        self._prune()
+        async with self.condition:
+            self._push(job)
+            self._maybe_preempt(job)
+        return job
+
+    def _maybe_preempt(self, job: Job):
+        if len(self._running) < self.worker_count:
+            return
+        candidates = [
+            running for running in self._running.values()
+            if self._handlers[running.kind][1] and running.priority > job.priority
+            and running.preemptions < settings.job_max_preemptions
+            and running.interrupt is None and running.task is not None
+        ]
+        if not candidates:
+            return
+        victim = max(candidates, key=lambda running: (running.priority, running.started_at or 0))
+        logger.info(f"Job {job.job_id} ({job.kind}, priority {job.priority}) preempts {victim.job_id} ({victim.kind})")
+        victim.interrupt = "preempted"
+        victim.task.cancel()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or (job.status in FINISHED and job.expires_at <= time.monotonic()):
+            return None
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a queued or running job; finished jobs are returned unchanged."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        async with self.condition:
+            if job.status == "queued":
+                self._heap = [entry for entry in self._heap if entry[2] is not job]
+                heapq.heapify(self._heap)
+                self._finish(job, "cancelled")
+            elif job.status == "retrying":
+                self._finish(job, "cancelled")
+            elif job.task is not None:
+                job.interrupt = "cancelled"
+                job.task.cancel()
+        return job
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.expires_at = time.monotonic() + settings.job_ttl_seconds
+        if job.callback_url:
+            asyncio.create_task(self._callback(job))
+
+    async def _callback(self, job: Job):
+        try:
+            # Checked again at send time: the host may resolve differently than at submit
+            await check_callback_url(job.callback_url)
+            response = await http_pool.client.post(
+                job.callback_url, json=job.to_dict(), timeout=settings.job_callback_timeout_seconds
+            )
+            response.raise_for_status()
+        except Exception as e:
+            self.callbacks_failed += 1
+            logger.warning(f"Callback for job {job.job_id} to {job.callback_url} failed: {e}")
+
+    async def _next_job(self) -> Job:
+        async with self.condition:
+            while not self._heap:
+                await self.condition.wait()
+            job = heapq.heappop(self._heap)[2]
+            job.status = "running"
+            job.interrupt = None
+            job.attempts += 1
+            job.started_at = time.time()
+            self._running[job.job_id] = job
+            return job
+
+    async def _retry_later(self, job: Job, delay: float):
+        await asyncio.sleep(delay)
+        async with self.condition:
+            if job.status == "retrying":
+                self._push(job)
+
+    async def _run_job(self, job: Job):
+        handler, _ = self._handlers[job.kind]
+        job.task = asyncio.create_task(handler(job.payload))
+        try:
+            result = await job.task
+        except asyncio.CancelledError:
+            if job.interrupt == "preempted":
+                job.preemptions += 1
+                job.attempts -= 1
+                self.preemptions += 1
+                async with self.condition:
+                    self._push(job)
+                return
+            if job.interrupt is None:
+                # The worker itself is being cancelled (shutdown); stop() spills the job
+                raise
+            self._finish(job, "cancelled")
+            return
+        except Exception as e:
+            if job.attempts < settings.job_max_attempts:
+                self.retries += 1
+                job.status = "retrying"
+                job.error = str(e)
+                logger.warning(f"Job {job.job_id} ({job.kind}) failed on attempt {job.attempts}, retrying: {e}")
+                retry = asyncio.create_task(self._retry_later(job, settings.job_retry_backoff_seconds * job.attempts))
+                self._retry_tasks.add(retry)
+                retry.add_done_callback(self._retry_tasks.discard)
+                return
+            self.failed += 1
+            logger.error(f"Job {job.job_id} ({job.kind}) failed after {job.attempts} attempts: {e}")
+            self._finish(job, "failed", error=str(e))
+            return
+        self.completed += 1
+        self._finish(job, "succeeded", result=result)
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            try:
+                await self._run_job(job)
+            finally:
+                job.task = None
+                self._running.pop(job.job_id, None)
+
+    async def start(self, spill_store=None):
+        """Starts the workers and requeues jobs spilled by the previous shutdown."""
+        if self._workers:
+            return
+        self._spill_store = spill_store
+        if spill_store is not None:
+            try:
+                spilled = await asyncio.to_thread(spill_store.take_spilled_jobs)
+            except Exception as e:
+                logger.warning(f"Could not load spilled jobs: {e}")
+                spilled = []
+            async with self.condition:
+                for record in spilled:
+                    if record["kind"] not in self._handlers:
+                        logger.warning(f"Dropping spilled job {record['job_id']} of unknown kind '{record['kind']}'")
+                        continue
+                    job = Job(record["kind"], record["payload"], record["priority"], record.get("callback_url"),
+                              job_id=record["job_id"])
+                    job.attempts = record.get("attempts", 0)
+                    job.created_at = record.get("created_at", job.created_at)
+                    self._jobs[job.job_id] = job
+                    self._push(job)
+            if spilled:
+                logger.info(f"Requeued {len(spilled)} spilled jobs")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Stops the workers and spills queued and interrupted jobs so they survive the restart."""
+        interrupted = list(self._running.values())
+        for task in self._workers + list(self._retry_tasks):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retry_tasks, return_exceptions=True)
+        self._workers = []
+        for job in interrupted:
+            # An interrupted run does not count as a failed attempt
+            job.attempts -= 1
+        unfinished = interrupted + [entry[2] for entry in sorted(self._heap)]
+        unfinished += [job for job in self._jobs.values() if job.status == "retrying"]
+        self._running.clear()
+        self._heap = []
+        self._condition = None
+        if not unfinished:
+            return
+        if self._spill_store is None:
+            logger.warning(f"Discarding {len(unfinished)} unfinished jobs: no spill store configured")
+            return
+        try:
+            await asyncio.to_thread(self._spill_store.spill_jobs, [job.spill_record() for job in unfinished])
+            logger.info(f"Spilled {len(unfinished)} unfinished jobs")
+        except Exception as e:
+            logger.error(f"Could not spill {len(unfinished)} unfinished jobs: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {}
+        for _, _, job in self._heap:
+            queued[job.kind] = queued.get(job.kind, 0) + 1
+        return {
+            "workers": len(self._workers),
+            "running": len(self._running),
+            "queued": queued,
+            "tracked": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "preemptions": self.preemptions,
+            "callbacks_failed": self.callbacks_failed
+        }
+
+
+job_queue = JobQueue()
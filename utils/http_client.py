@@ -0,0 +1,100 @@
+from typing import Any, Dict, Optional
+
+import httpx
+from config import settings
+from utils.logging import logger
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HttpClientPool:
+    """Application-scoped httpx client shared by every outbound call.
+
+    Created with the first Azure client (during service warm-up) and injected into the
+    staff feed fetch and every AsyncAzureOpenAI instance, so connections (and TLS sessions) are reused instead
+    of being set up per request or per service.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.http2 = False
+        self.requests_sent = 0
+        self.responses_received = 0
+        self.clients_created = 0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        self.http2 = settings.http2_enabled and _http2_available()
+        if settings.http2_enabled and not self.http2:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+
+        limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds
+        )
+        timeout = httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds)
+        self.clients_created += 1
+        logger.info(
+            f"Shared HTTP pool opened (max_connections={limits.max_connections}, "
+            f"keepalive={limits.max_keepalive_connections}, http2={self.http2})"
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=self.http2,
+            event_hooks={"request": [self._on_request], "response": [self._on_response]}
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests_sent += 1
+
+    async def _on_response(self, response: httpx.Response):
+        self.responses_received += 1
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use if the lifespan has not opened it yet."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def open(self) -> httpx.AsyncClient:
+        return self.client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Shared HTTP pool closed")
+        self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool statistics read from the underlying httpcore pool."""
+        connections = []
+        if self._client is not None:
+            pool = getattr(self._client._transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+
+        idle = sum(1 for connection in connections if connection.is_idle())
+        http2_connections = sum(1 for connection in connections if "HTTP/2" in connection.info())
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2_enabled": self.http2,
+            "max_connections": settings.http_max_connections,
+            "max_keepalive_connections": settings.http_max_keepalive_connections,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "http2_connections": http2_connections,
+            "requests_sent": self.requests_sent,
+            "responses_received": self.responses_received,
+            "clients_created": self.clients_created
+        }
+
+
+http_pool = HttpClientPool()
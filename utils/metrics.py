@@ -0,0 +1,216 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from config import settings
+
+# Upper bounds in seconds: 50us .. ~105s, doubling
+DEFAULT_BUCKETS = tuple(0.00005 * (2 ** power) for power in range(22))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within buckets like histogram_quantile()."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class RequestTiming:
+    """Spans recorded while serving one request, for the Server-Timing header."""
+    __slots__ = ("spans",)
+
+    def __init__(self):
+        self.spans: List[Tuple[str, int]] = []
+
+    def server_timing(self) -> str:
+        totals: Dict[str, int] = {}
+        for stage, duration_ns in self.spans:
+            totals[stage] = totals.get(stage, 0) + duration_ns
+        return ", ".join(f"{stage};dur={duration_ns / 1e6:.3f}" for stage, duration_ns in totals.items())
+
+
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+class MetricsRegistry:
+    """In-process latency histograms keyed by stage, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._stages: Dict[str, Histogram] = {}
+        self._requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """Registers a callable returning extra Prometheus lines to append to /metrics."""
+        self._collectors.append(collector)
+
+    def observe_stage(self, stage: str, duration_ns: int):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(duration_ns / 1e9)
+        timing = _current_timing.get()
+        if timing is not None:
+            timing.spans.append((stage, duration_ns))
+
+    def observe_request(self, method: str, route: str, status: int, duration_ns: int):
+        key = (method, route, str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(duration_ns / 1e9)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Times the enclosed block with perf_counter_ns and records it under the stage name."""
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter_ns() - started)
+
+    def request_spans(self) -> Dict[str, float]:
+        """Milliseconds per stage recorded so far while serving the current request."""
+        timing = _current_timing.get()
+        totals: Dict[str, float] = {}
+        for stage, duration_ns in timing.spans if timing is not None else ():
+            totals[stage] = totals.get(stage, 0.0) + duration_ns / 1e6
+        return {stage: round(ms, 3) for stage, ms in totals.items()}
+
+    def stage_quantiles(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1000, 3) for q in QUANTILES}
+                }
+                for stage, histogram in sorted(self._stages.items())
+            }
+
+    @staticmethod
+    def _render_histogram(lines: List[str], name: str, labels: str, histogram: Histogram):
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.9f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP incident_stage_duration_seconds Time spent in each processing stage.")
+            lines.append("# TYPE incident_stage_duration_seconds histogram")
+            for stage, histogram in sorted(self._stages.items()):
+                self._render_histogram(lines, "incident_stage_duration_seconds", f'stage="{stage}"', histogram)
+
+            lines.append("# HELP incident_stage_duration_quantile_seconds Estimated latency quantiles per stage.")
+            lines.append("# TYPE incident_stage_duration_quantile_seconds gauge")
+            for stage, histogram in sorted(self._stages.items()):
+                for q in QUANTILES:
+                    lines.append(f'incident_stage_duration_quantile_seconds{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.9f}')
+
+            lines.append("# HELP http_request_duration_seconds End-to-end HTTP request latency.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route, status), histogram in sorted(self._requests.items()):
+                self._render_histogram(
+                    lines, "http_request_duration_seconds",
+                    f'method="{method}",route="{route}",status="{status}"', histogram
+                )
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def route_template(scope) -> str:
+    """Full path template of the matched route, e.g. /api/v1/incidents/drafts/{draft_id}.
+
+    Routes of included routers only know their own path, so the prefix is recovered
+    from the request path at the segment where the route's pattern starts matching.
+    """
+    route = scope.get("route")
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is None:
+        return "unmatched"
+    path = scope["path"]
+    for index, char in enumerate(path):
+        if char == "/" and path_regex.match(path[index:]):
+            return path[:index] + route.path
+    return route.path
+
+
+class TimingMiddleware:
+    """ASGI middleware timing each HTTP request and optionally adding a Server-Timing header.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so streaming request and
+    response bodies pass through untouched. For streamed responses the header only
+    carries the spans finished before the first byte was sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        started = time.perf_counter_ns()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing_enabled:
+                    total = f"total;dur={(time.perf_counter_ns() - started) / 1e6:.3f}"
+                    spans = timing.server_timing()
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", (f"{spans}, {total}" if spans else total).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timing.reset(token)
+            metrics.observe_request(scope["method"], route_template(scope), status, time.perf_counter_ns() - started)
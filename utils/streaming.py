@@ -0,0 +1,31 @@
+import json
+from typing import Any
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """StreamingResponse for generators that keep reading the request body while responding.
+
+    The stock response (ASGI spec < 2.4) listens for client disconnects on receive(),
+    which would swallow the body chunks the generator is still consuming. Here the
+    disconnect surfaces as a failed send instead, which closes the generator.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}